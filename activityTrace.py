@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+
+"""ACTIVITY DIAGRAMS OF CHAINS
+
+   A Domino shows the messages of one operation exchanged by neighbors
+   (see the "# Domino:" comments of the operations); an Activity Diagram
+   shows when every CPE of the chain is active: CPE index against time.
+
+   A chain can run with ActivityConnectors (see connector.py), which
+   record every message received into an ActivityRecorder: a ring buffer
+   of the last capacity events per thread (the controller and every CPE)
+       (time, side, kind, value)
+   time  - time.perf_counter_ns() when the message is received,
+   side  - 0 if it came down from the upper neighbor (through
+           connectorUpper), 1 if it came up from the lower one,
+   kind  - "o", "w", "W", "b" or "B", as the receive_* method,
+   value - the operation for "o", the word for "w" and "W",
+           the bit for "b" and "B".
+   A thread records into its own buffer, with no lock.
+
+   The events of all the threads, an Activity, are saved in a compact
+   binary file (writeActivity, readActivity): little-endian columns
+       magic "CHAC", version (uint16),
+       operations (uint16 count, then uint8 length + ASCII name each),
+       events (uint64 count), then the columns of the events, in time order:
+       time (int64), pe (int32), side (int8), kind (int8, index in KINDS),
+       value (int64: the index of the operation, the word,
+              1/0 for a bit, -1 for Any),
+   22 bytes per event. pe is the peId of the receiving CPE,
+   0 for the controller.
+
+   renderSVG draws an Activity Diagram: a row per CPE, the controller
+   at the top, time from left to right, and a mark where messages were
+   received, blue down and red up, darker for more of them. The events
+   are counted per pixel, so millions of events make a bounded picture.
+
+   For debugging only, not a part of the model."""
+
+# ==============================================================================
+
+from array import array
+from collections import deque
+import struct
+import sys
+import threading
+import time
+
+from connector import KINDS
+from myThreading import Any
+
+# ==============================================================================
+
+MAGIC = b"CHAC"
+VERSION = 1
+SIDES = ("upper", "lower") # the connector of the receiving CPE.
+
+# ==============================================================================
+
+class ActivityRecorder:
+    """The events of the ActivityConnectors of one chain: a ring buffer
+       per receiving thread, only the last capacity events of each one
+       are kept."""
+
+    def __init__(self, capacity=65536):
+        if capacity <= 0:
+            raise ValueError("ActivityRecorder: capacity should be > 0.")
+        self.capacity = capacity
+        self.local = threading.local()
+        self.buffers = [] # (thread, deque of events)
+        self.lock = threading.Lock() # for new buffers only.
+
+    def _newBuffer(self):
+        events = deque(maxlen=self.capacity)
+        with self.lock:
+            self.buffers.append((threading.current_thread(), events))
+        self.local.append = events.append
+        return events.append
+
+    def record(self, side, kind, value):
+        """Theta(1). Records a message received by the current thread."""
+        try:
+            append = self.local.append
+        except AttributeError:
+            append = self._newBuffer()
+        append((time.perf_counter_ns(), side, kind, value))
+
+    def clear(self):
+        with self.lock:
+            for thread, events in self.buffers:
+                events.clear()
+
+    def activity(self):
+        """Theta(e log e) for e events. The events recorded so far,
+           as an Activity; the pe of a thread is the peId of its CPE
+           (see CPEThread), 0 for any other thread: the controller."""
+        operations = {}
+        rows = []
+        with self.lock:
+            buffers = list(self.buffers)
+        for thread, events in buffers:
+            pe = getattr(getattr(thread, "pe", None), "peId", 0)
+            for t, side, kind, value in list(events): # a copy: running.
+                if kind == "o":
+                    value = operations.setdefault(value, len(operations))
+                elif value is Any:
+                    value = -1
+                rows.append((t, pe, side, KINDS.index(kind), int(value)))
+        rows.sort()
+        names = sorted(operations, key=operations.get)
+        return Activity(names, *(array(code, column) for code, column in
+                                 zip("qibbq", zip(*rows) if rows
+                                              else [[]]*5)))
+
+# ==============================================================================
+
+class Activity:
+    """Recorded events, as columns: arrays times, pes, sides, kinds, values
+       (see the module docstring); operations are the names of the
+       operation indexes in values of "o" events."""
+
+    __slots__ = ("operations", "times", "pes", "sides", "kinds", "values")
+
+    def __init__(self, operations, times, pes, sides, kinds, values):
+        self.operations = list(operations)
+        self.times = times
+        self.pes = pes
+        self.sides = sides
+        self.kinds = kinds
+        self.values = values
+
+    def __len__(self):
+        return len(self.times)
+
+    def events(self):
+        """Generates the events as tuples
+           (time, pe, side, kind, value), decoded: side "upper"/"lower",
+           kind a letter of KINDS, the operation name for "o"."""
+        for t, pe, side, kind, value in zip(self.times, self.pes, self.sides,
+                                            self.kinds, self.values):
+            kind = KINDS[kind]
+            if kind == "o":
+                value = self.operations[value]
+            elif value == -1:
+                value = Any
+            elif kind in "bB":
+                value = bool(value)
+            yield t, pe, SIDES[side], kind, value
+
+# ==============================================================================
+
+def _littleEndian(column):
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column
+
+def writeActivity(path, activity):
+    """Theta(e). Saves an Activity in a binary file (see the module
+       docstring); returns the number of events."""
+    with open(path, "wb") as file:
+        file.write(MAGIC + struct.pack("<HH", VERSION,
+                                       len(activity.operations)))
+        for name in activity.operations:
+            encoded = name.encode("ascii")
+            file.write(struct.pack("<B", len(encoded)) + encoded)
+        file.write(struct.pack("<Q", len(activity)))
+        for column in [activity.times, activity.pes, activity.sides,
+                       activity.kinds, activity.values]:
+            _littleEndian(column).tofile(file)
+    return len(activity)
+
+def readActivity(path):
+    """Theta(e). The Activity saved in a binary file by writeActivity."""
+    with open(path, "rb") as file:
+        if file.read(4) != MAGIC:
+            raise ValueError("readActivity: %s is not an activity file." %
+                             path)
+        version, count = struct.unpack("<HH", file.read(4))
+        if version != VERSION:
+            raise ValueError("readActivity: version %s, expected %s." %
+                             (version, VERSION))
+        operations = []
+        for i in range(count):
+            length, = struct.unpack("<B", file.read(1))
+            operations.append(file.read(length).decode("ascii"))
+        events, = struct.unpack("<Q", file.read(8))
+        columns = []
+        for code in "qibbq":
+            column = array(code)
+            column.fromfile(file, events)
+            columns.append(_littleEndian(column))
+    return Activity(operations, *columns)
+
+# ==============================================================================
+
+COLORS = ("#1f4e9c", "#c0392b") # by side: down (upper), up (lower).
+
+def renderSVG(activity, path=None, width=1000, rowHeight=10):
+    """Theta(e + rows*width). Returns an Activity Diagram of an Activity
+       as an SVG string, and saves it if a path is given.
+       The events are counted per pixel column, row and side:
+       at most 2*width marks per row."""
+    left, top, bottom = 60, 10, 30
+    if len(activity):
+        start, end = activity.times[0], activity.times[-1]
+        rows = max(activity.pes) + 1
+    else:
+        start, end, rows = 0, 0, 1
+    span = max(end - start, 1)
+    counts = {} # (pe, x, side) -> events
+    for t, pe, side in zip(activity.times, activity.pes, activity.sides):
+        key = (pe, (t - start) * (width - 1) // span, side)
+        counts[key] = counts.get(key, 0) + 1
+    most = max(counts.values(), default=1)
+    height = top + rows * rowHeight + bottom
+    svg = ['<svg xmlns="http://www.w3.org/2000/svg" width="%s" height="%s" '
+           'font-family="sans-serif" font-size="9">' %
+           (left + width + 10, height),
+           '<rect width="100%" height="100%" fill="white"/>']
+    labelEvery = max(1, rows // 40)
+    for pe in range(0, rows, labelEvery):
+        y = top + pe * rowHeight
+        svg.append('<text x="%s" y="%s" text-anchor="end">%s</text>' %
+                   (left - 4, y + rowHeight - 2,
+                    "controller" if pe == 0 else "PE %s" % pe))
+        svg.append('<line x1="%s" y1="%s" x2="%s" y2="%s" stroke="#eee"/>' %
+                   (left, y, left + width, y))
+    for (pe, x, side), count in sorted(counts.items()):
+        y = top + pe * rowHeight + side * rowHeight // 2
+        svg.append('<rect x="%s" y="%s" width="1" height="%s" fill="%s" '
+                   'fill-opacity="%.2f"/>' %
+                   (left + x, y, rowHeight // 2, COLORS[side],
+                    0.25 + 0.75 * count / most))
+    axis = top + rows * rowHeight
+    svg.append('<line x1="%s" y1="%s" x2="%s" y2="%s" stroke="black"/>' %
+               (left, axis, left + width, axis))
+    for i in range(11):
+        x = left + i * (width - 1) // 10
+        svg.append('<text x="%s" y="%s" text-anchor="middle">%.0f us</text>'
+                   % (x, axis + 14, i * span / 10 / 1000))
+    svg.append('</svg>')
+    text = "\n".join(svg)
+    if path is not None:
+        with open(path, "w") as file:
+            file.write(text)
+    return text
+
+###############################################################################
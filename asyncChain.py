@@ -0,0 +1,644 @@
+#!/usr/bin/env python3
+
+"""ASYNCIO CHAIN: CONNECTOR, CLASS AsyncCPE AND CHAIN CONTROLLER
+
+   Every AsyncCPE object runs as an asyncio task, and communicates with its
+   neighbors via AsyncConnectors, whose send/receive methods are awaitable.
+   The AsyncChainController has the interface of ChainController,
+   but its operations are coroutines:
+       async def main():
+           chain = AsyncChainController([3,1,2])
+           await chain.addLast(0, 7)
+           print(await chain.member(0, 7))
+           await chain.stop()
+       asyncio.run(main())
+   An AsyncChainController must be created while the event loop is running.
+   Many chains can be served by one event loop; no CPE owns a thread.
+
+   AsyncCPE operations are the generators of CoopCPE (see coopChain.py);
+   only the way in which a waiting CPE is suspended and resumed differs."""
+
+# ==============================================================================
+
+import asyncio
+import types
+
+from coopChain import CoopConnector, CoopCPE
+from chain_2_controller import *
+
+# ==============================================================================
+
+@types.coroutine
+def _resume(generator):
+    """Makes a CPE generator awaitable, so that it can run as a task."""
+    return (yield from generator)
+
+class AsyncScheduler:
+    """Creates the tasks of the AsyncCPE objects of a single chain."""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.tasks = []
+        self.buffer = [] # used by chain2list and register2list of this chain.
+        self.snapshot = None # the buffer of the snapshot being taken.
+        self.registers = RegisterFile(CHANNELS) # the words and bits of the CPEs.
+
+    def spawn(self, generator):
+        self.tasks.append(self.loop.create_task(_resume(generator)))
+
+# ==============================================================================
+
+class AsyncConnector(CoopConnector):
+    """A CoopConnector whose waiting side awaits an asyncio future.
+       The send_*/receive_* methods are awaitable:
+           await connector.send_w(word)
+           word = await connector.receive_w()
+       The g-prefixed generators are used inside AsyncCPE operations."""
+
+    __slots__ = ()
+
+    def _post(self, kind):
+        """Generator. Publish data of the given kind and wait until taken."""
+        self.status = kind
+        receiver = self.receiver
+        if receiver is not None:
+            self.receiver = None
+            receiver.set_result(None)
+        posted = self.taken
+        while self.taken == posted:
+            self.sender = self.scheduler.loop.create_future()
+            yield from self.sender
+
+    def _wait(self, kind):
+        """Generator. Wait until data of the given kind is published."""
+        while self.status == "ready":
+            self.receiver = self.scheduler.loop.create_future()
+            yield from self.receiver
+        if self.status != kind:
+            raise TypeError("Connector mismatch: sent %s, receive %s." %
+                            (self.status, kind))
+
+    def _take(self):
+        self.status = "ready"
+        self.taken += 1
+        sender = self.sender
+        if sender is not None:
+            self.sender = None
+            sender.set_result(None)
+
+    # SEND and RECEIVE, awaitable -------------------------------
+
+    @types.coroutine
+    def send_o(self, operation, *channels):
+        yield from self.gsend_o(operation, *channels)
+
+    @types.coroutine
+    def send_w(self, word):
+        yield from self.gsend_w(word)
+
+    @types.coroutine
+    def send_W(self, word, bit):
+        yield from self.gsend_W(word, bit)
+
+    @types.coroutine
+    def send_b(self, bit):
+        yield from self.gsend_b(bit)
+
+    @types.coroutine
+    def send_B(self, bit, bit2):
+        yield from self.gsend_B(bit, bit2)
+
+    @types.coroutine
+    def receive_o(self):
+        return (yield from self.greceive_o())
+
+    @types.coroutine
+    def receive_w(self):
+        return (yield from self.greceive_w())
+
+    @types.coroutine
+    def receive_W(self):
+        return (yield from self.greceive_W())
+
+    @types.coroutine
+    def receive_b(self):
+        return (yield from self.greceive_b())
+
+    @types.coroutine
+    def receive_B(self):
+        return (yield from self.greceive_B())
+
+# ==============================================================================
+
+class AsyncCPE(CoopCPE):
+    """Chain Processing Element running as an asyncio task.
+       It implements the same operations as CoopCPE."""
+
+    __slots__ = ()
+
+    connectorClass = AsyncConnector
+
+# ==============================================================================
+
+class AsyncChainController():
+    """The interface of ChainController, with coroutine operations.
+       The complexity of every operation is the same as in ChainController."""
+
+    def __init__(self, *columns):
+        self.chain = ChainController._setupChain(
+            AsyncCPE(AsyncScheduler()), *columns)
+        self.connectorLower = self.chain.connectorUpper
+
+    async def stop(self):
+        """Terminate all the tasks/CPE objects in the self.chain. Each one
+           terminates after completing all previously requested operations.
+           *Not* a part of the self.chain controller interface."""
+        await self.connectorLower.send_o("stop")
+        await asyncio.gather(*self.chain.scheduler.tasks)
+
+    async def report(self, base=10, detailed=True):
+        """For debugging only. Not a part of the model.
+           The header of ChainController.report is not printed."""
+        base = baseCheck(base)
+        if detailed:
+            await self.connectorLower.send_o("printRepr" + str(base))
+        else:
+            await self.connectorLower.send_o("printStr")
+        await self.connectorLower.receive_b() # synchronization
+
+    async def chain2list(self, channel, base=10):
+        """For debugging only. Not a part of the model.
+           Returns a list equivalent to the specified channel,
+           or None if the channel is not properly terminated."""
+        return ChainController._inBase(
+            (await self._snapshot((channel,)))[channel], baseCheck(base))
+
+    async def chain2lists(self, base=10):
+        """For debugging only. Not a part of the model.
+           Returns a list of 3 items; see ChainController.chain2lists."""
+        base = baseCheck(base)
+        return [ChainController._inBase(words, base)
+                for words in await self.snapshot()]
+
+    async def snapshot(self, asArrays=False):
+        """For debugging only. Not a part of the model.
+           See ChainController.snapshot."""
+        if asArrays and numpy is None:
+            raise ImportError("snapshot(asArrays=True) requires NumPy.")
+        columns = await self._snapshot(range(CHANNELS))
+        if asArrays:
+            columns = [None if c is None else numpy.array(c, dtype=numpy.int64)
+                       for c in columns]
+        return columns
+
+    async def _snapshot(self, channels):
+        buffer = [[] for channel in range(CHANNELS)]
+        self.chain.scheduler.snapshot = buffer
+        await self.connectorLower.send_o("snapshot", *channels)
+        await self.connectorLower.receive_b() # synchronization
+        self.chain.scheduler.snapshot = None
+        return buffer
+
+    async def register2list(self, channel, base=10):
+        """For debugging only. Not a part of the model.
+           See ChainController.register2list."""
+        buffer = self.chain.scheduler.buffer
+        buffer.clear()
+        await self.connectorLower.send_o("register2list", channel)
+        badEnding = await self.connectorLower.receive_b() # synchronization
+        if badEnding:
+            return None
+        return ChainController._inBase(buffer.copy(), baseCheck(base))
+
+    # === LIST OPERATIONS, top CPE operations =================================
+
+    async def isEmpty(self, channelA):
+        """Theta(1)xTheta(1), non-propagating."""
+        await self.connectorLower.send_o("isEmpty", channelA)
+        return await self.connectorLower.receive_b()
+
+    async def clear(self, channelA):
+        """Theta(1)xTheta(1), non-propagating."""
+        await self.connectorLower.send_o("clear", channelA)
+
+    async def clear2(self, channelA, channelB):
+        """Theta(1)xTheta(1), non-propagating."""
+        await self.connectorLower.send_o("clear2", channelA, channelB)
+
+    async def first(self, channelA):
+        """Returns the first/top word from the channel or raises EmptyError.
+           Theta(1)xTheta(1), non-propagating."""
+        await self.connectorLower.send_o("first", channelA)
+        word, empty = await self.connectorLower.receive_W()
+        if empty:
+            raise EmptyError(
+                "first: Cannot peek at first item in empty channel %s, self.chain %s."
+                             % (channelA, self.chain.chainName))
+        return word
+
+    top = first
+
+    # === LIST OPERATIONS, whole chain operations =============================
+
+    async def copy(self, channelA, resultChannel):
+        """Theta(1)xTheta(n), propagation |."""
+        await self.connectorLower.send_o("copy", channelA, resultChannel)
+
+    async def move(self, channelA, resultChannel):
+        """Theta(1)xTheta(n), propagation |."""
+        await self.connectorLower.send_o("move", channelA, resultChannel)
+
+    async def swap(self, channelA, channelB):
+        """Theta(1)xTheta(n), propagation |."""
+        await self.connectorLower.send_o("swap", channelA, channelB)
+
+    async def setAll(self, channelA, word):
+        """Theta(1)xTheta(n), propagation |."""
+        await self.connectorLower.send_o("setAll", channelA)
+        await self.connectorLower.send_w(word)
+
+    async def member(self, channelA, word):
+        """Returns True or False.
+           O(n)xO(n), propagation |/."""
+        await self.connectorLower.send_o("member", channelA)
+        await self.connectorLower.send_w(word)
+        return await self.connectorLower.receive_b()
+
+    # --- LIST OPERATIONS, top operations -------------------------------------
+
+    async def addFirst(self, channelA, word): # push
+        """Theta(1)xTheta(n), propagation |."""
+        await self.connectorLower.send_o("push", channelA)
+        await self.connectorLower.send_w(word)
+
+    push = addFirst
+
+    async def addFirstPoor(self, channelA, word):
+        """Theta(n)xTheta(n), propagation |/."""
+        await self.connectorLower.send_o("pushPoor", channelA)
+        await self.connectorLower.send_w(word)
+
+    async def removeGetFirst(self, channelA): # pull
+        """Removes and returns the first/top word, or raises EmptyError.
+           Theta(1)xTheta(n), propagation |."""
+        await self.connectorLower.send_o("pull", channelA)
+        word, empty = await self.connectorLower.receive_W()
+        if empty:
+            raise EmptyError(
+            "pull: Cannot remove first from empty channel %s, self.chain %s."
+                             % (channelA, self.chain.chainName))
+        return word
+
+    removeFirst = removeGetFirst
+    pop = removeGetFirst
+    dequeue = removeGetFirst
+    pull = removeGetFirst
+
+    async def replaceGetFirst(self, channelA, word):
+        """Returns the first/top word and replaces it, or raises EmptyError.
+           Theta(1)xTheta(1), non-propagating."""
+        await self.connectorLower.send_o("replaceGetFirst", channelA)
+        await self.connectorLower.send_w(word)
+        oldData, empty = await self.connectorLower.receive_W()
+        if empty:
+            raise EmptyError(
+            "replaceGetFirst: Cannot replace first in empty channel %s, self.chain %s."
+                             % (channelA, self.chain.chainName))
+        return oldData
+
+    replaceFirst = replaceGetFirst
+
+    # --- LIST OPERATIONS, bottom operations ----------------------------------
+
+    async def last(self, channelA):
+        """Returns last/bottom word in the channel or raises EmptyError.
+           Theta(n)xTheta(n), propagation |/."""
+        await self.connectorLower.send_o("last", channelA)
+        word, empty = await self.connectorLower.receive_W()
+        if empty:
+            raise EmptyError(
+                "last: Cannot peek at last in empty channel %s, self.chain %s."
+                             % (channelA, self.chain.chainName))
+        return word
+
+    end = last
+    bottom = last
+
+    async def addLast(self, channelA, word):
+        """Theta(1)xTheta(n), propagation |."""
+        await self.connectorLower.send_o("addLast", channelA)
+        await self.connectorLower.send_w(word)
+
+    enqueue = addLast
+
+    async def removeLast(self, channelA):
+        """Removes last/bottom word, or raises EmptyError.
+           Theta(1)xTheta(n), propagation |."""
+        await self.connectorLower.send_o("removeLast", channelA)
+        empty = await self.connectorLower.receive_b()
+        if empty:
+            raise EmptyError(
+                "Cannot remove last from an empty channel %s, self.chain %s."
+                             % (channelA, self.chain.chainName))
+
+    async def removeGetLast(self, channelA):
+        """Removes and returns last/bottom word, or raises EmptyError.
+           Theta(n)xTheta(n), propagation |/."""
+        await self.connectorLower.send_o("removeGetLast", channelA)
+        word, empty = await self.connectorLower.receive_W()
+        if empty:
+            raise EmptyError(
+            "removeGetLast: Cannot remove last from empty channel %s, self.chain %s."
+                             % (channelA, self.chain.chainName))
+        return word
+
+    async def replaceLast(self, channelA, word):
+        """Replaces last/bottom word, or raises EmptyError.
+           Theta(1)xTheta(n), propagation |."""
+        await self.connectorLower.send_o("replaceLast", channelA)
+        await self.connectorLower.send_w(word)
+        empty = await self.connectorLower.receive_b()
+        if empty:
+            raise EmptyError(
+                "replaceLast: Cannot replace last in empty channel %s, self.chain %s."
+                             % (channelA, self.chain.chainName))
+
+    async def replaceGetLast(self, channelA, word):
+        """Returns last/bottom word and replaces it, or raises EmptyError.
+           Theta(n)xTheta(n), propagation |/."""
+        await self.connectorLower.send_o("replaceGetLast", channelA)
+        await self.connectorLower.send_w(word)
+        word, empty = await self.connectorLower.receive_W()
+        if empty:
+            raise EmptyError(
+                "replaceGetLast: Cannot replace last in empty channel %s, self.chain %s."
+                             % (channelA, self.chain.chainName))
+        return word
+
+    # --- LIST OPERATIONS, rotations ------------------------------------------
+
+    async def rotateDown(self, channelA):
+        """Theta(1)xTheta(n), propagation |."""
+        await self.connectorLower.send_o("rotateDown", channelA)
+        word, empty = await self.connectorLower.receive_W()
+        if empty:
+            raise EmptyError(
+                "rotateDown: Cannot rotate down empty channel %s, self.chain %s."
+                             % (channelA, self.chain.chainName))
+        return word
+
+    rotate = rotateDown
+
+    async def rotateUp(self, channelA):
+        """Theta(n)xTheta(n), propagation |/."""
+        await self.connectorLower.send_o("rotateUp", channelA)
+        word, empty = await self.connectorLower.receive_W()
+        if empty:
+            raise EmptyError("rotateUp: Cannot rotate up empty channel %s, self.chain %s."
+                             % (channelA, self.chain.chainName))
+        return word
+
+    # --- LIST OPERATIONS, reverse --------------------------------------------
+
+    async def reverseSimplest(self, channelA, resultChannel):
+        """Theta(n)xTheta(n)."""
+        await self.connectorLower.send_o("clear", resultChannel)
+        while True:
+            await self.connectorLower.send_o("pull", channelA)
+            word, empty = await self.connectorLower.receive_W()
+            if empty:
+                break
+            else:
+                await self.connectorLower.send_o("push", resultChannel)
+                await self.connectorLower.send_w(word)
+
+    async def reverseSimple(self, channelA, resultChannel):
+        """Theta(n)xTheta(n)."""
+        await self.connectorLower.send_o("reverseSimple", channelA, resultChannel)
+
+    async def reverse(self, channelA, resultChannel):
+        """Theta(n)xTheta(n)."""
+        await self.connectorLower.send_o("reverse", channelA, resultChannel)
+
+    # === ORDER OPERATIONS ====================================================
+
+    async def minimum(self, channelA):
+        """Returns the minimum element from the channel.
+           Theta(n)xTheta(n), propagation: |/."""
+        await self.connectorLower.send_o("min", channelA)
+        word, empty = await self.connectorLower.receive_W()
+        if empty:
+            raise EmptyError(
+                "min: there is no min value in an empty channel %s of chain %s."
+                             % (channelA, self.chain.chainName))
+        return word
+
+    async def memberNonDecreasing(self, channelA, word):
+        """O(n)xO(n), propagation: |/."""
+        await self.connectorLower.send_o("memberND", channelA)
+        await self.connectorLower.send_w(word)
+        return await self.connectorLower.receive_b()
+
+    memberSorted = memberNonDecreasing
+
+    async def insertNonDecreasing(self, channelA, word):
+        """Theta(1)xTheta(n), propagation: |."""
+        await self.connectorLower.send_o("insertND", channelA)
+        await self.connectorLower.send_w(word)
+
+    insert = insertNonDecreasing
+
+    async def insertUniqueIncreasing(self, channelA, word):
+        """Theta(1)xO(n), propagation: |."""
+        await self.connectorLower.send_o("insertUniqueI", channelA)
+        await self.connectorLower.send_w(word)
+
+    insertUnique = insertUniqueIncreasing
+
+    # --- ORDER OPERATIONS, sorts ---------------------------------------------
+
+    async def insertAllNonDecreasingSimple(self, channelA, channelB):
+        """Theta(m)xTheta(m+n)."""
+        while True:
+            await self.connectorLower.send_o("pull", channelA)
+            word, empty = await self.connectorLower.receive_W()
+            if empty:
+                break
+            else:
+                await self.connectorLower.send_o("insertND", channelB)
+                await self.connectorLower.send_w(word)
+
+    async def insertAllNonDecreasing(self, channelA, channelB):
+        """Theta(m)xTheta(m+n)."""
+        await self.connectorLower.send_o("insertAllND", channelA, channelB)
+
+    async def iSort(self, channelA):
+        """Theta(n)xTheta(n)."""
+        await self.connectorLower.send_o("iSort", channelA)
+
+    insertionSort = insertionSortND = insertionSortNonDecreasing = iSort
+
+    async def sSort(self, channelA):
+        await self.connectorLower.send_o("sSort", channelA)
+
+    selectionSort = selectionSortND = selectionSortNonDecreasing = sSort
+
+    async def bSort(self, channelA):
+        await self.connectorLower.send_o("bSort", channelA)
+
+    bubbleSort = bubbleSortND = bubbleSortNonDecreasing = bSort
+
+    # --- ORDER OPERATIONS, merge ---------------------------------------------
+
+    async def mergeNonDecreasingSimple(self, channelA, channelB, resultChannel):
+        await self.connectorLower.send_o("mergeNDsimple",
+                                         channelA, channelB, resultChannel)
+
+    async def mergeNonDecreasing(self, channelA, channelB):
+        await self.connectorLower.send_o("mergeND", channelA, channelB)
+
+    mergeIntoNonDecreasing = mergeNonDecreasing
+    mergeInto = mergeNonDecreasing
+    merge = mergeNonDecreasing
+
+    # === INDEXING OPERATIONS =================================================
+
+    async def length(self, channelA):
+        await self.connectorLower.send_o("length", channelA)
+        return await self.connectorLower.receive_w()
+
+    async def getItem(self, channelA, index):
+        """If index is valid, returns the word at index
+           otherwise raises exceptions."""
+        if not isinstance(index, int):
+            raise TypeError("index should be an integer.")
+        if index < 0:
+            raise IndexError("index should be non-negative")
+        await self.connectorLower.send_o("getItem", channelA)
+        await self.connectorLower.send_w(index)
+        item, notFound = await self.connectorLower.receive_W()
+        if notFound:
+            raise IndexError("No such index in the list.")
+        return item
+
+    async def setItem0(self, channelA, index, item):
+        if not isinstance(index, int):
+            raise TypeError("index should be an integer.")
+        if index < 0:
+            raise IndexError("index should be non-negative")
+        await self.connectorLower.send_o("setItem0", channelA)
+        await self.connectorLower.send_w(index)
+        await self.connectorLower.send_w(item)
+
+    async def setItem(self, channelA, index, item):
+        if not isinstance(index, int):
+            raise TypeError("index should be an integer.")
+        if index < 0:
+            raise IndexError("index should be non-negative")
+        await self.connectorLower.send_o("setItem", channelA)
+        await self.connectorLower.send_w(index)
+        await self.connectorLower.send_w(item)
+        notFound = await self.connectorLower.receive_b()
+        if notFound:
+            raise IndexError("No such index in the list.")
+
+    async def getSetItem(self, channelA, index, item):
+        if not isinstance(index, int):
+            raise TypeError("index should be an integer.")
+        if index < 0:
+            raise IndexError("index should be non-negative")
+        await self.connectorLower.send_o("getSetItem", channelA)
+        await self.connectorLower.send_w(index)
+        await self.connectorLower.send_w(item)
+        item, notFound = await self.connectorLower.receive_W()
+        if notFound:
+            raise IndexError("No such index in the list.")
+        return item
+
+    replaceAtIndex = setGetItem = getSetItem
+
+    async def memberIndex(self, channelA, item):
+        await self.connectorLower.send_o("memberIndex", channelA)
+        await self.connectorLower.send_w(item)
+        index, notFound = await self.connectorLower.receive_W()
+        if notFound:
+            raise ValueError("No such item in the list.")
+        return index
+
+    async def insertAtIndex0(self, channelA, index, item):
+        if not isinstance(index, int):
+            raise TypeError("index should be an integer.")
+        if index < 0:
+            raise IndexError("index should be non-negative")
+        await self.connectorLower.send_o("insertAtIndex0", channelA)
+        await self.connectorLower.send_w(index)
+        await self.connectorLower.send_w(item)
+
+    async def insertAtIndex(self, channelA, index, item):
+        if not isinstance(index, int):
+            raise TypeError("index should be an integer.")
+        if index < 0:
+            raise IndexError("index should be non-negative")
+        await self.connectorLower.send_o("insertAtIndex", channelA)
+        await self.connectorLower.send_w(index)
+        await self.connectorLower.send_w(item)
+        badIndex = await self.connectorLower.receive_b()
+        if badIndex:
+            raise IndexError("No such index in the list.")
+
+    async def deleteAtIndex(self, channelA, index):
+        if not isinstance(index, int):
+            raise TypeError("index should be an integer.")
+        if index < 0:
+            raise IndexError("index should be non-negative")
+        await self.connectorLower.send_o("deleteAtIndex", channelA)
+        await self.connectorLower.send_w(index)
+
+    async def deleteGetAtIndex(self, channelA, index):
+        if not isinstance(index, int):
+            raise TypeError("index should be an integer.")
+        if index < 0:
+            raise IndexError("index should be non-negative")
+        await self.connectorLower.send_o("deleteGetAtIndex", channelA)
+        await self.connectorLower.send_w(index)
+        item, badIndex = await self.connectorLower.receive_W()
+        if badIndex:
+            raise IndexError("No such index in the list.")
+        return item
+
+    # === BULK OPERATIONS ======================================================
+
+    async def addAllFirst(self, channelA, words):
+        await self.connectorLower.send_o("addAllFirst", channelA)
+        for word in words:
+            await self.connectorLower.send_W(word, False)
+        await self.connectorLower.send_W(Any, True)
+
+    async def addAllLast(self, channelA, words):
+        await self.connectorLower.send_o("addAllLast", channelA)
+        for word in words:
+            await self.connectorLower.send_W(word, False)
+        await self.connectorLower.send_W(Any, True)
+
+    async def pullMany(self, channelA, n):
+        if not isinstance(n, int):
+            raise TypeError("n should be an integer.")
+        if n < 0:
+            raise ValueError("n should be non-negative")
+        await self.connectorLower.send_o("pullMany", channelA)
+        await self.connectorLower.send_w(n)
+        return await self._receiveStream()
+
+    async def drain(self, channelA):
+        await self.connectorLower.send_o("drain", channelA)
+        return await self._receiveStream()
+
+    async def _receiveStream(self):
+        words = []
+        while True:
+            word, end = await self.connectorLower.receive_W()
+            if end:
+                return words
+            words.append(word)
+
+############################################################################
@@ -4,8 +4,16 @@
 
 # ==============================================================================
 
+from collections import deque
+
 from myThreading import *
-from connector import Connector
+from connector import Connector, ConditionConnector, TwoPhaseConnector, \
+                      BufferedConnector, ReleaseConnector, TracingConnector, \
+                      ClockedConnector, threadClock, resetClocks, \
+                      ActivityConnector, KINDS
+from signatures import SIGNATURES
+from signatureCheck import assertSignatures
+from registers import RegisterFile
 
 # ==============================================================================
 
@@ -15,9 +23,7 @@ TEMP_SPACE = 2 # valid indexes: 0, 1 (non-negative integers)
 
 WORD_SIZE = 8 # in bits, excludes the continuation bit.
 
-# ==============================================================================
-
-global_chain2list = [] # a global object used by chain2list and register2list.
+ANY_TEMP = (Any,)*TEMP_SPACE # the temporary registers at every activation.
 
 # ==============================================================================
 
@@ -51,6 +57,161 @@ def number2string(number, base):
     else: # base == 10:
         return str(number)
     
+def checkChannels(operation, channels):
+    """Value checking of the channel numbers received with an operation;
+       (type checking is done by the connector)."""
+    for ch in channels:
+        if ch >= 0:
+            if ch >= CHANNELS:
+                raise ValueError(
+                "send_o%s: data channel index %s should be < %s." %
+                ((operation,)+channels, ch, CHANNELS))
+        elif ch < 0:
+            raise ValueError(
+                "send_o%s: channel index %s should be >= 0." %
+                ((operation,)+channels, ch))
+    if len(set(channels)) < len(channels):
+        raise ValueError("send_o%s: channels should not repeat." %
+                         str((operation,)+channels))
+
+# Operation codes: send_o accepts an operation name or its opcode,
+# the index of the name in OPERATIONS.
+OPERATIONS = tuple(SIGNATURES)
+OPCODES = {name: code for code, name in enumerate(OPERATIONS)}
+
+def buildDispatch(cls, fallback=None):
+    """Returns the dispatch table of a CPE class: a dictionary mapping
+       every operation name and every opcode to a pair
+       (operation name, function implementing it), e.g.
+           "member" -> ("member", cls.member),  OPCODES["member"] -> idem.
+       A missing operation is taken from the fallback class, if given.
+       Raises TypeError if an operation is not implemented by a method."""
+    dispatch = {}
+    for code, name in enumerate(OPERATIONS):
+        function = getattr(cls, name, None)
+        if function is None and fallback is not None:
+            function = getattr(fallback, name, None)
+        if not callable(function):
+            raise TypeError("%s: operation %s should be a method." %
+                            (cls.__name__, name))
+        dispatch[name] = dispatch[code] = (name, function)
+    return dispatch
+
+# ==============================================================================
+
+class ChainState:
+    """The state shared by all the CPE objects of one chain.
+       It is used by the testing tools only, not a part of the model."""
+
+    def __init__(self):
+        self.snapshot = None # the buffer of the snapshot being taken.
+        self.buffer = [] # the words collected by chain2list, register2list.
+        self.registers = RegisterFile(CHANNELS) # the words and bits of the CPEs.
+        self.pool = None # the CPEPool of the chain, if any.
+        self.release = False # True: the CPEs run without checks, see run.
+
+# ==============================================================================
+
+class CPEPool:
+    """Idle CPE objects of one chain, constructed and started ahead of
+       demand, so that extend can attach one at once instead of creating
+       and starting a thread in the middle of an operation.
+       Not a part of the model: it simulates an infinite chain better.
+
+       A filler thread keeps up to chunk idle CPEs: when fewer than
+       chunk//2 (at least 1) are left, it starts a chunk of new ones.
+       take() returns the oldest idle CPE (a hit), or, if there is none,
+       the one being started by the filler, or a new one, created and
+       started at once (a miss). The CPEs are created under a lock,
+       in the order in which they are taken, so their rows of
+       the register file follow the chain; the filler starts its CPE
+       outside the lock, so that a hit does not wait for it.
+       self.hits, self.misses count the takes; self.created counts
+       the CPEs started by the pool."""
+
+    def __init__(self, top, chunk):
+        """top is the top CPE object of the chain, chunk >= 1."""
+        if chunk < 1:
+            raise ValueError("CPEPool: chunk should be >= 1.")
+        self.peClass = type(top)
+        self.chainName = top.chainName
+        self.connectorClass = top.connectorClass
+        self.chainState = top.chainState
+        self.chunk = chunk
+        self.low = max(1, chunk // 2) # refill below low.
+        self.idle = deque() # started CPEs, oldest first.
+        self.starting = None # the CPE being started by the filler.
+        self.condition = threading.Condition(threading.Lock())
+        self.closed = False
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self.filler = threading.Thread(target=self._fill, daemon=True,
+                                       name=self.chainName + ".pool")
+        self.filler.start()
+
+    def _new(self):
+        """Create a CPE, not started; called with the lock held."""
+        pe = self.peClass(self.chainName, self.connectorClass, self.chainState)
+        pe.peId = self.chainState.registers.rows # its row + 1.
+        pe.name = self.chainName + "." + str(pe.peId)
+        self.created += 1
+        return pe
+
+    def _fill(self):
+        """The filler thread."""
+        while True:
+            with self.condition:
+                while not self.closed and len(self.idle) >= self.low:
+                    self.condition.wait()
+                if self.closed:
+                    return
+            for i in range(self.chunk):
+                with self.condition: # a take can get in between.
+                    if self.closed or len(self.idle) >= self.chunk:
+                        break
+                    pe = self.starting = self._new()
+                pe.start()
+                with self.condition:
+                    self.starting = None
+                    closed = self.closed
+                    if not closed:
+                        self.idle.append(pe)
+                    self.condition.notify_all() # a take may be waiting.
+                if closed:
+                    pe.connectorUpper.send_o("stop")
+                    return
+
+    def take(self):
+        """Theta(1) on a hit. Returns a started CPE object, not connected."""
+        with self.condition:
+            if self.idle:
+                self.hits += 1
+            else:
+                self.misses += 1
+                while not self.idle and self.starting is not None:
+                    self.condition.wait()
+            if len(self.idle) <= self.low:
+                self.condition.notify_all() # wake up the filler.
+            if self.idle:
+                return self.idle.popleft()
+            pe = self._new()
+            pe.start()
+        return pe
+
+    def close(self):
+        """Stop the filler thread and the idle CPEs. A later take
+           is a miss: the new CPE is attached to the chain,
+           so it is stopped with the chain."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+            idle = list(self.idle)
+            self.idle.clear()
+        self.filler.join()
+        for pe in idle:
+            pe.connectorUpper.send_o("stop")
+
 # ==============================================================================
 
 class EmptyError(LookupError):
@@ -58,7 +219,23 @@ class EmptyError(LookupError):
 
 # ==============================================================================
 
-class CPE(threading.Thread):
+class CPEThread(threading.Thread):
+    """The thread running a CPE object, self.pe.
+       Not a part of the model."""
+
+    def __init__(self, pe):
+        super().__init__(target=pe.run, name=pe.name)
+        self.pe = pe
+
+def chainPEs(chainName):
+    """The started CPE objects of the chain named chainName,
+       found through their threads. Not a part of the model."""
+    return [t.pe for t in threading.enumerate()
+            if isinstance(t, CPEThread) and t.pe.chainName == chainName]
+
+# ==============================================================================
+
+class CPE:
     """Chain Processing Element.
        A CPE object models a single asynchronous sequential circuit,
        or equivalently a one-element free chain of such circuits.
@@ -70,7 +247,8 @@ class CPE(threading.Thread):
        The first CPE object is allocated by the main thread and it is our
        entry point to a free chain. If needed, that first CPE object
        will allocate a new CPE object, and the new object can allocate the next,
-       etc. The chain will grow dynamically; it never shrinks.
+       etc. The chain will grow dynamically; it shrinks only on request,
+       when the chain controller calls compact (a testing tool).
 
        It is useful to think about a CPE object in two ways:
        1. as a single CPE object,
@@ -86,15 +264,35 @@ class CPE(threading.Thread):
 
        Every CPE object has additional auxiliary fields used in operations that
        do not modify the CPE content but require transmission of data through
-       the CPE; they are also used by push."""
+       the CPE; they are also used by push.
+
+       The state of a CPE is compact: its fields are __slots__,
+       its words and bits are its row of the register file of the chain
+       (see registers.py), and the thread running it is a separate
+       CPEThread, self.thread."""
+
+    __slots__ = ("chainName", "peId", "name", "connectorClass", "chainState",
+                 "connectorUpper", "connectorLower", "operation", "channels",
+                 "word", "bit", "temp_w", "temp_b", "thread")
 
     chainId = 0
+    dispatch = {} # operation name or opcode -> (name, function); see below.
+
+    def __init_subclass__(cls, **kwargs):
+        """A subclass gets its own dispatch table, validated once;
+           its methods are checked against the signatures."""
+        super().__init_subclass__(**kwargs)
+        cls.dispatch = buildDispatch(cls)
+        assertSignatures(cls)
 
-    def __init__(self, chainName=None): # deprecated: chainName
+    def __init__(self, chainName=None, connectorClass=Connector,
+                 chainState=None): # deprecated: chainName
         """Theta(1). Create an empty CPE with an upper connector.
            A string can be provided for chainName (best up to 5 characters long)
-           otherwise a distinct chainName will be an automatically generated."""
-        super().__init__()
+           otherwise a distinct chainName will be an automatically generated.
+           connectorClass is the class of the connectors of the whole chain,
+           e.g. Connector or ConditionConnector; not a part of the model.
+           chainState is the ChainState of the chain, new if None."""
         # chainName and chainId, for debugging only, not a part of the model.
         self.peId = 1
         if chainName is None:
@@ -103,16 +301,29 @@ class CPE(threading.Thread):
         else:
             self.chainName = chainName
         self.name = self.chainName + "." + str(self.peId) # CPE obj./thread name
+        self.thread = None # the CPEThread, once started.
         # The following fields model a CPE circuit.
-        self.connectorUpper = Connector()
+        self.connectorClass = connectorClass
+        self.chainState = ChainState() if chainState is None else chainState
+        self.connectorUpper = connectorClass()
         self.connectorLower = None
         self.operation = Any # a string naming the operation/method.
         self.channels = Any # a tuple of non-negative integers, possibly empty.
-        self.word = [Any]*(CHANNELS) # words
-        self.bit = [Any]*(CHANNELS) # bits
+        self.word, self.bit = self.chainState.registers.newRow() # words, bits
         # A standard use: self.bit[i]=False means self.word[i] is not empty.
-        self.temp_w = [Any]*TEMP_SPACE # not preserved between activations
-        self.temp_b = [Any]*TEMP_SPACE
+        self.temp_w = list(ANY_TEMP) # not preserved between activations
+        self.temp_b = list(ANY_TEMP)
+
+    def start(self):
+        """Start the thread running the CPE; cf. threading.Thread.start.
+           Not a part of the model."""
+        self.thread = CPEThread(self)
+        self.thread.start()
+
+    def join(self):
+        """Wait until the thread running the CPE terminates.
+           Not a part of the model."""
+        self.thread.join()
 
     def extend(self):
         """Connect a new CPE object below self, conditionally,
@@ -121,13 +332,26 @@ class CPE(threading.Thread):
            either that the chain of CPE's is inifinie
            or that it can be instantly extended when needed.
            In our simulation we extend the chain by one CPE at a time,
-           when needed, in Theta(1) time."""
+           when needed, in Theta(1) time.
+           With a CPEPool, the new CPE object is already started."""
         if self.connectorLower is None:
-            lowerPE = CPE(self.chainName)
-            lowerPE.peId = self.peId+1
-            lowerPE.name = self.chainName + "." + str(lowerPE.peId)
-            self.connectorLower = lowerPE.connectorUpper
-            lowerPE.start()
+            if self.chainState.pool is not None:
+                lowerPE = self.chainState.pool.take()
+                self.connectorLower = lowerPE.connectorUpper
+            else:
+                lowerPE = self._newLowerPE()
+                self.connectorLower = lowerPE.connectorUpper
+                lowerPE.start()
+
+    def _newLowerPE(self):
+        """Create, but do not connect or start, a CPE object
+           to be placed below self in the same chain.
+           Not a part of the model."""
+        lowerPE = type(self)(self.chainName, self.connectorClass,
+                             self.chainState)
+        lowerPE.peId = self.peId+1
+        lowerPE.name = self.chainName + "." + str(lowerPE.peId)
+        return lowerPE
 
     def stop(self):
         """Stop all threads in the chain.
@@ -257,9 +481,8 @@ class CPE(threading.Thread):
 
     def chain2list(self, channel):
         """For debugging only, not a part of the model."""
-        global global_chain2list
         if not self.bit[channel]: # if not empty:
-            global_chain2list.append(self.word[channel])
+            self.chainState.buffer.append(self.word[channel])
             if self.connectorLower is not None:
                 self.connectorLower.send_o("chain2list", channel)
                 badEnding = self.connectorLower.receive_b() # synchronization
@@ -269,10 +492,65 @@ class CPE(threading.Thread):
         elif self.bit[channel]: # if empty
             self.connectorUpper.send_b(False) # badEnding=False
             
+    def snapshot(self, *channels):
+        """For debugging only, not a part of the model.
+           Appends its words of the channels to the snapshot buffer
+           of the chain, a list of CHANNELS lists, then passes on down
+           the channels which are not empty here: all the channels
+           are collected in one pass. A channel which is not terminated
+           gets None in the buffer.
+           O(n)xO(n), propagation |/."""
+        buffer = self.chainState.snapshot
+        remaining = []
+        for channel in channels:
+            if not self.bit[channel]: # if not empty:
+                buffer[channel].append(self.word[channel])
+                remaining.append(channel)
+        if not remaining:
+            self.connectorUpper.send_b(False) # badEnding=False
+        elif self.connectorLower is not None:
+            self.connectorLower.send_o("snapshot", *remaining)
+            badEnding = self.connectorLower.receive_b() # synchronization
+            self.connectorUpper.send_b(badEnding)
+        elif self.connectorLower is None:
+            for channel in remaining:
+                buffer[channel] = None
+            self.connectorUpper.send_b(True) # badEnding=True
+
+    def compact(self, *channels):
+        """For debugging only, not a part of the model.
+           Keeps the CPEs down to the deepest one holding a word or
+           the terminator of a channel, stops all the CPEs below it,
+           and detaches them; answers the number of CPEs kept,
+           from self down. channels are the channels
+           whose content continues at self.
+           Theta(n)xTheta(n), propagation |/."""
+        remaining = [channel for channel in channels
+                     if not self.bit[channel]] # content continues below
+        if remaining and self.connectorLower is not None:
+            self.connectorLower.send_o("compact", *remaining)
+            kept = self.connectorLower.receive_w()
+            self.connectorUpper.send_w(kept + 1)
+        else:
+            if self.connectorLower is not None: # not needed below
+                self.connectorLower.send_o("stop")
+                self.connectorLower = None
+            self.connectorUpper.send_w(1)
+
+    def sync(self):
+        """For debugging only, not a part of the model.
+           Answers once all the CPEs below have completed the operations
+           requested before: the chain controller can then read
+           the register file of the chain.
+           Theta(n)xTheta(n), propagation |/."""
+        if self.connectorLower is not None:
+            self.connectorLower.send_o("sync")
+            self.connectorLower.receive_b() # synchronization
+        self.connectorUpper.send_b(Any)
+
     def register2list(self, channel):
         """For debugging only, not a part of the model."""
-        global global_chain2list
-        global_chain2list.append(self.word[channel])
+        self.chainState.buffer.append(self.word[channel])
         if self.bit[channel]: # if continued:
             if self.connectorLower is not None:
                 self.connectorLower.send_o("register2list", channel)
@@ -292,36 +570,45 @@ class CPE(threading.Thread):
         # are not parts of the model; they are used to time the operations.
         # A call to self.stop is not a part of the model;
         # it is used to terminate all threads in the chain.
+        if self.chainState.release:
+            return self._runRelease()
         while True:
             t = threadTime() # timing not a part of the model
-            self.operation, self.channels = self.connectorUpper.receive_o()
-            for ch in self.channels:
-                if ch >= 0:
-                    if ch >= CHANNELS:
-                        raise ValueError(
-                        "send_o%s: data channel index %s should be < %s." %
-                        ((self.operation,)+self.channels, ch, CHANNELS))
-                elif ch < 0:
-                    raise ValueError(
-                        "send_o%s: channel index %s should be >= 0." %
-                        ((self.operation,)+self.channels, ch))
-            for ch in self.channels:
-                if self.channels.count(ch) > 1:
-                    raise ValueError("send_o%s: channels should not repeat." %
-                                     str((self.operation,)+self.channels))
+            operation, self.channels = self.connectorUpper.receive_o()
+            try:
+                self.operation, method = self.dispatch[operation]
+            except KeyError:
+                raise ValueError("send_o%s: unknown operation." %
+                                 str((operation,)+self.channels)) from None
+            checkChannels(self.operation, self.channels)
             if self.operation != "printRepr" and self.operation != "printStr":
-                self.temp_w = [Any]*TEMP_SPACE
-                self.temp_b = [Any]*TEMP_SPACE
+                self.temp_w[:] = ANY_TEMP # reset in place
+                self.temp_b[:] = ANY_TEMP
             if self.operation == "stop":
                 self.stop()
                 break
             else:
                 # call self.operation with channels as arguments:
-                eval("self.%s(*%s)" % (self.operation, self.channels)) 
+                method(self, *self.channels)
             self.operation = Any
             self.channels = Any
             #threadLog("Have", self.word[channel], t) # timing
 
+    def _runRelease(self):
+        """The run loop of the release mode (see ChainController):
+           as run, without the checks of the operations and their channels
+           and without resetting the temporary registers.
+           An unknown operation raises KeyError."""
+        receive_o = self.connectorUpper.receive_o
+        dispatch = self.dispatch
+        while True:
+            operation, self.channels = receive_o()
+            self.operation, method = dispatch[operation]
+            if self.operation == "stop":
+                self.stop()
+                break
+            method(self, *self.channels)
+
     # === LIST OPERATIONS, top CPE operations ========================================
 
     def isEmpty(self, channelA):
@@ -775,5 +1062,129 @@ class CPE(threading.Thread):
     def deleteGetAtIndex(self, channelA):
         pass
 
+    # === BULK OPERATIONS =====================================================
+    # A stream is a sequence of send_W(word, False), one per word,
+    # ended by send_W(Any, True). Every CPE passes a stream on as it
+    # receives it, so the words of a stream move down (or up) the chain
+    # one after another, without waiting for each other.
+
+    def addAllFirst(self, channelA):
+        """Receives a stream of words from above, and inserts them
+           in front of the channel contents, in the same order.
+           Keeps the first word, passes the rest of the stream down,
+           followed by its old word.
+           Theta(k)xTheta(k+n), propagation |."""
+        # Domino:
+        # addAllFirst(A) v   -
+        #                W.. -
+        #                -   W..W
+        # addAllFirst(A) -   v
+        self.temp_w[0], self.temp_b[0] = self.connectorUpper.receive_W()
+        if self.temp_b[0]: # an empty stream: nothing changes.
+            return
+        self.temp_w[1], self.temp_b[1] = self.word[channelA], self.bit[channelA]
+        self.word[channelA], self.bit[channelA] = self.temp_w[0], False
+        self.extend()
+        if self.temp_b[1]: # this CPE was terminating the list.
+            self.connectorLower.send_o("clear", channelA)
+        self.connectorLower.send_o("addAllFirst", channelA)
+        while True:
+            self.temp_w[0], self.temp_b[0] = self.connectorUpper.receive_W()
+            if self.temp_b[0]:
+                break
+            self.connectorLower.send_W(self.temp_w[0], False)
+        if not self.temp_b[1]:
+            self.connectorLower.send_W(self.temp_w[1], False)
+        self.connectorLower.send_W(Any, True)
+
+    def addAllLast(self, channelA):
+        """Receives a stream of words from above, and appends them
+           to the channel contents, in the same order.
+           Theta(k)xTheta(k+n), propagation |."""
+        if not self.bit[channelA]:
+            # Domino:
+            # addAllLast(A) v-
+            #               W.W..
+            #               -W.W..
+            # addAllLast(A) -v
+            self.connectorLower.send_o("addAllLast", channelA)
+            while True:
+                self.temp_w[0], self.temp_b[0] = self.connectorUpper.receive_W()
+                self.connectorLower.send_W(self.temp_w[0], self.temp_b[0])
+                if self.temp_b[0]:
+                    break
+        elif self.bit[channelA]:
+            # Domino:
+            # addAllLast(A) v
+            #               W..
+            #               -   W..
+            # clear(A) addAllLast(A) v
+            self.temp_w[0], self.temp_b[0] = self.connectorUpper.receive_W()
+            if self.temp_b[0]: # an empty stream: nothing changes.
+                return
+            self.word[channelA], self.bit[channelA] = self.temp_w[0], False
+            self.extend()
+            self.connectorLower.send_o("clear", channelA)
+            self.connectorLower.send_o("addAllLast", channelA)
+            while True:
+                self.temp_w[0], self.temp_b[0] = self.connectorUpper.receive_W()
+                self.connectorLower.send_W(self.temp_w[0], self.temp_b[0])
+                if self.temp_b[0]:
+                    break
+
+    def pullMany(self, channelA):
+        """Receives m, removes the first m words of the channel
+           (all of them, if there are fewer) and sends them up as a stream.
+           Sends up its word, then pulls m words from below: passes up
+           the first m-1 of them and keeps the m-th one.
+           Theta(m)xTheta(n), propagation |."""
+        # Domino:
+        # none         - W..W
+        #              - -
+        #              w W..W
+        # pullMany(A) v ^
+        self.temp_w[0] = self.connectorUpper.receive_w() # m
+        if self.bit[channelA] or self.temp_w[0] == 0:
+            self.connectorUpper.send_W(Any, True)
+            return
+        self.connectorUpper.send_W(self.word[channelA], False)
+        self.connectorLower.send_o("pullMany", channelA)
+        self.connectorLower.send_w(self.temp_w[0])
+        self.bit[channelA] = True # unless a word comes to replace it.
+        while True:
+            self.temp_w[1], self.temp_b[1] = self.connectorLower.receive_W()
+            if self.temp_b[1]:
+                break
+            self.temp_w[0] -= 1
+            if self.temp_w[0] > 0:
+                self.connectorUpper.send_W(self.temp_w[1], False)
+            else: # the m-th word replaces the word sent up.
+                self.word[channelA], self.bit[channelA] = self.temp_w[1], False
+        self.connectorUpper.send_W(Any, True)
+
+    def drain(self, channelA):
+        """Removes all the words of the channel,
+           and sends them up as a stream.
+           Theta(n)xTheta(n), propagation |."""
+        # Domino:
+        # none     - W..W
+        #          - W..W
+        # drain(A) v ^
+        if self.bit[channelA]:
+            self.connectorUpper.send_W(Any, True)
+            return
+        self.connectorUpper.send_W(self.word[channelA], False)
+        self.bit[channelA] = True
+        self.connectorLower.send_o("drain", channelA)
+        while True:
+            self.temp_w[0], self.temp_b[0] = self.connectorLower.receive_W()
+            self.connectorUpper.send_W(self.temp_w[0], self.temp_b[0])
+            if self.temp_b[0]:
+                break
+
+# ==============================================================================
+
+CPE.dispatch = buildDispatch(CPE) # built once, when the module is imported.
+assertSignatures(CPE) # raises TypeError if a method does not follow them.
 
 ###############################################################################
@@ -9,7 +9,15 @@
 # ==============================================================================
 
 from chain_1_class_PE import *
-import copy
+from coopChain import CoopScheduler, CoopCPE
+from shardedChain import ShardedChain
+from numpyChain import NumpyChain, numpy
+from protocolTrace import TraceRecorder
+from activityTrace import ActivityRecorder, writeActivity
+from criticalPath import operationEvents, criticalPath
+from deadlockWatchdog import DeadlockWatchdog
+import functools
+import operator
 
 # ==============================================================================
 
@@ -34,70 +42,264 @@ def baseCheck(base):
     
 class ChainController():
 
-    def __init__(self, *columns):
-        if len(columns)==0:
-            self.chain = CPE()
+    def __init__(self, *columns, engine="thread", processes=None, capacity=0,
+                 connector="event", depth=1, pool=0, mode="checked",
+                 trace=0, watchdog=0, clocks=False, activity=0):
+        """engine selects how the CPEs are executed:
+           "thread"  - every CPE is a separate thread (the default);
+           "coop"    - every CPE is a generator, all of them resumed by
+                       a single-threaded scheduler (see coopChain.py);
+           "process" - the chain is split into segments of CPE threads,
+                       one segment per worker process (see shardedChain.py);
+                       processes is the number of segments, by default
+                       the number of cores, and capacity is the minimal
+                       number of CPEs preallocated among the segments;
+           "numpy"   - the registers of all the CPEs are NumPy arrays,
+                       and operations are array transformations executed
+                       in lockstep (see numpyChain.py); requires NumPy;
+           a subclass of CPE - as "thread", with CPEs of that class.
+           connector selects the connectors between the CPE threads
+           (engines "thread" and "process"):
+           "event"     - Connector, req and ack are EventPlus objects;
+           "condition" - ConditionConnector, req and ack are guarded
+                         by a single Condition (faster, smaller);
+           "twoPhase"  - TwoPhaseConnector, as "condition" but with
+                         a 2-phase (transition signalling) protocol;
+           "buffered"  - BufferedConnector, a sender does not wait
+                         for the receiver unless depth messages
+                         are already waiting.
+           mode (engines "thread" and "process"):
+           "checked" - every message and every operation received by a CPE
+                       is checked (the default, for protocol development);
+           "release" - no checks: the connectors are ReleaseConnectors
+                       (connector must be "event" or "condition"),
+                       and the CPEs run CPE._runRelease.
+           trace > 0 (engine "thread" or a subclass of CPE) replaces
+           the connectors by TracingConnectors: no checks, but the last
+           trace messages are recorded in self.trace, a TraceRecorder,
+           and checked offline by verifyTrace (see protocolTrace.py).
+           watchdog > 0 (engine "thread" or a subclass of CPE) starts
+           self.watchdog, a DeadlockWatchdog sampling the threads every
+           watchdog seconds, which reports a deadlock between
+           two connector calls within 2*watchdog seconds
+           (see deadlockWatchdog.py).
+           clocks (engine "thread" or a subclass of CPE) replaces
+           the connectors by ClockedConnectors: every message carries
+           a Lamport timestamp, and measure reports the top and total
+           complexity of a call in logical steps; self.steps lists
+           the calls measured.
+           activity > 0 (engine "thread" or a subclass of CPE) replaces
+           the connectors by ActivityConnectors: the last activity
+           messages received by every CPE are recorded in self.activity,
+           an ActivityRecorder, saved by dumpActivity and drawn by
+           activityTrace.renderSVG (see activityTrace.py).
+           pool > 0 (engine "thread" or a subclass of CPE) keeps up to
+           pool idle CPEs started ahead of demand, for extend to attach
+           (see CPEPool); self.pool counts the hits and misses."""
+        self.engine = engine
+        connectorClass = ChainController._connectorClass(engine, connector,
+                                                         depth, mode)
+        release = mode == "release"
+        self.trace = None
+        if trace < 0:
+            raise ValueError("ChainController: trace should be >= 0.")
+        elif trace:
+            if engine in ["coop", "process", "numpy"]:
+                raise ValueError("ChainController: engine %s has no "
+                                 "trace." % engine)
+            elif connector not in ["event", "condition"]:
+                raise ValueError("ChainController: trace has "
+                                 "its own connectors.")
+            self.trace = TraceRecorder(trace)
+            connectorClass = functools.partial(TracingConnector, self.trace)
+        self.steps = None
+        if clocks:
+            if engine in ["coop", "process", "numpy"]:
+                raise ValueError("ChainController: engine %s has no "
+                                 "clocks." % engine)
+            elif connector not in ["event", "condition"] or trace or \
+                 mode != "checked":
+                raise ValueError("ChainController: clocks has "
+                                 "its own connectors.")
+            self.steps = []
+            connectorClass = ClockedConnector
+        self.activity = None
+        if activity < 0:
+            raise ValueError("ChainController: activity should be >= 0.")
+        elif activity:
+            if engine in ["coop", "process", "numpy"]:
+                raise ValueError("ChainController: engine %s has no "
+                                 "activity." % engine)
+            elif connector not in ["event", "condition"] or trace or \
+                 clocks or mode != "checked":
+                raise ValueError("ChainController: activity has "
+                                 "its own connectors.")
+            self.activity = ActivityRecorder(activity)
+            connectorClass = functools.partial(ActivityConnector,
+                                               self.activity)
+        if pool < 0:
+            raise ValueError("ChainController: pool should be >= 0.")
+        elif pool and engine in ["coop", "process", "numpy"]:
+            raise ValueError("ChainController: engine %s has no CPE pool."
+                             % engine)
+        if engine == "process":
+            self.chain = ShardedChain(ChainController._rows(*columns),
+                                      processes, capacity, connectorClass,
+                                      release)
+            self.connectorLower = self.chain.connectorUpper
+        elif engine == "numpy":
+            self.chain = NumpyChain(*columns)
+            self.connectorLower = self.chain.connectorUpper
+        elif len(columns)==0:
+            self.chain = ChainController._newTopPE(engine, connectorClass)
+            if release:
+                self.chain.chainState.release = True
             self.connectorLower = self.chain.connectorUpper # NEW
             self.chain.start()
             for channel in range(CHANNELS):
                 self.clear(channel)
         else:
-            self.chain = ChainController._setupChain(*columns)
+            top = ChainController._newTopPE(engine, connectorClass)
+            if release:
+                top.chainState.release = True
+            self.chain = ChainController._setupChain(top, *columns)
             self.connectorLower = self.chain.connectorUpper # NEW
+        self.pool = None
+        if pool:
+            self.pool = self.chain.chainState.pool = CPEPool(self.chain, pool)
+        self.watchdog = None
+        if watchdog < 0:
+            raise ValueError("ChainController: watchdog should be >= 0.")
+        elif watchdog:
+            if engine in ["coop", "process", "numpy"]:
+                raise ValueError("ChainController: engine %s has no "
+                                 "watchdog." % engine)
+            self.watchdog = DeadlockWatchdog(watchdog).start()
+
+    def _connectorClass(engine, connector, depth=1, mode="checked"):
+        """Returns the connector class selected by the connector
+           and mode parameters, or for "buffered" a function
+           creating BufferedConnectors."""
+        if mode not in ["checked", "release"]:
+            raise ValueError("ChainController: unknown mode %s." % mode)
+        elif mode == "release":
+            if engine in ["coop", "numpy"]:
+                raise ValueError("ChainController: engine %s has no "
+                                 "release mode." % engine)
+            elif connector not in ["event", "condition"]:
+                raise ValueError("ChainController: mode release has "
+                                 "its own connectors.")
+            return ReleaseConnector
+        if connector == "event":
+            return Connector
+        elif connector not in ["condition", "twoPhase", "buffered"]:
+            raise ValueError("ChainController: unknown connector %s." %
+                             connector)
+        elif engine in ["coop", "numpy"]:
+            raise ValueError("ChainController: engine %s has its own connectors."
+                             % engine)
+        elif connector == "twoPhase":
+            return TwoPhaseConnector
+        elif connector == "buffered":
+            return functools.partial(BufferedConnector, depth)
+        return ConditionConnector
+
+    def _newTopPE(engine, connectorClass=Connector):
+        """Returns a new, not started, top CPE object of the given engine."""
+        if engine == "thread":
+            return CPE(connectorClass=connectorClass)
+        elif isinstance(engine, type) and issubclass(engine, CPE):
+            return engine(connectorClass=connectorClass)
+        elif engine == "coop":
+            return CoopCPE(CoopScheduler())
+        else:
+            raise ValueError("ChainController: unknown engine %s." % engine)
         
-    def _setupChain(*columns):
+    def _setupChain(top, *columns):
         """Returns self.chain with the specified content.
-           Usage: setupChain() or setupChain(list0)
-           or setupChain(list1, list2), etc.
+           Usage: setupChain(top) or setupChain(top, list0)
+           or setupChain(top, list1, list2), etc.
+           top is a new, not started, CPE object;
            list0 will be loaded into word[1] channel,
            list1 will be loaded into word[2] channel, etc.
-           The lists can contain only non-negative integers.
+           The lists can contain only non-negative integers;
+           they can be any iterables, e.g. generators or NumPy arrays.
+           The CPEs are created and started one by one, as the rows
+           are read from the columns; the columns are not copied.
            For debugging only, not a part of the model.
         """
-        columnsAux = copy.deepcopy(columns)
-        chain = pe = CPE()
+        rows = ChainController._rows(*columns)
+        chain = pe = top
+        row = next(rows) # there is at least the row of the terminators.
+        while True:
+            for w in range(CHANNELS):
+                pe.word[w], pe.bit[w] = row[w]
+            #pe.aux0 = pe.bit0 = pe.aux1 = pe.bit1 = pe.aux2 = pe.bit2 = Any
+            pe.start()
+            row = next(rows, None)
+            if row is None:
+                break
+            lowerPE = pe._newLowerPE() # cf. CPE.extend method
+            pe.connectorLower = lowerPE.connectorUpper
+            pe = lowerPE
+        return chain
+
+    def _rows(*columns):
+        """Returns an iterator of rows, one row per CPE of a chain with the
+           specified content; see _setupChain.
+           A row is a tuple of (word, bit) pairs, one pair per channel.
+           The columns are read lazily, one item per row."""
         width = CHANNELS
-        if len(columnsAux) > width:
+        if len(columns) > width:
             raise ValueError(
-                "setupChain: self.chain CPE cannot store more than $s words." % width)
-        #columns += ([],)*(width-len(columns)) # bad code - aliasing
-        for i in range(width-len(columnsAux)):
-            columnsAux += ([],)
-        for c in columnsAux:
-            c.append(None)
-        depth = max(len(c) for c in columnsAux) # max length of a column
-        for c in columnsAux:
-            c.extend((Any,)*(depth-len(c))) # make sure all columns same length
-        for d in range(depth):
-            for w in range(width):
-                item = columnsAux[w][d]
-                if item is None:
-                    pe.word[w] = Any
-                    pe.bit[w] = True
+                "setupChain: self.chain CPE cannot store more than %s words." % width)
+        iterators = [iter(c) for c in columns]
+        iterators += [iter(()) for i in range(width-len(columns))]
+        return ChainController._rowStream(iterators)
+
+    def _rowStream(iterators):
+        """The generator of _rows: yields a row until every column
+           has reached its terminator; a word below the terminator
+           of its column is (Any, Any)."""
+        end = object()
+        ended = [False]*len(iterators)
+        while not all(ended):
+            row = []
+            for w in range(len(iterators)):
+                if ended[w]:
+                    row.append((Any, Any))
+                    continue
+                item = next(iterators[w], end)
+                if item is end:
+                    row.append((Any, True))
+                    ended[w] = True
                 elif item is Any:
-                    pe.word[w] = Any
-                    pe.bit[w] = Any
+                    row.append((Any, Any))
                 else:
-                    pe.word[w] = item
-                    pe.bit[w] = False
-            #pe.aux0 = pe.bit0 = pe.aux1 = pe.bit1 = pe.aux2 = pe.bit2 = Any
-            pe.start()
-            if d < depth - 1:
-                lowerPE = CPE(pe.chainName) # cf. CPE.extend method
-                lowerPE.peId = pe.peId+1
-                lowerPE.name = pe.chainName + "." + str(lowerPE.peId)
-                pe.connectorLower = lowerPE.connectorUpper
-                pe = lowerPE
-        return chain
+                    row.append((operator.index(item), False))
+            yield tuple(row)
 
     def stop(self):
         """Terminate all the threads/CPE objects in the self.chain. Each one terminates
            after completing all previously requested operations.
            *Not* a part of the self.chain controller interface."""
+        if self.engine == "coop":
+            if not self.chain.scheduler.deadlocked: # else nothing can run.
+                self.connectorLower.send_o("stop")
+                self.chain.scheduler.run()
+            return
         self.connectorLower.send_o("stop")
-        for t in threading.enumerate():
-            if isinstance(t, CPE) and t.chainName==self.chain.chainName:
-                t.join()
+        if self.engine == "process":
+            self.chain.join()
+            return
+        if self.engine == "numpy":
+            return
+        if self.pool is not None:
+            self.pool.close()
+        for pe in chainPEs(self.chain.chainName):
+            pe.join()
+        if self.watchdog is not None:
+            self.watchdog.stop()
 
     def report(self, base=10, detailed=True):
         """For debugging only. Not a part of the model."""
@@ -137,26 +339,230 @@ class ChainController():
     def chain2list(self, channel, base=10):
         """For debugging only. Not a part of the model.
            Returns a list equivalent to the specified channel,
-           or None if the channel is not properly terminated."""
-        global global_chain2list # global object (not global variable)
-        global_chain2list.clear() # do not use global_chain2list = []
-        self.connectorLower.send_o("chain2list", channel)
-        badEnding = self.connectorLower.receive_b() # synchronization
-        # main thread will not proceed until all threads updated global_chain2list.
-        if badEnding:
-            return None
-        else:
-            return global_chain2list
+           or None if the channel is not properly terminated.
+           If base==10, the list items are integers;
+           ohterwise they are strings of digits."""
+        return ChainController._inBase(self._snapshot((channel,))[channel],
+                                       baseCheck(base))
 
     def chain2lists(self, base=10):
         """For debugging only. Not a part of the model.
            Returns a list of 3 items.
            Each item is the list sotred in a channel of the chain
-           or None if the channel is not properly terminated."""
-        lists = []
-        for channel in range(CHANNELS):
-            lists.append(self.chain2list(channel, base=base).copy())
-        return lists
+           or None if the channel is not properly terminated.
+           If base==10, the list items are integers;
+           ohterwise they are strings of digits."""
+        base = baseCheck(base)
+        return [ChainController._inBase(words, base)
+                for words in self.snapshot()]
+
+    def _inBase(words, base):
+        """The words as strings of digits in base, unless base==10
+           (or words is None)."""
+        if words is None or base == 10:
+            return words
+        return [number2string(word, base) for word in words]
+
+    def snapshot(self, asArrays=False):
+        """For debugging only. Not a part of the model.
+           Returns the contents of all the channels, as chain2lists,
+           collected in a single pass down the chain, into a buffer
+           of this request: snapshots of different chains can be taken
+           concurrently. With asArrays=True the contents are NumPy
+           int64 arrays (None stays None); this requires NumPy."""
+        if asArrays and numpy is None:
+            raise ImportError("snapshot(asArrays=True) requires NumPy.")
+        columns = self._snapshot(range(CHANNELS), asArrays)
+        if asArrays and self.engine != "numpy":
+            columns = [None if c is None else numpy.array(c, dtype=numpy.int64)
+                       for c in columns]
+        return columns
+
+    def _snapshot(self, channels, asArrays=False):
+        """Returns a list of CHANNELS lists, with the contents of the given
+           channels; the other ones are empty. The numpy engine copies its
+           arrays, as arrays if asArrays. The thread and coop engines
+           read the register file of the chain, once it is synchronized;
+           the process engine collects the words in a pass down the chain."""
+        if self.engine == "numpy":
+            columns = [self.chain.content(c).copy() for c in range(CHANNELS)]
+            if asArrays:
+                return columns
+            return [c.tolist() for c in columns]
+        if self.engine != "process":
+            registers = self._synchronize()
+            return [registers.column(c) if c in channels else []
+                    for c in range(CHANNELS)]
+        buffer = [[] for channel in range(CHANNELS)]
+        self.connectorLower.send_o("snapshot", *channels)
+        self.connectorLower.receive_b() # synchronization
+        # the controller will not proceed until all CPEs updated buffer.
+        self.chain.collectSnapshot(buffer) # every segment has its own buffer.
+        return buffer
+
+    def _synchronize(self):
+        """Wait until the chain has completed all the operations requested
+           before; returns the register file of the chain.
+           The thread engine sends sync down the chain, the coop engine
+           runs its CPEs until none of them can make progress."""
+        if self.engine == "coop":
+            self.chain.scheduler.run()
+            return self.chain.scheduler.registers
+        self.connectorLower.send_o("sync")
+        self.connectorLower.receive_b() # synchronization
+        return self.chain.chainState.registers
+
+    def metrics(self):
+        """For debugging only. Not a part of the model.
+           Aggregates the message counters of the connectors of the chain
+           (see KINDS in connector.py), once the chain has completed
+           the operations requested before (the sync it takes is counted).
+           Returns a dictionary:
+           "operations" - operation -> {"executions": CPE executions,
+                          "messages": messages of all the links,
+                          "pes": CPEs touched, "depth": the deepest one,
+                          1 for the top CPE};
+           "links"      - per link, top first (the link above each CPE):
+                          {"sent": kind -> count, "received": kind -> count};
+           "pes"        - per CPE, top first: operation -> executions.
+           Engine "thread" or a subclass of CPE only."""
+        if self.engine in ["coop", "process", "numpy"]:
+            raise ValueError("metrics: not supported by engine %s." %
+                             self.engine)
+        self._synchronize()
+        pes = sorted((pe for pe in chainPEs(self.chain.chainName)
+                      if pe.connectorUpper.received), # not idle in the pool.
+                     key=lambda pe: pe.peId)
+        operations = {}
+        links = []
+        executions = []
+        for depth, pe in enumerate(pes, 1):
+            received = dict(pe.connectorUpper.received) # a copy: running.
+            totals = [0, 0, 0, 0, 0]
+            for operation, counts in received.items():
+                totals = list(map(operator.add, totals, counts))
+                entry = operations.setdefault(operation,
+                    {"executions": 0, "messages": 0, "pes": 0, "depth": 0})
+                entry["messages"] += sum(counts)
+                if counts[0]:
+                    entry["executions"] += counts[0]
+                    entry["pes"] += 1
+                    entry["depth"] = depth
+            links.append({"sent": dict(zip(KINDS, pe.connectorUpper.sent)),
+                          "received": dict(zip(KINDS, totals))})
+            executions.append({operation: counts[0]
+                               for operation, counts in received.items()
+                               if counts[0]})
+        return {"operations": operations, "links": links, "pes": executions}
+
+    def _clockIdents(self):
+        """The threads of the controller and of the CPEs."""
+        return [threading.get_ident()] + [pe.thread.ident for pe
+                                          in chainPEs(self.chain.chainName)]
+
+    def measure(self, operation, *arguments):
+        """For debugging only. Not a part of the model.
+           Calls self.operation(*arguments) and measures its complexity
+           in logical steps, with the Lamport clocks of the ClockedConnectors:
+           a handshake is one step of its sender and its receiver,
+           which continue at max(sender, receiver) + 1.
+           The call starts on a quiescent chain with all the clocks at 0;
+           top   - the time at which the controller got control back,
+           total - the latest time of the chain, once it is quiescent again.
+           For instance top x total is 2 x Theta(n) for addLast and
+           Theta(n) x Theta(n) for member.
+           The calls are measured one at a time: they do not overlap.
+           Appends (operation, top, total) to self.steps;
+           returns (result, top, total). Requires clocks=True."""
+        if self.steps is None:
+            raise ValueError("measure: the chain has no clocks.")
+        self._synchronize() # sync is not a step: the clocks stay.
+        resetClocks(self._clockIdents())
+        result = getattr(self, operation)(*arguments)
+        top = threadClock()[0]
+        self._synchronize()
+        total = max(threadClock(ident)[0] for ident in self._clockIdents())
+        self.steps.append((operation, top, total))
+        return result, top, total
+
+    def dumpActivity(self, path):
+        """For debugging only. Not a part of the model.
+           Saves the messages recorded so far, once the chain has completed
+           the operations requested before (the sync it takes is recorded),
+           in a binary file (see activityTrace.py); returns the number
+           of events. Requires activity > 0."""
+        if self.activity is None:
+            raise ValueError("dumpActivity: the chain has no activity.")
+        self._synchronize()
+        return writeActivity(path, self.activity.activity())
+
+    def criticalPath(self, operation, occurrence=0):
+        """For debugging only. Not a part of the model.
+           The critical path of the occurrence-th call of operation
+           (0 for the first) among the messages recorded so far, once
+           the chain has completed the operations requested before
+           (see criticalPath.py). Requires activity > 0."""
+        if self.activity is None:
+            raise ValueError("criticalPath: the chain has no activity.")
+        self._synchronize()
+        events = self.activity.activity().events()
+        return criticalPath(operationEvents(events, operation, occurrence))
+
+    def verifyTrace(self):
+        """For debugging only. Not a part of the model.
+           Returns the protocol violations found in the messages
+           recorded so far (see protocolTrace.verifyTrace);
+           an empty list if there are none. Requires trace > 0."""
+        if self.trace is None:
+            raise ValueError("verifyTrace: the chain has no trace.")
+        return self.trace.verify()
+
+    def compact(self):
+        """For debugging only. Not a part of the model.
+           Shrinks the chain: stops the CPEs below the deepest CPE
+           holding a word or the terminator of a channel, joins their
+           threads, and removes their registers from the register file;
+           the idle CPEs of the pool are replaced by new ones.
+           Returns the number of CPEs kept. Thread and coop engines only."""
+        if self.engine not in ["thread", "coop"] and \
+           not (isinstance(self.engine, type) and issubclass(self.engine, CPE)):
+            raise ValueError("compact: not supported by engine %s." %
+                             self.engine)
+        self.connectorLower.send_o("compact", *range(CHANNELS))
+        kept = self.connectorLower.receive_w()
+        if self.engine == "coop":
+            self.chain.scheduler.run() # the stopped CPEs terminate.
+            self.chain.scheduler.registers.truncate(kept)
+            return kept
+        if self.pool is not None:
+            self.pool.close()
+        for pe in chainPEs(self.chain.chainName):
+            if pe.peId > kept:
+                pe.join()
+        self.chain.chainState.registers.truncate(kept)
+        if self.pool is not None:
+            self.pool = self.chain.chainState.pool = \
+                CPEPool(self.chain, self.pool.chunk)
+        return kept
+
+    def checkpoint(self):
+        """For debugging only. Not a part of the model.
+           Returns a copy of the registers of all the CPEs of the chain,
+           for restore. Thread and coop engines only."""
+        if self.engine not in ["thread", "coop"]:
+            raise ValueError("checkpoint: not supported by engine %s." %
+                             self.engine)
+        return self._synchronize().checkpoint()
+
+    def restore(self, checkpoint):
+        """For debugging only. Not a part of the model.
+           Sets the registers of the CPEs of the chain to a checkpoint
+           of this chain; the CPEs created since then are set to Any.
+           Thread and coop engines only."""
+        if self.engine not in ["thread", "coop"]:
+            raise ValueError("restore: not supported by engine %s." %
+                             self.engine)
+        self._synchronize().restore(checkpoint)
 
     def register2list(self, channel, base=10):
         """For debugging only. Not a part of the model.
@@ -165,21 +571,25 @@ class ChainController():
            The least significant word is first in the list.
            If base==10, the list items are integers;
            ohterwise they are strings of digits."""
-        global global_chain2list # global object (not global variable)
-        global_chain2list.clear() # do not use global_chain2list = []
+        buffer = self._buffer()
+        buffer.clear()
         self.connectorLower.send_o("register2list", channel)
         badEnding = self.connectorLower.receive_b() # synchronization
-        # main thread will not proceed until all threads updated global_chain2list.
+        # main thread will not proceed until all threads updated the buffer.
+        if self.engine == "process":
+            self.chain.collect(buffer)
         if badEnding:
             return None
-        base = baseCheck(base)
-        if base == 10:
-            return global_chain2list.copy()
-        else:
-            result = []
-            for v in global_chain2list:
-                result.append(number2string(v, base))
-            return result
+        return ChainController._inBase(buffer.copy(), baseCheck(base))
+
+    def _buffer(self):
+        """The list of this chain into which chain2list and register2list
+           collect words (for the process engine: collect)."""
+        if self.engine == "coop":
+            return self.chain.scheduler.buffer
+        elif self.engine in ["process", "numpy"]:
+            return self.chain.buffer
+        return self.chain.chainState.buffer
 
     def register2integer(self, channel, base=10):
         """For debugging only. Not a part of the model.
@@ -1006,5 +1416,80 @@ class ChainController():
         if badIndex:
             raise IndexError("No such index in the list.")
         return item
-    
+
+    # === BULK OPERATIONS ======================================================
+
+    def addAllFirst(self, channelA, words):
+        """Inserts the words in front of the channel, in the same order:
+           addAllFirst(A, [1,2]) on [3] gives [1,2,3].
+           words is an iterable of non-negative integers; they are streamed
+           into the chain back to back, in a single operation.
+           Theta(k)xTheta(k+n), propagation |."""
+        # Domino:
+        # none           -
+        #                -
+        #                W..W
+        # addAllFirst(A) v
+        self.connectorLower.send_o("addAllFirst", channelA)
+        for word in words:
+            self.connectorLower.send_W(word, False)
+        self.connectorLower.send_W(Any, True)
+
+    def addAllLast(self, channelA, words):
+        """Appends the words to the channel, in the same order;
+           see addAllFirst.
+           Theta(k)xTheta(k+n), propagation |."""
+        # Domino:
+        # none          -
+        #               -
+        #               W..W
+        # addAllLast(A) v
+        self.connectorLower.send_o("addAllLast", channelA)
+        for word in words:
+            self.connectorLower.send_W(word, False)
+        self.connectorLower.send_W(Any, True)
+
+    def pullMany(self, channelA, n):
+        """Removes the first n words of the channel, or all of them
+           if there are fewer, and returns them as a list.
+           Theta(n)xTheta(n+length), propagation |."""
+        # Domino:
+        # none        - W..W
+        #             - -
+        #             w -
+        # pullMany(A) v ^
+        if not isinstance(n, int):
+            raise TypeError("n should be an integer.")
+        if n < 0:
+            raise ValueError("n should be non-negative")
+        self.connectorLower.send_o("pullMany", channelA)
+        self.connectorLower.send_w(n)
+        return self._receiveStream()
+
+    def drain(self, channelA):
+        """Removes all the words of the channel and returns them as a list.
+           Theta(n)xTheta(n), propagation |."""
+        # Domino:
+        # none     - W..W
+        #          - -
+        #          - -
+        # drain(A) v ^
+        self.connectorLower.send_o("drain", channelA)
+        return self._receiveStream()
+
+    def _receiveStream(self):
+        """Receive a stream of words: W messages up to one with bit True."""
+        words = []
+        while True:
+            word, end = self.connectorLower.receive_W()
+            if end:
+                return words
+            words.append(word)
+
+# ==============================================================================
+
+# The callers of the operations are checked against the signatures once,
+# when the module is imported; raises TypeError if one does not follow them.
+assertSignatures(ChainController, operations=False)
+
 ############################################################################
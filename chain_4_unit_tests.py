@@ -7,7 +7,22 @@
 
 import unittest
 import sys
+import asyncio
+import copy
 from chain_2_controller import *
+from asyncChain import AsyncChainController
+import numpyChain
+from pipelinedChain import PipelinedChainController
+from registers import RegisterFile
+from protocolTrace import verifyTrace
+from signatureCheck import checkSignatures
+from deadlockWatchdog import DeadlockWatchdog
+import complexityCheck
+import activityTrace
+import criticalPath
+import os
+from array import array
+import tempfile
 
 #===============================================================================
 
@@ -1538,6 +1553,989 @@ class ChainTest(unittest.TestCase):
 ##        self.assertRaises(IndexError, chain.deleteGetAtIndex, CHANNEL, 2)
 ##        chain.stop()
 
+#===============================================================================
+class CoopChainTest(unittest.TestCase):
+    """The same operations on the cooperative (generator) engine."""
+
+    def test_testing_tools(self):
+
+        chain = ChainController(engine="coop")
+        self.assertEqual(chain.chain2list(CHANNEL), [])
+        chain.stop()
+
+        chain = ChainController([0,1,2],[3,4], engine="coop")
+        self.assertEqual(chain.chain2lists(), [[0,1,2],[3,4],[]])
+        chain.stop()
+
+    def test_member(self):
+
+        chain = ChainController([], engine="coop")
+        self.assertEqual(chain.member(CHANNEL,  0), False)
+        chain.stop()
+
+        chain = ChainController([1,2,3], engine="coop")
+        self.assertEqual(chain.member(CHANNEL,  0), False)
+        self.assertEqual(chain.member(CHANNEL,  1), True)
+        self.assertEqual(chain.member(CHANNEL,  3), True)
+        chain.stop()
+
+    def test_addLast(self):
+
+        chain = ChainController([], engine="coop")
+        chain.addLast(CHANNEL, 0)
+        chain.addLast(CHANNEL, 1)
+        self.assertEqual(chain.chain2list(CHANNEL) , [0,1])
+        chain.stop()
+
+        chain = ChainController([3,2,1], engine="coop")
+        self.assertEqual(chain.addLast(CHANNEL, 0), None)
+        self.assertEqual(chain.chain2list(CHANNEL) , [3,2,1,0])
+        chain.stop()
+
+    def test_sSort(self):
+
+        chain = ChainController([2,4,1,5,2,3], engine="coop")
+        chain.sSort(CHANNEL)
+        self.assertEqual(chain.chain2list(CHANNEL) , [1,2,2,3,4,5])
+        chain.stop()
+
+    def test_long_chain(self):
+
+        n = 10000
+        chain = ChainController(list(range(n)), engine="coop")
+        self.assertEqual(chain.member(CHANNEL, n-1), True)
+        self.assertEqual(chain.member(CHANNEL, n), False)
+        chain.addLast(CHANNEL, n)
+        self.assertEqual(chain.member(CHANNEL, n), True)
+        chain.stop()
+
+    def test_deadlock(self):
+
+        # isEmpty is an exercise stub: the top CPE never answers.
+        chain = ChainController([1], engine="coop")
+        self.assertRaises(RuntimeError, chain.isEmpty, CHANNEL)
+        chain.stop()
+
+#===============================================================================
+class AsyncChainTest(unittest.TestCase):
+    """The same operations as coroutines of AsyncChainController."""
+
+    def test_operations(self):
+
+        async def run():
+            chain = AsyncChainController([2,4,1,5,2,3],[3,4])
+            self.assertEqual(await chain.member(CHANNEL, 5), True)
+            self.assertEqual(await chain.member(CHANNEL, 6), False)
+            await chain.sSort(CHANNEL)
+            await chain.addLast(AUX, 0)
+            self.assertEqual(await chain.chain2lists(),
+                             [[1,2,2,3,4,5],[3,4,0],[]])
+            await chain.stop()
+        asyncio.run(run())
+
+    def test_many_chains(self):
+
+        async def run():
+            chains = [AsyncChainController([i, i+1]) for i in range(100)]
+            found = await asyncio.gather(
+                *(chain.member(CHANNEL, i+1) for i, chain in enumerate(chains)))
+            self.assertEqual(found, [True]*100)
+            await asyncio.gather(
+                *(chain.addLast(CHANNEL, 0) for chain in chains))
+            lists = await asyncio.gather(
+                *(chain.chain2list(CHANNEL) for chain in chains))
+            self.assertEqual(lists, [[i, i+1, 0] for i in range(100)])
+            await asyncio.gather(*(chain.stop() for chain in chains))
+        asyncio.run(run())
+
+#===============================================================================
+class ShardedChainTest(unittest.TestCase):
+    """The same operations on a chain split among worker processes."""
+
+    def test_operations(self):
+
+        chain = ChainController([2,4,1,5,2,3],[3,4],
+                                engine="process", processes=2)
+        self.assertEqual(chain.chain2lists(), [[2,4,1,5,2,3],[3,4],[]])
+        self.assertEqual(chain.member(CHANNEL, 3), True)
+        self.assertEqual(chain.member(CHANNEL, 6), False)
+        chain.sSort(CHANNEL)
+        chain.addLast(AUX, 0)
+        self.assertEqual(chain.chain2lists(), [[1,2,2,3,4,5],[3,4,0],[]])
+        chain.stop()
+
+        chain = ChainController(engine="process", processes=3)
+        chain.addLast(CHANNEL, 1)
+        chain.addLast(CHANNEL, 2)
+        self.assertEqual(chain.chain2list(CHANNEL), [1,2])
+        chain.stop()
+
+#===============================================================================
+
+class ConditionConnectorTest(unittest.TestCase):
+    """Chains whose CPE threads use ConditionConnectors."""
+
+    def test_operations(self):
+
+        for connector in ["condition", "twoPhase", "buffered"]:
+            chain = ChainController([2,4,1,5,2,3],[3,4], connector=connector,
+                                    depth=3)
+            self.assertEqual(chain.member(CHANNEL, 3), True)
+            self.assertEqual(chain.member(CHANNEL, 6), False)
+            chain.sSort(CHANNEL)
+            chain.addLast(AUX, 0)
+            chain.clear(CHANNEL2)
+            self.assertEqual(chain.chain2lists(), [[1,2,2,3,4,5],[3,4,0],[]])
+            chain.stop()
+
+    def test_type_checks(self):
+
+        for connectorClass in [ConditionConnector, TwoPhaseConnector]:
+            connector = connectorClass()
+            with self.assertRaises(TypeError):
+                connector.send_w(-1.5)
+            thread = threading.Thread(target=connector.send_b, args=(True,))
+            thread.start()
+            with self.assertRaises(TypeError):
+                connector.receive_w()
+            self.assertEqual(connector.receive_b(), True)
+            thread.join()
+
+    def test_buffered(self):
+
+        connector = BufferedConnector(2)
+        connector.send_o("member", 0) # does not wait: the buffer has room.
+        connector.send_w(5)
+        received = []
+        def lower():
+            received.append(connector.receive_o())
+            try:
+                connector.receive_b()
+            except TypeError:
+                received.append(TypeError)
+            received.append(connector.receive_w())
+            connector.send_b(True)
+        thread = threading.Thread(target=lower)
+        thread.start()
+        self.assertEqual(connector.receive_b(), True)
+        thread.join()
+        self.assertEqual(received, [("member", (0,)), TypeError, 5])
+
+    def test_transitions(self):
+
+        for connectorClass, transitions in [(ConditionConnector, 4),
+                                            (TwoPhaseConnector, 2)]:
+            connector = connectorClass()
+            thread = threading.Thread(target=connector.send_w, args=(5,))
+            thread.start()
+            self.assertEqual(connector.receive_w(), 5)
+            thread.join()
+            self.assertEqual(connector.transitions, transitions)
+
+#===============================================================================
+
+class PipelinedChainTest(unittest.TestCase):
+    """Operations submitted as futures, answered in submission order."""
+
+    def test_futures(self):
+
+        chain = PipelinedChainController([2,4,1])
+        found = chain.submit("member", CHANNEL, 3)
+        chain.submit("addLast", CHANNEL, 3)
+        foundAfter = chain.submit("member", CHANNEL, 3)
+        chain.submit("sSort", CHANNEL)
+        contents = chain.submit("chain2list", CHANNEL)
+        self.assertEqual(found.result(), False)
+        self.assertEqual(foundAfter.result(), True)
+        self.assertEqual(contents.result(), [1,2,3,4])
+        chain.stop()
+
+    def test_exceptions(self):
+
+        chain = PipelinedChainController([2,4,1], connector="buffered")
+        bad = chain.submit("getItem", CHANNEL, -1)
+        good = chain.submit("member", CHANNEL, 4)
+        with self.assertRaises(IndexError):
+            bad.result()
+        self.assertEqual(good.result(), True)
+        with self.assertRaises(AttributeError):
+            chain.submit("noSuchOperation")
+        chain.flush()
+        self.assertEqual(chain.chain2list(CHANNEL), [2,4,1])
+        chain.stop()
+
+#===============================================================================
+
+class BulkOperationsTest(unittest.TestCase):
+    """addAllFirst, addAllLast, pullMany and drain in all the engines."""
+
+    def bulk(self, chain):
+        chain.addAllFirst(CHANNEL, [1,2])
+        chain.addAllLast(AUX, iter([5,6,7]))
+        chain.addAllFirst(AUX, [])
+        chain.addAllLast(CHANNEL2, [10])
+        chain.addAllFirst(CHANNEL2, [8])
+        self.assertEqual(chain.chain2lists(), [[1,2,3,4],[5,6,7],[8,9,10]])
+        self.assertEqual(chain.pullMany(CHANNEL, 3), [1,2,3])
+        self.assertEqual(chain.pullMany(AUX, 5), [5,6,7])
+        self.assertEqual(chain.pullMany(CHANNEL, 0), [])
+        self.assertEqual(chain.drain(CHANNEL2), [8,9,10])
+        self.assertEqual(chain.drain(CHANNEL2), [])
+        self.assertEqual(chain.chain2lists(), [[4],[],[]])
+        chain.addAllLast(CHANNEL, [5,6])
+        self.assertEqual(chain.member(CHANNEL, 6), True)
+        with self.assertRaises(ValueError):
+            chain.pullMany(CHANNEL, -1)
+        self.assertEqual(chain.chain2lists(), [[4,5,6],[],[]])
+        chain.stop()
+
+    def test_engines(self):
+
+        engines = ["thread", "coop", "numpy"]
+        if numpyChain.numpy is None:
+            engines.remove("numpy")
+        for engine in engines:
+            self.bulk(ChainController([3,4],[],[9], engine=engine))
+        self.bulk(ChainController([3,4],[],[9], connector="buffered"))
+        self.bulk(ChainController([3,4],[],[9], engine="process",
+                                  processes=2))
+
+    def test_async(self):
+
+        async def bulk():
+            chain = AsyncChainController([3,4])
+            await chain.addAllLast(CHANNEL, [5,6])
+            await chain.addAllFirst(CHANNEL, [1,2])
+            self.assertEqual(await chain.pullMany(CHANNEL, 2), [1,2])
+            self.assertEqual(await chain.drain(CHANNEL), [3,4,5,6])
+            await chain.stop()
+        asyncio.run(bulk())
+
+#===============================================================================
+
+class StreamingConstructionTest(unittest.TestCase):
+    """Chains built from any iterables, without copying them."""
+
+    def test_iterables(self):
+
+        column = [3,1]
+        engines = ["thread", "coop", "numpy"]
+        if numpyChain.numpy is None:
+            engines.remove("numpy")
+        for engine in engines:
+            chain = ChainController(column, (i for i in [5,6,7]), range(2),
+                                    engine=engine)
+            self.assertEqual(chain.chain2lists(), [[3,1],[5,6,7],[0,1]])
+            chain.stop()
+        self.assertEqual(column, [3,1])
+
+    @unittest.skipIf(numpyChain.numpy is None, "NumPy is not installed.")
+    def test_numpy_arrays(self):
+
+        chain = ChainController(numpyChain.numpy.arange(5), engine="coop")
+        self.assertEqual(chain.chain2list(CHANNEL), [0,1,2,3,4])
+        chain.stop()
+        with self.assertRaises(TypeError):
+            ChainController(numpyChain.numpy.array([1.5]), engine="coop")
+
+#===============================================================================
+
+class CompactStateTest(unittest.TestCase):
+    """Slotted CPE objects with their registers in a register file."""
+
+    def test_registers(self):
+
+        registers = RegisterFile(CHANNELS)
+        word, bit = registers.newRow()
+        lowerWord, lowerBit = registers.newRow()
+        self.assertIs(word[CHANNEL], Any)
+        self.assertIs(bit[CHANNEL], Any)
+        word[CHANNEL], bit[CHANNEL] = 2**40, False
+        lowerWord[CHANNEL], lowerBit[CHANNEL] = 5, True
+        self.assertEqual(word[CHANNEL], 2**40)
+        self.assertIs(bit[CHANNEL], False)
+        self.assertIs(lowerBit[CHANNEL], True)
+        self.assertEqual(registers.column(CHANNEL), [2**40])
+        bit[CHANNEL1] = lowerBit[CHANNEL1] = False
+        self.assertEqual(registers.column(CHANNEL1), None) # not terminated
+        with self.assertRaises(TypeError):
+            registers.column(CHANNEL2)
+        with self.assertRaises(ValueError):
+            word[CHANNEL] = -1
+        word[CHANNEL] = lowerWord[CHANNEL] = 2**63 # any size, as in CPE.
+        lowerBit[CHANNEL] = False
+        self.assertEqual(word[CHANNEL], 2**63)
+        self.assertEqual(registers.column(CHANNEL), None)
+        checkpoint = registers.checkpoint()
+        word[CHANNEL] = 2**70
+        registers.truncate(1)
+        self.assertEqual(list(registers.big.values()), [2**70])
+        registers.newRow()
+        registers.restore(checkpoint)
+        self.assertEqual(word[CHANNEL], 2**63)
+        with self.assertRaises(IndexError): # not the row below.
+            word[CHANNELS]
+
+    def test_slots(self):
+
+        pe = CPE()
+        self.assertFalse(hasattr(pe, "__dict__"))
+        with self.assertRaises(AttributeError):
+            pe.colour = "red"
+        chain = ChainController([2,4,1])
+        temps = chain.chain.temp_w
+        chain.member(CHANNEL, 4)
+        self.assertIs(chain.chain.temp_w, temps) # reset in place
+        self.assertEqual(len(chainPEs(chain.chain.chainName)), 4)
+        chain.stop()
+        self.assertEqual(chainPEs(chain.chain.chainName), [])
+
+    def test_bigWords(self):
+
+        chain = ChainController([2**64, 1])
+        chain.addLast(CHANNEL, 2**70)
+        self.assertEqual(chain.chain2list(CHANNEL), [2**64, 1, 2**70])
+        self.assertEqual(chain.member(CHANNEL, 2**70), True)
+        chain.sSort(CHANNEL)
+        self.assertEqual(chain.chain2list(CHANNEL), [1, 2**64, 2**70])
+        chain.stop()
+
+#===============================================================================
+
+class RegisterFileTest(unittest.TestCase):
+    """The testing tools read the register file of the chain."""
+
+    def test_checkpoint(self):
+
+        for engine in ["thread", "coop"]:
+            chain = ChainController([2,4,1],[],[5,6], engine=engine)
+            checkpoint = chain.checkpoint()
+            for i in range(5):
+                chain.addLast(CHANNEL, 7)
+            chain.sSort(CHANNEL)
+            self.assertEqual(chain.chain2list(CHANNEL), [1,2,4,7,7,7,7,7])
+            chain.restore(checkpoint)
+            self.assertEqual(chain.chain2lists(), [[2,4,1],[],[5,6]])
+            self.assertEqual(chain.member(CHANNEL, 4), True)
+            chain.addLast(CHANNEL, 3)
+            self.assertEqual(chain.chain2list(CHANNEL), [2,4,1,3])
+            chain.stop()
+        chain = ChainController([2,4,1], engine="process", processes=2)
+        with self.assertRaises(ValueError):
+            chain.checkpoint()
+        chain.stop()
+
+#===============================================================================
+
+class CPEPoolTest(unittest.TestCase):
+    """extend attaches CPEs started ahead of demand."""
+
+    def test_pool(self):
+
+        chain = ChainController([3,1], pool=4)
+        for i in range(20):
+            chain.addLast(CHANNEL, i)
+        chain.addLast(CHANNEL1, 9)
+        self.assertEqual(chain.chain2lists(),
+                         [[3,1]+list(range(20)), [9], []])
+        self.assertEqual(chain.pool.hits + chain.pool.misses, 20)
+        self.assertGreaterEqual(chain.pool.created, 20)
+        name = chain.chain.chainName
+        chain.stop()
+        self.assertEqual(chainPEs(name), []) # idle CPEs stopped too.
+
+    def test_engines(self):
+
+        with self.assertRaises(ValueError):
+            ChainController([3,1], engine="coop", pool=4)
+        with self.assertRaises(ValueError):
+            ChainController([3,1], pool=-1)
+
+#===============================================================================
+
+class CompactTest(unittest.TestCase):
+    """compact stops the CPEs below the contents of all the channels."""
+
+    def test_compact(self):
+
+        for engine, pool in [("thread", 0), ("thread", 4), ("coop", 0)]:
+            chain = ChainController([2,4,1],[],[5], engine=engine, pool=pool)
+            for i in range(20):
+                chain.addLast(CHANNEL, i)
+            self.assertEqual(chain.drain(CHANNEL)[:4], [2,4,1,0])
+            chain.addLast(CHANNEL1, 7)
+            chain.addLast(CHANNEL1, 8)
+            self.assertEqual(chain.compact(), 3) # 7, 8 and the terminator.
+            if engine == "thread" and not pool:
+                self.assertEqual(len(chainPEs(chain.chain.chainName)), 3)
+            self.assertEqual(chain.chain2lists(), [[], [7,8], [5]])
+            for i in range(5):
+                chain.addLast(CHANNEL2, i)
+            self.assertEqual(chain.chain2lists(), [[], [7,8], [5,0,1,2,3,4]])
+            self.assertEqual(chain.compact(), 7)
+            chain.stop()
+        chain = ChainController([2,4,1], engine="numpy")
+        with self.assertRaises(ValueError):
+            chain.compact()
+
+#===============================================================================
+
+class ReleaseModeTest(unittest.TestCase):
+    """The release mode gives the results of the checked mode."""
+
+    def test_same_results(self):
+
+        for engine in ["thread", "process"]:
+            chain = ChainController([2,4,1,5],[3], engine=engine,
+                                    processes=2, mode="release")
+            chain.addLast(CHANNEL, 0)
+            chain.sSort(CHANNEL)
+            self.assertEqual(chain.member(CHANNEL, 5), True)
+            self.assertEqual(chain.chain2list(CHANNEL), [0,1,2,4,5])
+            self.assertEqual(chain.chain2list(CHANNEL1), [3])
+            chain.stop()
+
+    def test_modes(self):
+
+        with self.assertRaises(ValueError):
+            ChainController([2,4], mode="fast")
+        with self.assertRaises(ValueError):
+            ChainController([2,4], engine="coop", mode="release")
+        with self.assertRaises(ValueError):
+            ChainController([2,4], connector="buffered", mode="release")
+
+#===============================================================================
+
+class TraceTest(unittest.TestCase):
+    """Recorded messages are verified offline against the signatures."""
+
+    def test_chain(self):
+
+        for mode in ["checked", "release"]:
+            chain = ChainController([2,4,1,5],[3,1], trace=1000, mode=mode)
+            chain.addLast(CHANNEL, 0)
+            chain.sSort(CHANNEL)
+            self.assertEqual(chain.member(CHANNEL, 4), True)
+            chain.addAllLast(CHANNEL1, [7,8])
+            self.assertEqual(chain.pullMany(CHANNEL1, 2), [3,1])
+            self.assertEqual(chain.chain2lists(), [[0,1,2,4,5],[7,8],[]])
+            self.assertTrue(len(chain.trace.events) > 0)
+            self.assertEqual(chain.verifyTrace(), [])
+            chain.stop()
+            self.assertEqual(chain.verifyTrace(), [])
+        chain = ChainController([2,4,1,5], trace=10)
+        chain.sSort(CHANNEL)
+        self.assertEqual(chain.chain2list(CHANNEL), [1,2,4,5])
+        self.assertEqual(len(chain.trace.events), 10) # the last 10 only
+        self.assertEqual(chain.verifyTrace(), [])
+        chain.stop()
+        with self.assertRaises(ValueError):
+            ChainController([2,4], engine="coop", trace=10)
+
+    def test_violations(self):
+
+        trace = [(0, "up", "b", None),                 # skipped
+                 (0, "down", "o", "member"), (0, "down", "w", None),
+                 (0, "up", "w", None),                 # b expected
+                 (0, "down", "o", "pullMany"), (0, "down", "w", None),
+                 (0, "up", "W", False),                # stream not ended
+                 (0, "down", "o", "bogus"),
+                 (1, "down", "o", "member"), (1, "down", "w", None)]
+        self.assertEqual(verifyTrace(trace),
+            ["connector 0: member up: w instead of b, expected 'b'.",
+             "connector 0: pullMany up: the stream is not ended, "
+             "expected 'W*'.",
+             "connector 0: unknown operation bogus."])
+
+#===============================================================================
+
+class SignatureCheckTest(unittest.TestCase):
+    """The connector calls of the methods follow the signatures,
+       as checked statically when the classes are defined."""
+
+    def test_classes(self):
+
+        self.assertEqual(checkSignatures(CPE), [])
+        self.assertEqual(checkSignatures(CoopCPE), [])
+        self.assertEqual(checkSignatures(ChainController, operations=False),
+                         [])
+
+    def test_mismatch(self):
+
+        with self.assertRaises(TypeError):
+            class WrongCPE(CPE):
+                def member(self, channelA):
+                    self.connectorUpper.receive_w()
+                    if self.bit[channelA]:
+                        self.connectorUpper.send_w(0) # b expected
+
+        class WrongController:
+            def member(self, channelA, word):
+                self.connectorLower.send_o("member", channelA)
+                return self.connectorLower.receive_b() # the word is missing
+            def drain(self, channelA):
+                self.connectorLower.send_o("drain", channelA)
+                while True:
+                    word, end = self.connectorLower.receive_W()
+                    if end:
+                        break
+                self.connectorLower.send_o("clear", channelA)
+        self.assertEqual(checkSignatures(WrongController, operations=False),
+            ["SignatureCheckTest.test_mismatch.<locals>.WrongController."
+             "member sends member down nothing, expected 'w'."])
+
+#===============================================================================
+
+class WatchdogTest(unittest.TestCase):
+    """A deadlock between two connector calls is reported,
+       normal waits are not."""
+
+    class BlockingConnector:
+        """Every receive waits until released."""
+        def __init__(self):
+            self.released = threading.Event()
+        def receive_o(self):
+            self.released.wait()
+        def receive_w(self):
+            self.released.wait()
+
+    class Neighbor:
+        def __init__(self, name, connectorUpper=None, connectorLower=None):
+            self.name = name
+            self.connectorUpper = connectorUpper
+            self.connectorLower = connectorLower
+        def member(self, connector):
+            connector.receive_w()
+
+    def test_deadlock(self):
+
+        found = []
+        watchdog = DeadlockWatchdog(0.02, onDeadlock=found.append).start()
+        connector = WatchdogTest.BlockingConnector()
+        upper = WatchdogTest.Neighbor("CH9.1", connectorLower=connector)
+        lower = WatchdogTest.Neighbor("CH9.2", connectorUpper=connector)
+        threads = [threading.Thread(target=pe.member, args=(connector,))
+                   for pe in [upper, lower]] # both receive: a deadlock.
+        for thread in threads:
+            thread.start()
+        for i in range(500):
+            if found:
+                break
+            time.sleep(0.01)
+        connector.released.set()
+        for thread in threads:
+            thread.join()
+        watchdog.stop()
+        self.assertEqual(sorted(found[0]),
+                         ["CH9.1 member: connectorLower.receive_w",
+                          "CH9.2 member: connectorUpper.receive_w"])
+        self.assertEqual(watchdog.check(), None)
+
+    def test_no_deadlock(self):
+
+        chain = ChainController([1,2,3], watchdog=0.005)
+        for i in range(100):
+            chain.addLast(CHANNEL, i)
+            self.assertEqual(chain.member(CHANNEL, 3), True)
+        self.assertEqual(chain.watchdog.check(), None) # idle
+        chain.stop()
+        self.assertTrue(chain.watchdog.samples > 0)
+        self.assertEqual(chain.watchdog.deadlocks, [])
+        with self.assertRaises(ValueError):
+            ChainController([1,2], engine="coop", watchdog=1)
+
+#===============================================================================
+
+class MetricsTest(unittest.TestCase):
+    """The message counters of the connectors, aggregated."""
+
+    def test_metrics(self):
+
+        for connector in ["event", "condition", "twoPhase", "buffered"]:
+            chain = ChainController([1,2,3], connector=connector)
+            self.assertEqual(chain.member(CHANNEL, 3), True)  # 3 CPEs
+            self.assertEqual(chain.member(CHANNEL, 9), False) # 4 CPEs
+            chain.addLast(CHANNEL, 4) # 4 CPEs, clear for the new one
+            metrics = chain.metrics()
+            chain.stop()
+            operations = metrics["operations"]
+            self.assertEqual(operations["member"],
+                {"executions": 7, "messages": 21, "pes": 4, "depth": 4})
+            self.assertEqual(operations["addLast"],
+                {"executions": 4, "messages": 8, "pes": 4, "depth": 4})
+            self.assertEqual(operations["clear"],
+                {"executions": 1, "messages": 1, "pes": 1, "depth": 5})
+            self.assertEqual(operations["sync"]["depth"], 5)
+            self.assertEqual(metrics["links"][3],
+                {"sent": {"o": 3, "w": 2, "W": 0, "b": 2, "B": 0},
+                 "received": {"o": 3, "w": 2, "W": 0, "b": 2, "B": 0}}) # sync: o, b
+            self.assertEqual(metrics["pes"][0],
+                             {"member": 2, "addLast": 1, "sync": 1})
+        with self.assertRaises(ValueError):
+            ChainController([1,2], engine="coop").metrics()
+
+#===============================================================================
+
+class ClockTest(unittest.TestCase):
+    """Lamport clocks: the top and total complexity of calls, in steps."""
+
+    def test_measure(self):
+
+        for connector in ["event", "condition"]:
+            for n in [0, 1, 5, 10]:
+                chain = ChainController(list(range(n)), connector=connector,
+                                        clocks=True)
+                self.assertEqual(chain.measure("addLast", CHANNEL, 99),
+                                 (None, 2, 2*n+3)) # o, w; clear the new CPE.
+                self.assertEqual(chain.measure("member", CHANNEL, 98),
+                                 (False, 3*n+6, 3*n+6)) # down and back up.
+                self.assertEqual(chain.measure("member", CHANNEL, 99),
+                                 (True, 3*n+3, 3*n+3))
+                self.assertEqual(chain.measure("clear", CHANNEL2),
+                                 (None, 1, 1))
+                self.assertEqual(chain.chain2list(CHANNEL),
+                                 list(range(n)) + [99])
+                self.assertEqual([operation for operation, top, total
+                                  in chain.steps],
+                                 ["addLast", "member", "member", "clear"])
+                chain.stop()
+
+    def test_handshake(self):
+
+        link = ClockedConnector()
+        link.operation = "member" # a step of the model, unlike sync.
+        def receiver():
+            threadClock()[0] = 5
+            link.receive_w()
+            times.append(threadClock()[0])
+        times = []
+        thread = threading.Thread(target=receiver)
+        thread.start()
+        threadClock()[0] = 2
+        link.send_w(7)
+        thread.join()
+        self.assertEqual(times + [threadClock()[0]], [6, 6]) # max(2, 5)+1
+
+    def test_parameters(self):
+
+        for kwargs in [{"engine": "coop"}, {"connector": "twoPhase"},
+                       {"mode": "release"}, {"trace": 100}]:
+            with self.assertRaises(ValueError):
+                ChainController([1,2], clocks=True, **kwargs)
+        chain = ChainController([1,2])
+        with self.assertRaises(ValueError):
+            chain.measure("member", CHANNEL, 1)
+        chain.stop()
+
+#===============================================================================
+
+class WrongClaimController(ChainController):
+
+    def addLast(self, channelA, word):
+        """Theta(1)xTheta(1), wrong: addLast propagates to the bottom."""
+        self.connectorLower.send_o("addLast", channelA)
+        self.connectorLower.send_w(word)
+
+class ComplexityTest(unittest.TestCase):
+    """The complexity claims of the docstrings, against measured steps."""
+
+    def test_claims(self):
+
+        self.assertEqual(complexityCheck.checkComplexity(), [])
+        measured = complexityCheck.operations()
+        for name in ["clear", "member", "addLast", "addAllLast", "drain"]:
+            self.assertIn(name, measured)
+        self.assertNotIn("last", measured) # an exercise.
+        self.assertEqual(measured["addFirstPoor"][1], ["pushPoor"])
+
+    def test_parse(self):
+
+        self.assertEqual(complexityCheck.parseClaim(
+                             "Returns it. O(n)xO(n), propagation |/."),
+                         (("O", "n"), ("O", "n")))
+        self.assertEqual(complexityCheck.parseClaim(
+                             "Theta(n) x Theta(n+length)"),
+                         (("Theta", "n"), ("Theta", "n+length")))
+        self.assertIsNone(complexityCheck.parseClaim("For debugging only."))
+        self.assertEqual([complexityCheck.degree(expression) for expression
+                          in ["1", "n", "k+n", "m + n^2"]], [0, 1, 1, 2])
+        with self.assertRaises(ValueError):
+            complexityCheck.degree("n*log(n)")
+        self.assertAlmostEqual(complexityCheck.slope([4, 8, 16],
+                                                     [3, 12, 48]), 2)
+
+    def test_violation(self):
+
+        errors = complexityCheck.checkComplexity(
+                     names=["addLast"], controllerClass=WrongClaimController)
+        self.assertEqual(len(errors), 1)
+        self.assertRegex(errors[0], r"^addLast: total grows as n\^0\.9\d, "
+                                    r"claimed Theta\(1\)\.$")
+
+#===============================================================================
+
+class ActivityTest(unittest.TestCase):
+    """Recording the messages received, saving them, drawing them."""
+
+    def test_record(self):
+
+        chain = ChainController([1,2,3], activity=1000)
+        self.assertEqual(chain.member(CHANNEL, 3), True)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "member.chac")
+            events = chain.dumpActivity(path)
+            activity = activityTrace.readActivity(path)
+            self.assertEqual(os.path.getsize(path),
+                             4 + 4 + 1 + len("member") + 1 + len("sync")
+                             + 8 + 22 * events)
+        chain.stop()
+        self.assertEqual(len(activity), events)
+        self.assertEqual(list(activity.times), sorted(activity.times))
+        self.assertEqual([event[1:] for event in activity.events()][:9],
+                         [(1, "upper", "o", "member"), (1, "upper", "w", 3),
+                          (2, "upper", "o", "member"), (2, "upper", "w", 3),
+                          (3, "upper", "o", "member"), (3, "upper", "w", 3),
+                          (2, "lower", "b", True), (1, "lower", "b", True),
+                          (0, "lower", "b", True)])
+        svg = activityTrace.renderSVG(activity)
+        self.assertTrue(svg.startswith("<svg"))
+        self.assertIn(">PE 3<", svg)
+
+    def test_ring_buffers(self):
+
+        chain = ChainController([1,2,3], activity=2)
+        for i in range(5):
+            chain.member(CHANNEL, 9)
+        activity = chain.activity.activity()
+        chain.stop()
+        self.assertEqual(sorted(activity.pes), [0, 0, 1, 1, 2, 2, 3, 3, 4, 4])
+        with self.assertRaises(ValueError):
+            ChainController([1,2], activity=10, connector="twoPhase")
+        with self.assertRaises(ValueError):
+            ChainController([1,2], activity=10, engine="coop")
+
+    def test_large(self):
+
+        n = 200000
+        activity = activityTrace.Activity(
+            ["member"], array("q", range(0, 10*n, 10)),
+            array("i", [i % 50 for i in range(n)]), array("b", [0, 1]*(n//2)),
+            array("b", [1]*n), array("q", range(n)))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "large.chac")
+            self.assertEqual(activityTrace.writeActivity(path, activity), n)
+            copy = activityTrace.readActivity(path)
+        self.assertEqual(copy.times, activity.times)
+        self.assertEqual(copy.values, activity.values)
+        svg = activityTrace.renderSVG(copy, width=500)
+        self.assertLessEqual(svg.count("<rect"), 1 + 50 * 500 * 2)
+
+#===============================================================================
+
+class CriticalPathTest(unittest.TestCase):
+    """The critical path of an operation, from the messages recorded."""
+
+    def test_synthetic(self):
+
+        events = [(0, 1, "upper", "o", "member"), # controller -> PE 1
+                  (10, 1, "upper", "w", 3),
+                  (20, 2, "upper", "o", "member"), # PE 1 -> PE 2
+                  (50, 2, "upper", "w", 3),
+                  (60, 1, "lower", "b", False),    # PE 2 -> PE 1
+                  (70, 0, "lower", "b", False)]    # PE 1 -> controller
+        report = criticalPath.criticalPath(events)
+        self.assertEqual(report["span"], 70)
+        self.assertEqual([(event[0], pe, step) for event, pe, step
+                          in report["path"]],
+                         [(0, 0, 0), (10, 0, 10), (20, 1, 10), (50, 1, 30),
+                          (60, 2, 10), (70, 1, 10)])
+        self.assertEqual(report["pes"], {0: 10, 1: 50, 2: 10})
+        self.assertEqual(report["handshakes"][("member", "w", "down")], 40)
+        self.assertEqual(report["slack"], 50) # the controller waited.
+        self.assertEqual(criticalPath.operationEvents(
+                             events + [(80, 1, "upper", "o", "member")],
+                             "member"), events)
+        self.assertEqual(criticalPath.operationEvents(events, "member", 1),
+                         [])
+
+    def test_sSort(self):
+
+        chain = ChainController([5,3,4,1,2], activity=10000)
+        chain.member(CHANNEL, 9)
+        chain.sSort(CHANNEL)
+        report = chain.criticalPath("sSort")
+        self.assertEqual(chain.chain2list(CHANNEL), [1,2,3,4,5])
+        chain.stop()
+        path = report["path"]
+        self.assertEqual(path[0][0][1:], (1, "upper", "o", "sSort"))
+        self.assertEqual(sum(step for event, pe, step in path),
+                         report["span"])
+        self.assertEqual(sum(report["pes"].values()), report["span"])
+        self.assertIn(("minToTop", "w", "down"), report["handshakes"])
+        self.assertNotIn("member", {key[0] for key in report["handshakes"]})
+        self.assertIn("minToTop w down", criticalPath.formatCriticalPath(report))
+        chain = ChainController([1,2])
+        self.addCleanup(chain.stop)
+        with self.assertRaises(ValueError):
+            chain.criticalPath("sSort")
+
+#===============================================================================
+
+class SnapshotTest(unittest.TestCase):
+    """Snapshots of all the channels, in per-request buffers."""
+
+    def test_engines(self):
+
+        engines = ["thread", "coop", "numpy"]
+        if numpyChain.numpy is None:
+            engines.remove("numpy")
+        for engine in engines:
+            chain = ChainController([2,4,1],[],[5,6], engine=engine)
+            self.assertEqual(chain.snapshot(), [[2,4,1],[],[5,6]])
+            chain.stop()
+        chain = ChainController([2,4,1],[],[5,6], engine="process",
+                                processes=2)
+        self.assertEqual(chain.snapshot(), [[2,4,1],[],[5,6]])
+        self.assertEqual(chain.chain2list(CHANNEL2), [5,6])
+        chain.stop()
+
+    def test_concurrent(self):
+
+        chains = [ChainController(list(range(i, i+20))) for i in range(4)]
+        results = [None]*len(chains)
+        def take(i):
+            for repeat in range(5):
+                results[i] = chains[i].snapshot()
+        threads = [threading.Thread(target=take, args=(i,))
+                   for i in range(len(chains))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for i, chain in enumerate(chains):
+            self.assertEqual(results[i], [list(range(i, i+20)), [], []])
+            chain.stop()
+
+    def test_bases(self):
+
+        engines = ["thread", "coop", "process", "numpy"]
+        if numpyChain.numpy is None:
+            engines.remove("numpy")
+        for engine in engines:
+            chain = ChainController([2,4,17],[],[5,6], engine=engine)
+            other = ChainController([9], engine=engine)
+            self.assertEqual(chain.chain2list(CHANNEL, base=16),
+                             ["02","04","11"])
+            self.assertEqual(chain.chain2lists(base=2),
+                             [["00000010","00000100","00010001"], [],
+                              ["00000101","00000110"]])
+            self.assertEqual(chain.register2list(CHANNEL2), [5])
+            self.assertEqual(other.register2list(CHANNEL), [9]) # its own.
+            self.assertEqual(chain.register2list(CHANNEL, base=8), ["002"])
+            chain.stop()
+            other.stop()
+
+    @unittest.skipIf(numpyChain.numpy is None, "NumPy is not installed.")
+    def test_arrays(self):
+
+        for engine in ["thread", "numpy"]:
+            chain = ChainController([2,4,1],[],[5,6], engine=engine)
+            columns = chain.snapshot(asArrays=True)
+            self.assertEqual(columns[CHANNEL].dtype, numpyChain.numpy.int64)
+            self.assertEqual([c.tolist() for c in columns], [[2,4,1],[],[5,6]])
+            chain.stop()
+
+#===============================================================================
+
+class DispatchTest(unittest.TestCase):
+    """Operations sent by name or by opcode."""
+
+    def test_opcodes(self):
+
+        for engine in ["thread", "coop", "numpy"]:
+            if engine == "numpy" and numpyChain.numpy is None:
+                continue
+            chain = ChainController([1,2], engine=engine)
+            chain.connectorLower.send_o(OPCODES["addLast"], CHANNEL)
+            chain.connectorLower.send_w(3)
+            chain.connectorLower.send_o(OPCODES["member"], CHANNEL)
+            chain.connectorLower.send_w(3)
+            self.assertEqual(chain.connectorLower.receive_b(), True)
+            self.assertEqual(chain.chain2list(CHANNEL), [1,2,3])
+            chain.stop()
+
+    def test_dispatch_tables(self):
+
+        self.assertEqual(CPE.dispatch["member"], ("member", CPE.member))
+        self.assertEqual(CPE.dispatch[OPCODES["sSort"]][0], "sSort")
+        with self.assertRaises(TypeError):
+            class BadCPE(CPE):
+                member = None
+
+#===============================================================================
+
+@unittest.skipIf(numpyChain.numpy is None, "NumPy is not installed.")
+class NumpyChainTest(unittest.TestCase):
+    """The vectorized engine gives the results of the threaded one."""
+
+    def test_same_as_threads(self):
+
+        columns = ([2,4,1,5,2,3],[3,4])
+        threads = ChainController(*copy.deepcopy(columns))
+        vectors = ChainController(*copy.deepcopy(columns), engine="numpy")
+        for chain in [threads, vectors]:
+            self.assertEqual(chain.member(CHANNEL, 5), True)
+            self.assertEqual(chain.member(AUX, 5), False)
+            chain.sSort(CHANNEL)
+            chain.addLast(AUX, 7)
+            chain.addLast(CHANNEL2, 1)
+            chain.clear(AUX)
+        self.assertEqual(vectors.chain2lists(), threads.chain2lists())
+        self.assertEqual(vectors.chain2lists(), [[1,2,2,3,4,5],[],[1]])
+        threads.stop()
+        vectors.stop()
+
+    def test_operations(self):
+
+        chain = ChainController([3,1,2], engine="numpy")
+        chain.addFirst(CHANNEL, 4)
+        self.assertEqual(chain.chain2list(CHANNEL), [4,3,1,2])
+        self.assertEqual(chain.removeGetFirst(CHANNEL), 4)
+        chain.copy(CHANNEL, AUX)
+        chain.setAll(AUX, 0)
+        chain.swap(CHANNEL, CHANNEL2)
+        self.assertEqual(chain.chain2lists(), [[],[0,0,0],[3,1,2]])
+        chain.insertNonDecreasing(AUX, 1)
+        self.assertEqual(chain.minimum(CHANNEL2), 1)
+        self.assertEqual(chain.last(AUX), 1)
+        self.assertEqual(chain.length(CHANNEL2), 3)
+        self.assertEqual(chain.getItem(CHANNEL2, 1), 1)
+        with self.assertRaises(IndexError):
+            chain.insertAtIndex(CHANNEL2, 3, 9)
+        chain.reverse(CHANNEL2, CHANNEL)
+        self.assertEqual(chain.chain2lists(), [[2,1,3],[0,0,0,1],[]])
+        with self.assertRaises(EmptyError):
+            chain.removeGetFirst(CHANNEL2)
+        chain.stop()
+
+    def test_steps(self):
+
+        chain = ChainController(list(range(100)), engine="numpy")
+        chain.addLast(CHANNEL, 100)
+        self.assertEqual(chain.chain.lastSteps, 102)
+        chain.member(CHANNEL, 9)
+        self.assertEqual(chain.chain.lastSteps, 20)
+        chain.stop()
+
+    def test_long_chain(self):
+
+        n = 100000
+        chain = ChainController(numpyChain.numpy.arange(n)[::-1],
+                                engine="numpy")
+        chain.sSort(CHANNEL)
+        self.assertEqual(chain.chain2list(CHANNEL), list(range(n)))
+        chain.stop()
+
 #===============================================================================
         
 def main(argv):
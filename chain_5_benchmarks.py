@@ -0,0 +1,795 @@
+#!/usr/bin/env python3
+
+"""CHAIN BENCHMARKS.
+   Timing of the implementation, not a part of the model.
+   Usage: python3 chain_5_benchmarks.py [benchmark ...]
+   Without arguments all the benchmarks are run;
+   every benchmark prints a small table."""
+
+#===============================================================================
+
+import copy
+import multiprocessing
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from chain_2_controller import *
+from pipelinedChain import PipelinedChainController
+from deadlockWatchdog import DeadlockWatchdog
+import complexityCheck
+import activityTrace
+import criticalPath
+import tempfile
+from array import array
+import numpyChain
+
+CHANNEL = 0
+
+#===============================================================================
+
+def seconds(function, repeat=1):
+    """The best time of repeat calls of function, in seconds."""
+    best = float("inf")
+    for r in range(repeat):
+        t = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+def microseconds(t):
+    return "{:10.2f} us".format(t * 1e6)
+
+def currentRSS():
+    """The current resident set size, in MB (Linux)."""
+    with open("/proc/self/statm") as statm:
+        pages = int(statm.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+#===============================================================================
+
+class EvalCPE(CPE):
+    """A CPE running operations as before the dispatch table:
+       by evaluating a formatted string. For comparison only."""
+
+    def run(self):
+        while True:
+            self.operation, self.channels = self.connectorUpper.receive_o()
+            checkChannels(self.operation, self.channels)
+            if self.operation != "printRepr" and self.operation != "printStr":
+                self.temp_w = [Any]*TEMP_SPACE
+                self.temp_b = [Any]*TEMP_SPACE
+            if self.operation == "stop":
+                self.stop()
+                break
+            else:
+                eval("self.%s(*%s)" % (self.operation, self.channels))
+            self.operation = Any
+            self.channels = Any
+
+def benchmarkDispatch(n=300, operations=20):
+    """Per-hop cost of addLast and member on a chain of n CPEs,
+       for eval-based and table-based dispatch.
+       addLast visits n+2 CPEs, member of an absent word 2(n+1);
+       addLast operations are pipelined, so their cost per hop is
+       measured until a trailing member completes."""
+    print("dispatch: per-hop cost, chain of %s CPEs, %s operations" %
+          (n, operations))
+    pe = CPE()
+    code = OPCODES["clear"]
+    def evalDispatch():
+        self = pe
+        for i in range(10000):
+            eval("self.%s(*%s)" % ("clear", (0,)))
+    def tableDispatch():
+        self = pe
+        for i in range(10000):
+            self.dispatch[code][1](self, *(0,))
+    evalCost = seconds(evalDispatch, 3) / 10000
+    tableCost = seconds(tableDispatch, 3) / 10000
+    print("    dispatch alone  eval %s  table %s" %
+          (microseconds(evalCost), microseconds(tableCost)))
+    for engine in [EvalCPE, CPE]:
+        chain = ChainController(list(range(n)), engine=engine)
+        def addLasts(): # member waits until all the addLasts are done.
+            for i in range(operations):
+                chain.addLast(CHANNEL, 0)
+            chain.member(CHANNEL, n)
+        addLast = seconds(addLasts)
+        hops = sum(n+2+i for i in range(operations)) + 2*(n+operations+1)
+        member = seconds(lambda: [chain.member(CHANNEL, n)
+                                  for i in range(operations)])
+        hops2 = 2*(n+operations+1)*operations
+        print("    %-8s addLast %s/hop  member %s/hop" %
+              (engine.__name__, microseconds(addLast/hops),
+               microseconds(member/hops2)))
+        chain.stop()
+
+#===============================================================================
+
+def benchmarkConnector(handshakes=20000, connectors=10000, n=300):
+    """Handshake latency and memory per connector, Connector against
+       ConditionConnector: two threads exchange words; then
+       the allocated memory of many connectors; then addLast/member
+       on a chain of n CPEs."""
+    print("connector: %s handshakes, %s connectors, chain of %s CPEs" %
+          (handshakes, connectors, n))
+    for connectorClass, connector in [(Connector, "event"),
+                                      (ConditionConnector, "condition")]:
+        link = connectorClass()
+        def receiver():
+            for i in range(handshakes):
+                link.receive_w()
+        def sender():
+            thread = threading.Thread(target=receiver)
+            thread.start()
+            for i in range(handshakes):
+                link.send_w(i)
+            thread.join()
+        latency = seconds(sender) / handshakes
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        links = [connectorClass() for i in range(connectors)]
+        size = (tracemalloc.get_traced_memory()[0] - before) / connectors
+        tracemalloc.stop()
+        del links
+        chain = ChainController(list(range(n)), connector=connector)
+        def operations():
+            for i in range(10):
+                chain.addLast(CHANNEL, 0)
+            chain.member(CHANNEL, n)
+        hops = sum(n+2+i for i in range(10)) + 2*(n+11)
+        perHop = seconds(operations) / hops
+        chain.stop()
+        print("    %-18s handshake %s  %6d bytes  addLast/member %s/hop" %
+              (connectorClass.__name__, microseconds(latency), size,
+               microseconds(perHop)))
+
+#===============================================================================
+
+def connectorCounts(chain):
+    """The total transitions and waits of the connectors of a chain."""
+    transitions = waits = 0
+    for pe in chainPEs(chain.chain.chainName):
+        transitions += pe.connectorUpper.transitions
+        waits += pe.connectorUpper.waits
+    return transitions, waits
+
+def benchmarkProtocol(n=200, operations=50):
+    """4-phase against 2-phase handshakes (ConditionConnector against
+       TwoPhaseConnector): signal transitions and waits per operation,
+       and the throughput of streams of operations on a chain of n CPEs.
+       push and pull are exercises; the streams use pushPoor, addLast,
+       and member, which returns an answer from the bottom of the chain."""
+    print("protocol: chain of %s CPEs, streams of %s operations" %
+          (n, operations))
+    streams = [("pushPoor", lambda chain: chain.addFirstPoor(CHANNEL, 1)),
+               ("addLast", lambda chain: chain.addLast(CHANNEL, 1)),
+               ("member", lambda chain: chain.member(CHANNEL, n+1))]
+    for name, operation in streams:
+        for connector in ["condition", "twoPhase"]:
+            chain = ChainController(list(range(n)), connector=connector)
+            chain.member(CHANNEL, n+1) # all the CPE threads are running.
+            before = connectorCounts(chain)
+            def stream():
+                for i in range(operations):
+                    operation(chain)
+                chain.member(CHANNEL, n+1) # wait for the stream to end.
+            t = seconds(stream)
+            after = connectorCounts(chain)
+            chain.stop()
+            print("    %-8s %-9s %8.0f ops/s  %7.1f transitions/op  "
+                  "%7.1f waits/op" %
+                  (name, connector, operations/t,
+                   (after[0]-before[0])/operations,
+                   (after[1]-before[1])/operations))
+
+#===============================================================================
+
+def benchmarkBuffered(n=200, operations=50, depths=(1, 4, 16)):
+    """Throughput of back-to-back pushPoor and addLast streams
+       on a chain of n CPEs, for unbuffered connectors and for
+       BufferedConnectors of the given depths.
+       (push is an exercise; pushPoor is its implemented version.)"""
+    print("buffered: chain of %s CPEs, streams of %s operations" %
+          (n, operations))
+    streams = [("pushPoor", lambda chain: chain.addFirstPoor(CHANNEL, 1)),
+               ("addLast", lambda chain: chain.addLast(CHANNEL, 1))]
+    connectors = [("event", 1), ("condition", 1)]
+    connectors += [("buffered", depth) for depth in depths]
+    for name, operation in streams:
+        for connector, depth in connectors:
+            chain = ChainController(list(range(n)), connector=connector,
+                                    depth=depth)
+            chain.member(CHANNEL, n+1) # all the CPE threads are running.
+            def stream():
+                for i in range(operations):
+                    operation(chain)
+                chain.member(CHANNEL, n+1) # wait for the stream to end.
+            t = seconds(stream)
+            chain.stop()
+            label = connector if connector != "buffered" else \
+                    "buffered %s" % depth
+            print("    %-8s %-12s %8.0f ops/s" %
+                  (name, label, operations/t))
+
+#===============================================================================
+
+def benchmarkPipelined(n=50, operations=50, work=0.01):
+    """The blocking ChainController against PipelinedChainController
+       on a chain of n CPEs: operations pairs addLast, member
+       (of an absent word), with work seconds of other work
+       (sleeping, e.g. I/O) done by the caller between the pairs.
+       The time the caller is blocked by the chain before the last pair
+       is issued is reported too."""
+    print("pipelined: chain of %s CPEs, %s addLast+member pairs, "
+          "%s ms of work per pair" % (n, operations, work*1000))
+    for controller in [ChainController, PipelinedChainController]:
+        chain = controller(list(range(n)))
+        chain.member(CHANNEL, n+1) # all the CPE threads are running.
+        blocked = 0
+        t = time.perf_counter()
+        if controller is ChainController:
+            for i in range(operations):
+                t1 = time.perf_counter()
+                chain.addLast(CHANNEL, n)
+                chain.member(CHANNEL, n+1)
+                blocked += time.perf_counter() - t1
+                time.sleep(work)
+        else:
+            futures = []
+            for i in range(operations):
+                t1 = time.perf_counter()
+                chain.submit("addLast", CHANNEL, n)
+                futures.append(chain.submit("member", CHANNEL, n+1))
+                blocked += time.perf_counter() - t1
+                time.sleep(work)
+            results = [future.result() for future in futures]
+        t = time.perf_counter() - t
+        chain.stop()
+        print("    %-24s %8.0f pairs/s  caller blocked %5.1f%%" %
+              (controller.__name__, operations/t, 100*blocked/t))
+
+#===============================================================================
+
+def benchmarkBulk(sizes=(("thread", 200), ("coop", 2000), ("numpy", 20000))):
+    """Loading k words into an empty channel word by word (addLast)
+       against a single addAllLast, and emptying it by chain2list+clear
+       against drain, for every (engine, k) in sizes.
+       Every word travels down to its place, so in the CPE engines
+       both ways take Theta(k^2) messages; the bulk call saves
+       the per-word calls and round trips of the controller.
+       chain2list is a testing tool which bypasses the connectors;
+       drain moves every word up through the chain."""
+    print("bulk: loading and draining k words")
+    for engine, k in sizes:
+        if engine == "numpy" and numpyChain.numpy is None:
+            continue
+        words = list(range(k))
+        chain = ChainController(engine=engine)
+        def byWord():
+            for word in words:
+                chain.addLast(CHANNEL, word)
+            chain.member(CHANNEL, k) # wait until all the words are loaded.
+        t1 = seconds(byWord)
+        t2 = seconds(lambda: (chain.chain2list(CHANNEL), chain.clear(CHANNEL)))
+        def bulk():
+            chain.addAllLast(CHANNEL, words)
+            chain.member(CHANNEL, k)
+        t3 = seconds(bulk)
+        t4 = seconds(lambda: chain.drain(CHANNEL))
+        chain.stop()
+        print("    %-7s k=%-7s addLast %8.0f words/s  addAllLast %8.0f words/s"
+              "  chain2list+clear %8.0f words/s  drain %8.0f words/s" %
+              (engine, k, k/t1, k/t3, k/t2, k/t4))
+
+#===============================================================================
+
+def deepcopyRows(*columns):
+    """The rows of a chain as built before streaming construction:
+       all the columns deep-copied and padded to the same length.
+       For comparison only."""
+    columnsAux = copy.deepcopy(columns)
+    for i in range(CHANNELS-len(columnsAux)):
+        columnsAux += ([],)
+    for c in columnsAux:
+        c.append(None)
+    depth = max(len(c) for c in columnsAux)
+    for c in columnsAux:
+        c.extend((Any,)*(depth-len(c)))
+    rows = []
+    for d in range(depth):
+        row = []
+        for w in range(CHANNELS):
+            item = columnsAux[w][d]
+            if item is None:
+                row.append((Any, True))
+            elif item is Any:
+                row.append((Any, Any))
+            else:
+                row.append((item, False))
+        rows.append(row)
+    return rows
+
+def construct(engine, n, way):
+    """Runs in a fresh process: builds a chain of n words in channel 0;
+       returns the construction time and the peak RSS in MB
+       above the RSS before the input was created."""
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t = time.perf_counter()
+    if way == "deepcopy":
+        rows = deepcopyRows(list(range(n)))
+        top = pe = CoopCPE(CoopScheduler())
+        for d in range(len(rows)):
+            for w in range(CHANNELS):
+                pe.word[w], pe.bit[w] = rows[d][w]
+            pe.start()
+            if d < len(rows) - 1:
+                lowerPE = pe._newLowerPE()
+                pe.connectorLower = lowerPE.connectorUpper
+                pe = lowerPE
+    elif way == "list":
+        chain = ChainController(list(range(n)), engine=engine)
+    elif way == "generator":
+        chain = ChainController((i for i in range(n)), engine=engine)
+    else: # "array"
+        chain = ChainController(numpyChain.numpy.arange(n), engine=engine)
+    t = time.perf_counter() - t
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+    return t, peak / 1024
+
+def benchmarkConstruction(sizes=(10**5, 3*10**5, 10**6)):
+    """Construction time and peak RSS of a chain of n words,
+       every construction in a fresh process: the coop engine
+       (CPE objects without threads) built as before
+       (deepcopy-and-pad), from a list and from a generator;
+       the numpy engine from a NumPy array."""
+    print("construction: time and peak RSS of a chain of n words")
+    context = multiprocessing.get_context("spawn")
+    ways = [("coop", "deepcopy"), ("coop", "list"), ("coop", "generator")]
+    if numpyChain.numpy is not None:
+        ways.append(("numpy", "array"))
+    for n in sizes:
+        for engine, way in ways:
+            with context.Pool(1) as pool:
+                t, peak = pool.apply(construct, (engine, n, way))
+            print("    n=%-8s %-6s %-10s %8.2f s  %8.1f MB" %
+                  (n, engine, way, t, peak))
+
+#===============================================================================
+
+def memoryPerPE(engine, n):
+    """Runs in a fresh process: builds a chain of n words in channel 0;
+       returns the Python memory (traced by tracemalloc) and the RSS,
+       in bytes per CPE. Engine "state" builds the CPE objects of the
+       thread engine, with ConditionConnectors, connected but not started."""
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    if engine == "state":
+        pes = [CPE(None, ConditionConnector)] # the connectors do not refer to the CPE objects.
+        for d in range(n+1):
+            pe = pes[-1]
+            pe.word[CHANNEL], pe.bit[CHANNEL] = (d, False) if d < n else (Any, True)
+            if d < n:
+                lowerPE = pe._newLowerPE()
+                pe.connectorLower = lowerPE.connectorUpper
+                pes.append(lowerPE)
+    else:
+        chain = ChainController(list(range(n)), engine=engine)
+    traced = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    rss = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) * 1024
+    if engine == "thread":
+        chain.stop()
+    return traced / (n+1), rss / (n+1)
+
+def benchmarkMemory(sizes=(10**4, 10**5, 10**6), threads=10**4):
+    """Bytes per CPE of a chain of n words, every chain in a fresh process:
+       the CPE objects alone, the coop engine, and the thread engine,
+       whose every CPE also has a thread (and its stack),
+       for n up to threads only."""
+    print("memory: bytes per CPE of a chain of n words")
+    context = multiprocessing.get_context("spawn")
+    for n in sizes:
+        for engine in ["state", "coop", "thread"]:
+            if engine == "thread" and n > threads:
+                continue
+            with context.Pool(1) as pool:
+                traced, rss = pool.apply(memoryPerPE, (engine, n))
+            print("    n=%-8s %-6s %8d B traced  %8d B RSS" %
+                  (n, engine, traced, rss))
+
+#===============================================================================
+
+def benchmarkSnapshot(n=300, repeat=5):
+    """The contents of the 3 channels of a chain of n CPEs, each one
+       of length n: one chain2list pass per channel (into the buffer
+       of the chain, as chain2lists did before snapshot), one snapshot pass
+       collecting the words, and snapshot as it is now: sync,
+       then a read of the register file; for the coop engine,
+       the snapshot pass against a read of the register file."""
+    print("snapshot: 3 channels of %s words" % n)
+    chain = ChainController(*[list(range(n))]*CHANNELS)
+    def perChannel():
+        for channel in range(CHANNELS):
+            chain.chain.chainState.buffer.clear()
+            chain.connectorLower.send_o("chain2list", channel)
+            chain.connectorLower.receive_b()
+    def collect(chainState):
+        def snapshotPass():
+            chainState.snapshot = [[] for channel in range(CHANNELS)]
+            chain.connectorLower.send_o("snapshot", *range(CHANNELS))
+            chain.connectorLower.receive_b()
+            chainState.snapshot = None
+        return snapshotPass
+    print("    thread chain2list x 3 %s" %
+          microseconds(seconds(perChannel, repeat)))
+    print("    thread snapshot pass  %s" %
+          microseconds(seconds(collect(chain.chain.chainState), repeat)))
+    print("    thread register file  %s" %
+          microseconds(seconds(chain.snapshot, repeat)))
+    chain.stop()
+    chain = ChainController(*[list(range(n))]*CHANNELS, engine="coop")
+    print("    coop   snapshot pass  %s" %
+          microseconds(seconds(collect(chain.chain.scheduler), repeat)))
+    print("    coop   register file  %s" %
+          microseconds(seconds(chain.snapshot, repeat)))
+    chain.stop()
+
+#===============================================================================
+
+class ExtendTimingCPE(CPE):
+    """A CPE recording how long every extend takes. For benchmarks only."""
+
+    durations = [] # seconds, of all the chains.
+
+    def extend(self):
+        t = time.perf_counter()
+        super().extend()
+        ExtendTimingCPE.durations.append(time.perf_counter() - t)
+
+def benchmarkPool(n=300, chunks=(0, 16, 64)):
+    """n addLast to an empty chain, each one extending the chain by a CPE:
+       the time spent in extend (median, 99th percentile and maximum),
+       and the time until the chain completed them, without a CPE pool
+       (chunk 0) and with pools of the given chunks."""
+    print("pool: %s addLast, each one extending the chain" % n)
+    for chunk in chunks:
+        chain = ChainController([], engine=ExtendTimingCPE, pool=chunk)
+        time.sleep(0.2) # the pool fills up ahead of demand.
+        ExtendTimingCPE.durations = []
+        def operations():
+            for i in range(n):
+                chain.addLast(CHANNEL, i)
+            chain.chain2list(CHANNEL) # waits for the whole chain.
+        total = seconds(operations)
+        durations = sorted(ExtendTimingCPE.durations)
+        hits = misses = 0
+        if chain.pool is not None:
+            hits, misses = chain.pool.hits, chain.pool.misses
+        chain.stop()
+        print("    chunk %3d  extend p50 %s  p99 %s  max %s  total %8.1f ms"
+              "  hits %d misses %d" %
+              (chunk, microseconds(durations[len(durations)//2]),
+               microseconds(durations[len(durations)*99//100]),
+               microseconds(durations[-1]), total*1e3, hits, misses))
+
+#===============================================================================
+
+def benchmarkCompact(sizes=(1000, 5000)):
+    """A chain of n words, then clear: the number of threads and the RSS
+       before and after compact, which also reports how long it took."""
+    print("compact: a chain of n words, then clear")
+    for n in sizes:
+        chain = ChainController(list(range(n)))
+        chain.clear(CHANNEL)
+        threads, rss = threading.active_count(), currentRSS()
+        t = time.perf_counter()
+        chain.compact()
+        t = time.perf_counter() - t
+        print("    n=%-6s threads %6d -> %d  RSS %7.1f -> %7.1f MB  "
+              "compact %8.1f ms" % (n, threads, threading.active_count(),
+                                    rss, currentRSS(), t*1e3))
+        chain.stop()
+
+#===============================================================================
+
+def benchmarkRelease(handshakes=20000, n=300):
+    """Checked against release mode: a handshake between two threads
+       (send_w/receive_w), and addLast/member per hop on a chain of n CPEs."""
+    print("release: %s handshakes, chain of %s CPEs" % (handshakes, n))
+    for connectorClass, connector, mode in [
+            (Connector, "event", "checked"),
+            (ConditionConnector, "condition", "checked"),
+            (ReleaseConnector, "condition", "release")]:
+        link = connectorClass()
+        def receiver():
+            for i in range(handshakes):
+                link.receive_w()
+        def sender():
+            thread = threading.Thread(target=receiver)
+            thread.start()
+            for i in range(handshakes):
+                link.send_w(i)
+            thread.join()
+        latency = seconds(sender) / handshakes
+        chain = ChainController(list(range(n)), connector=connector, mode=mode)
+        def operations():
+            for i in range(10):
+                chain.addLast(CHANNEL, 0)
+            chain.member(CHANNEL, n)
+        hops = sum(n+2+i for i in range(10)) + 2*(n+11)
+        perHop = seconds(operations) / hops
+        chain.stop()
+        print("    %-7s %-18s handshake %s  addLast/member %s/hop" %
+              (mode, connectorClass.__name__, microseconds(latency),
+               microseconds(perHop)))
+
+#===============================================================================
+
+def benchmarkTrace(n=300, capacity=65536):
+    """Runtime checks against recorded traces: addLast/member per hop
+       on a chain of n CPEs, checked, release, and release with a trace
+       of capacity events, and the time of verifying the trace offline."""
+    print("trace: chain of %s CPEs, trace capacity %s" % (n, capacity))
+    for label, mode, trace in [("checked", "checked", 0),
+                               ("release", "release", 0),
+                               ("traced", "release", capacity)]:
+        chain = ChainController(list(range(n)), connector="condition",
+                                mode=mode, trace=trace)
+        def operations():
+            for i in range(10):
+                chain.addLast(CHANNEL, 0)
+            chain.member(CHANNEL, n)
+        hops = sum(n+2+i for i in range(10)) + 2*(n+11)
+        perHop = seconds(operations) / hops
+        line = "    %-8s addLast/member %s/hop" % (label, microseconds(perHop))
+        if trace:
+            events = len(chain.trace.events)
+            verification = seconds(chain.verifyTrace)
+            line += "  verify %s events in %s" % (events,
+                                                  microseconds(verification))
+        chain.stop()
+        print(line)
+
+#===============================================================================
+
+class BrokenController(ChainController):
+    """A controller with a protocol error, for benchmarkWatchdog."""
+
+    def broken(self, channelA):
+        self.connectorLower.send_o("clear", channelA)
+        return self.connectorLower.receive_b() # clear sends nothing up
+
+def benchmarkWatchdog(n=300, interval=0.1):
+    """The cost of a DeadlockWatchdog sampling every interval seconds:
+       addLast/member per hop on a chain of n CPEs without and with it,
+       the time of one sample, and the time to report a deadlock."""
+    print("watchdog: chain of %s CPEs, interval %s s" % (n, interval))
+    for watchdog in [0, interval]:
+        chain = ChainController(list(range(n)), watchdog=watchdog)
+        def operations():
+            for i in range(10):
+                chain.addLast(CHANNEL, 0)
+            chain.member(CHANNEL, n)
+        hops = sum(n+2+i for i in range(10)) + 2*(n+11)
+        perHop = seconds(operations) / hops
+        line = "    watchdog=%-5s addLast/member %s/hop" % (watchdog,
+                                                          microseconds(perHop))
+        if watchdog:
+            sample = seconds(chain.watchdog.check, repeat=5)
+            line += "  sample of %s threads %s" % (threading.active_count(),
+                                                   microseconds(sample))
+        chain.stop()
+        print(line)
+    found = threading.Event()
+    chain = BrokenController(list(range(n)), mode="release", watchdog=interval)
+    chain.watchdog.onDeadlock = lambda deadlock: found.set()
+    t = time.perf_counter()
+    broken = threading.Thread(target=chain.broken, args=(CHANNEL,))
+    broken.start()
+    found.wait()
+    print("    deadlock reported in %s: %s" %
+          (microseconds(time.perf_counter() - t),
+           "  <->  ".join(chain.watchdog.deadlocks[0])))
+    # Break the deadlock: stop may be received by the top CPE (which stops
+    # the chain), by the broken call, or by both of them.
+    chain.connectorLower.send_o("stop")
+    broken.join(0.1)
+    chain.chain.thread.join(0.1)
+    if chain.chain.thread.is_alive():
+        chain.connectorLower.send_o("stop")
+    for pe in chainPEs(chain.chain.chainName):
+        pe.join()
+    chain.watchdog.stop()
+    if broken.is_alive():
+        chain.connectorLower.send_b(Any)
+        broken.join()
+
+#===============================================================================
+
+def benchmarkMetrics(handshakes=20000, n=300):
+    """The cost of the message counters, always on: a counter increment
+       against a handshake between two threads (send_w/receive_w, each one
+       counts the message), and the time of metrics() on a chain of n CPEs."""
+    print("metrics: %s handshakes, chain of %s CPEs" % (handshakes, n))
+    counts = [0, 0, 0, 0, 0]
+    def increments():
+        for i in range(handshakes):
+            counts[1] += 1
+    increment = seconds(increments, repeat=5) / handshakes
+    print("    counter increment %s" % microseconds(increment))
+    for connectorClass in [Connector, ConditionConnector, ReleaseConnector]:
+        link = connectorClass()
+        def receiver():
+            for i in range(handshakes):
+                link.receive_w()
+        def sender():
+            thread = threading.Thread(target=receiver)
+            thread.start()
+            for i in range(handshakes):
+                link.send_w(i)
+            thread.join()
+        latency = seconds(sender) / handshakes
+        print("    %-18s handshake %s, counters %.2f%%" %
+              (connectorClass.__name__, microseconds(latency),
+               100 * 2 * increment / latency))
+    chain = ChainController(list(range(n)))
+    for i in range(10):
+        chain.member(CHANNEL, i*n//10)
+    print("    metrics() of %s CPEs %s" %
+          (n, microseconds(seconds(chain.metrics, repeat=3))))
+    chain.stop()
+
+#===============================================================================
+
+def benchmarkClocks(sizes=(10, 20, 40), handshakes=20000):
+    """The top and total complexity of operations, in logical steps
+       (Lamport clocks, see ChainController.measure), on chains of
+       the given sizes: how the steps grow with n shows the complexity
+       class, and top against total which part is on the controller's
+       critical path. Also the cost of a ClockedConnector handshake."""
+    print("clocks: top x total steps, chains of %s CPEs" %
+          ", ".join(map(str, sizes)))
+    calls = [("addLast", "addLast", (CHANNEL, 0)),
+             ("member last", "member", (CHANNEL, 0)),
+             ("sSort", "sSort", (CHANNEL,)),
+             ("member first", "member", (CHANNEL, 0)),
+             ("clear", "clear", (CHANNEL,))]
+    steps = {label: [] for label, operation, arguments in calls}
+    for n in sizes:
+        chain = ChainController(list(range(n, 0, -1)), # descending
+                                clocks=True)
+        for label, operation, arguments in calls:
+            result, top, total = chain.measure(operation, *arguments)
+            steps[label].append("%5s x %-6s" % (top, total))
+        chain.stop()
+    for label, operation, arguments in calls:
+        print("    %-12s %s" % (label, "  ".join(steps[label])))
+    for connectorClass in [ConditionConnector, ClockedConnector]:
+        link = connectorClass()
+        link.operation = "member"
+        def receiver():
+            for i in range(handshakes):
+                link.receive_w()
+        def sender():
+            thread = threading.Thread(target=receiver)
+            thread.start()
+            for i in range(handshakes):
+                link.send_w(i)
+            thread.join()
+        print("    %-18s handshake %s" % (connectorClass.__name__,
+              microseconds(seconds(sender) / handshakes)))
+
+#===============================================================================
+
+def benchmarkComplexity(sizes=(16, 32, 64, 128, 256)):
+    """The growth n^slope of the top and total steps of the operations
+       which can be measured (see complexityCheck.py), against their
+       claims, on chains of the given sizes."""
+    print("complexity: chains of %s CPEs" % ", ".join(map(str, sizes)))
+    start = time.perf_counter()
+    fits = complexityCheck.fitComplexity(sizes)
+    for name, (claim, top, total) in fits.items():
+        print("    %-14s %-24s n^%.2f x n^%.2f" %
+              (name, "%s(%s)x%s(%s)" % (claim[0] + claim[1]), top, total))
+    errors = complexityCheck.checkFits(fits)
+    print("    %s claims not matched, %.1f s" %
+          (len(errors), time.perf_counter() - start))
+    for error in errors:
+        print("    " + error)
+
+#===============================================================================
+
+def benchmarkActivity(handshakes=20000, events=2000000, pes=200):
+    """The cost of recording the messages received (ActivityConnector
+       against ConditionConnector, per handshake between two threads),
+       and of saving, reading and drawing a synthetic activity of events
+       messages among pes CPEs."""
+    print("activity: %s handshakes, %s events of %s CPEs" %
+          (handshakes, events, pes))
+    recorder = activityTrace.ActivityRecorder(handshakes)
+    for name, newConnector in [
+            ("ConditionConnector", ConditionConnector),
+            ("ActivityConnector",
+             lambda: ActivityConnector(recorder))]:
+        link = newConnector()
+        def receiver():
+            for i in range(handshakes):
+                link.receive_w()
+        def sender():
+            thread = threading.Thread(target=receiver)
+            thread.start()
+            for i in range(handshakes):
+                link.send_w(i)
+            thread.join()
+        print("    %-18s handshake %s" %
+              (name, microseconds(seconds(sender) / handshakes)))
+    activity = activityTrace.Activity(
+        ["member"], array("q", range(0, 50*events, 50)),
+        array("i", [i % pes for i in range(events)]),
+        array("b", [i % 2 for i in range(events)]),
+        array("b", [1]*events), array("q", range(events)))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "activity.chac")
+        write = seconds(lambda: activityTrace.writeActivity(path, activity))
+        size = os.path.getsize(path)
+        read = seconds(lambda: activityTrace.readActivity(path))
+    render = seconds(lambda: activityTrace.renderSVG(activity))
+    print("    write %.2f s (%.1f MB), read %.2f s, render SVG %.2f s" %
+          (write, size / 2**20, read, render))
+
+#===============================================================================
+
+def benchmarkCriticalPath(n=40):
+    """The critical path of sSort of a descending channel of n words:
+       which CPEs and which handshakes of its minToTop sessions dominate
+       its wall time, and the time of the analysis."""
+    print("critical path: sSort of %s words" % n)
+    chain = ChainController(list(range(n, 0, -1)), activity=1000000)
+    chain.sSort(CHANNEL)
+    start = time.perf_counter()
+    report = chain.criticalPath("sSort")
+    analysis = time.perf_counter() - start
+    chain.stop()
+    for line in criticalPath.formatCriticalPath(report).split("\n"):
+        print("    " + line)
+    print("    analysis %.2f s" % analysis)
+
+#===============================================================================
+
+BENCHMARKS = {
+    "dispatch": benchmarkDispatch,
+    "connector": benchmarkConnector,
+    "protocol": benchmarkProtocol,
+    "buffered": benchmarkBuffered,
+    "pipelined": benchmarkPipelined,
+    "bulk": benchmarkBulk,
+    "construction": benchmarkConstruction,
+    "snapshot": benchmarkSnapshot,
+    "memory": benchmarkMemory,
+    "pool": benchmarkPool,
+    "compact": benchmarkCompact,
+    "release": benchmarkRelease,
+    "trace": benchmarkTrace,
+    "watchdog": benchmarkWatchdog,
+    "metrics": benchmarkMetrics,
+    "clocks": benchmarkClocks,
+    "complexity": benchmarkComplexity,
+    "activity": benchmarkActivity,
+    "criticalPath": benchmarkCriticalPath,
+}
+
+def main(argv):
+    names = argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
+        print()
+
+#===============================================================================
+
+if __name__ == '__main__':
+    main(sys.argv)
+
+#===============================================================================
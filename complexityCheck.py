@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+"""EMPIRICAL CHECK OF THE COMPLEXITY CLAIMS
+
+   The docstring of an operation of ChainController states its complexity
+   as top x total, e.g. "Theta(1)xTheta(n), propagation |.":
+     top   - the time until the controller gets control back,
+     total - the time until the whole chain is quiescent again.
+   checkComplexity runs the operations on chains of increasing length,
+   measures top and total in logical steps (Lamport clocks, see
+   ChainController.measure), fits the growth of each of them as n^slope
+   (least squares on log steps against log n), and reports the operations
+   whose slope does not match the degree of the claim:
+     Theta(f) - |slope - degree(f)| <= TOLERANCE,
+     O(f)     - slope <= degree(f) + TOLERANCE.
+   The other variables of a claim (k, m, length) grow with n: the words
+   added, the other channel and the words pulled have length n as well,
+   so Theta(k+n) is taken as Theta(n).
+
+   The measured methods of ChainController are those with a claim,
+   whose arguments are all known by name (see _argument), and which send
+   only operations implemented by CPE (not exercises). A searched word is
+   never in the chain: the worst case of member.
+
+   Every CPE is a thread: the chains are hundreds of CPEs at most,
+   not 2^14 of them. Not a part of the model."""
+
+# ==============================================================================
+
+import ast
+import inspect
+import math
+import re
+import textwrap
+
+from chain_2_controller import ChainController, CPE, CHANNELS
+from signatureCheck import isExercise
+
+# ==============================================================================
+
+SIZES = (8, 16, 32, 64) # chain lengths n.
+TOLERANCE = 0.25
+
+_CLAIM = re.compile(r"(Theta|O)\(([^)]*)\) ?x ?(Theta|O)\(([^)]*)\)")
+_TERM = re.compile(r"([a-z]+)(?:\^(\d+))?$")
+
+# ==============================================================================
+
+def parseClaim(docstring):
+    """Returns the claim of a docstring as ((bound, expression),
+       (bound, expression)) for top and total, e.g.
+       "Theta(1)xO(n)" -> (("Theta", "1"), ("O", "n")), or None."""
+    match = _CLAIM.search(docstring or "")
+    if match is None:
+        return None
+    top, topExpression, total, totalExpression = match.groups()
+    return (top, topExpression.strip()), (total, totalExpression.strip())
+
+def degree(expression):
+    """The degree of a claim expression, all its variables taken as n:
+       a sum of constants, variables and powers, e.g. "k+n" -> 1,
+       "n^2" -> 2, "1" -> 0. Raises ValueError for another expression."""
+    result = 0
+    for term in expression.replace(" ", "").split("+"):
+        if term.isdigit():
+            continue
+        match = _TERM.match(term)
+        if match is None:
+            raise ValueError("degree: unknown term %s in %s." %
+                             (term, expression))
+        result = max(result, int(match.group(2) or 1))
+    return result
+
+def slope(sizes, steps):
+    """The least squares slope of log steps against log sizes:
+       steps grow as n^slope."""
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(step, 1)) for step in steps]
+    xMean = sum(xs) / len(xs)
+    yMean = sum(ys) / len(ys)
+    return sum((x - xMean) * (y - yMean) for x, y in zip(xs, ys)) / \
+           sum((x - xMean) ** 2 for x in xs)
+
+# ==============================================================================
+
+def _sentOperations(function):
+    """The operations op of the send_o("op", ...) calls of function,
+       in the order of the source."""
+    source = textwrap.dedent(inspect.getsource(function))
+    return [node.args[0].value for node in ast.walk(ast.parse(source))
+            if isinstance(node, ast.Call) and
+               isinstance(node.func, ast.Attribute) and
+               node.func.attr == "send_o" and node.args and
+               isinstance(node.args[0], ast.Constant)]
+
+def _argument(name, n):
+    """The argument of a parameter, by its name, for a chain of length n,
+       or None if the name is not known."""
+    return {"channelA": 0, "channelB": 1, "resultChannel": 2,
+            "word": n, "item": n, "word1": n, "word2": 0,
+            "words": list(range(n)), "n": n}.get(name)
+
+def operations(controllerClass=ChainController, cpeClass=CPE):
+    """Returns {method name: (claim, operations)}: the methods of
+       controllerClass which can be measured (see the module docstring)
+       and the operations they send.
+       An alias (push = addFirst) is measured once, by its first name."""
+    result = {}
+    seen = set()
+    for name, method in vars(controllerClass).items():
+        if not inspect.isfunction(method) or name.startswith("_") or \
+           method in seen:
+            continue
+        seen.add(method)
+        claim = parseClaim(method.__doc__)
+        sent = _sentOperations(method)
+        if claim is None or not sent:
+            continue
+        implementations = [getattr(cpeClass, operation, None)
+                           for operation in sent]
+        if not all(inspect.isfunction(implementation) and
+                   not isExercise(implementation)
+                   for implementation in implementations):
+            continue # an exercise would never answer.
+        parameters = list(inspect.signature(method).parameters)[1:]
+        if any(_argument(parameter, 1) is None for parameter in parameters):
+            continue
+        result[name] = (claim, sent)
+    return result
+
+def measureSteps(name, sizes=SIZES, controllerClass=ChainController):
+    """Returns [(n, top, total)]: the steps of the method name,
+       each time on a new chain whose channels are all range(n)
+       but the last one, which is empty."""
+    parameters = list(inspect.signature(getattr(controllerClass, name))
+                      .parameters)[1:]
+    steps = []
+    for n in sizes:
+        columns = [list(range(n))] * (CHANNELS - 1) + [[]]
+        chain = controllerClass(*columns, clocks=True)
+        try:
+            arguments = [_argument(parameter, n) for parameter in parameters]
+            result, top, total = chain.measure(name, *arguments)
+        finally:
+            chain.stop()
+        steps.append((n, top, total))
+    return steps
+
+def fitComplexity(sizes=SIZES, names=None, controllerClass=ChainController,
+                  cpeClass=CPE):
+    """Returns {method name: (claim, topSlope, totalSlope)} for the methods
+       names, by default all of those which can be measured."""
+    measurable = operations(controllerClass, cpeClass)
+    fits = {}
+    for name in measurable if names is None else names:
+        claim, sent = measurable[name]
+        steps = measureSteps(name, sizes, controllerClass)
+        fits[name] = (claim,
+                      slope(sizes, [top for n, top, total in steps]),
+                      slope(sizes, [total for n, top, total in steps]))
+    return fits
+
+def checkFits(fits):
+    """Returns the list of the claims not matched by fits (see
+       fitComplexity), as strings; an empty list if all of them are."""
+    errors = []
+    for name, (claim, *slopes) in fits.items():
+        for which, (bound, expression), measured in zip(["top", "total"],
+                                                        claim, slopes):
+            expected = degree(expression)
+            if abs(measured - expected) <= TOLERANCE or \
+               bound == "O" and measured <= expected + TOLERANCE:
+                continue
+            errors.append("%s: %s grows as n^%.2f, claimed %s(%s)." %
+                          (name, which, measured, bound, expression))
+    return errors
+
+def checkComplexity(sizes=SIZES, names=None, controllerClass=ChainController,
+                    cpeClass=CPE):
+    """Measures and fits the methods names, by default all of those
+       which can be measured, and returns the claims not matched
+       (see checkFits)."""
+    return checkFits(fitComplexity(sizes, names, controllerClass, cpeClass))
+
+###############################################################################
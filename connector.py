@@ -1,14 +1,101 @@
 # TO DO:
 # 1. Move extend from the CPE class to Connector class.
-# 2. Detect deadlocks when both CPEs initiate send or both initiate receive.
+# 2. Detect deadlocks when both CPEs initiate send or both initiate receive
+#    in the connector itself (deadlockWatchdog.py reports them from outside).
 # 3. Enforce word size.
 
+import threading
+from collections import deque
 from myThreading import EventPlus, Any
+from signatures import TESTING_TOOLS
 
 # WORD_SIZE = 2 # in bits; excludes the continuation bit.
 
 #=================================
 
+# Type and value checks shared by all the connector classes.
+# Each one raises the same error that Connector.send_* reports.
+
+def checkOperation(operation, channels):
+    if not isinstance(operation, (str, int)):
+        raise TypeError("send_o%s: operation should be a string or an opcode." %
+                        str((operation,)+channels))
+    for ch in channels:
+        if not isinstance(ch, int):
+            raise TypeError("send_o%s: every channel should be an int." %
+                            str((operation,)+channels))
+        # value checking is done in the CPE.run definition.
+
+def checkWord(word):
+    if not isinstance(word, int) and word is not Any:
+        raise TypeError("send_w(%s): word should be an int or Any." %
+                        str(word))
+    if word is not Any and word < 0:
+        raise ValueError("send_w(%s): word cannot be negative." %
+                         str(word))
+    #if word is not Any and word >= 2**WORD_SIZE:
+    #    raise ValueError("send_w(%s): word can have only %s bits." %
+    #                     (str(word), WORD_SIZE))
+
+def checkWordBit(word, bit):
+    if not isinstance(word, int) and word is not Any:
+        raise TypeError("send_W(%s, %s): word should be an int or Any." %
+                        (word, bit)) 
+    if not isinstance(bit, bool) and word is not Any:
+        raise TypeError("send_W(%s, %s): bit should be a bool." %
+                        (word, bit))
+    if word is not Any and word < 0:
+        raise ValueError("send_W(%s, %s): word cannot be negative." %
+                         (word, bit))
+
+def checkBit(bit):
+    if not isinstance(bit, bool) and bit is not Any:
+        raise TypeError("send_b(%s): bit should be a bool or Any." %
+                        str(bit))
+
+def checkBits(bit, bit2):
+    if not isinstance(bit, bool) and bit is not Any:
+        raise TypeError("send_B(%s, %s): bit should be a bool or Any." %
+                        (bit, bit2)) 
+    if not isinstance(bit2, bool) and bit2 is not Any:
+        raise TypeError("send_B(%s, %s): bit2 should be a bool or Any." %
+                        (bit, bit2))
+
+#=================================
+
+# Message counters, instrumentation, not a part of the model.
+# Every connector counts
+#     self.sent     - the messages sent, by kind: a list indexed as KINDS;
+#     self.received - the messages received, by operation and kind:
+#                     a dictionary operation -> list indexed as KINDS;
+#                     a message is counted for the operation it belongs to,
+#                     the last one sent down on the connector (self.counts
+#                     is its list; messages before the first operation
+#                     are not counted by operation).
+# so the operations executed by the CPE whose connectorUpper it is
+# are counted by received[operation][0]. See ChainController.metrics.
+
+KINDS = "owWbB"
+
+def newCounts():
+    return [0, 0, 0, 0, 0] # indexed as KINDS
+
+def operationCounts(received, operation):
+    """Theta(1). The counts of operation in received, new ones if none."""
+    counts = received.get(operation)
+    if counts is None:
+        counts = received[operation] = newCounts()
+    return counts
+
+def countOperation(received, operation):
+    """Theta(1). Count a received operation in received;
+       returns its counts."""
+    counts = operationCounts(received, operation)
+    counts[0] += 1
+    return counts
+
+#=================================
+
 class Connector:
     """A two-way communication channel between two threads.
        Conceptually, connector objects correspond to two sets of wires conncecting
@@ -48,6 +135,9 @@ class Connector:
         self.reqEvent = EventPlus()
         self.ackEvent = EventPlus()
         self.status = "ready"
+        self.sent = newCounts() # see KINDS
+        self.received = {}
+        self.counts = newCounts()
 
     # SEND ------------------------------------------------------
 
@@ -57,14 +147,7 @@ class Connector:
            (The O in the name stands for "operation".)
            Takes as parameters a string and arbitrarily many integers;
            the integers are channel numbers for the operation."""
-        if not isinstance(operation, str):
-            raise TypeError("send_o%s: operation should be a string." %
-                            str((operation,)+channels))
-        for ch in channels:
-            if not isinstance(ch, int):
-                raise TypeError("send_o%s: every channel should be an int." %
-                                str((operation,)+channels))
-            # value checking is done in the CPE.run definition.
+        checkOperation(operation, channels)
         self.ackEvent.waitForFalse()
         if self.status != "ready":
             raise RuntimeError("send_o%: Connector status %s, not ready." %
@@ -73,6 +156,7 @@ class Connector:
             self.status = "o"
         self.operation = operation
         self.channels = channels            
+        self.sent[0] += 1
         self.reqEvent.setTrue()      
         self.ackEvent.waitForTrue()  
         self.reqEvent.setFalse()
@@ -81,15 +165,7 @@ class Connector:
         """4-phase bundled word protocol;
            word parameter should be a nonnegative int or Any.
            (The w in the name stands for "word".)"""
-        if not isinstance(word, int) and word is not Any:
-            raise TypeError("send_w(%s): word should be an int or Any." %
-                            str(word))
-        if word is not Any and word < 0:
-            raise ValueError("send_w(%s): word cannot be negative." %
-                             str(word))
-        #if word is not Any and word >= 2**WORD_SIZE:
-        #    raise ValueError("send_w(%s): word can have only %s bits." %
-        #                     (str(word), WORD_SIZE))
+        checkWord(word)
         self.ackEvent.waitForFalse()
         if self.status != "ready":
             raise RuntimeError("send_w%s: Connector status %s, not ready." %
@@ -97,6 +173,7 @@ class Connector:
         else:
             self.status = "w" 
         self.word = word             
+        self.sent[1] += 1
         self.reqEvent.setTrue()      
         self.ackEvent.waitForTrue()  
         self.reqEvent.setFalse()
@@ -106,18 +183,7 @@ class Connector:
            word parameter should be a nonnegative int or Any,
            bit parameter should be a bool or Any.
            (The W in the name represents a word plus an additonal bit.)"""
-        if not isinstance(word, int) and word is not Any:
-            raise TypeError("send_W(%s, %s): word should be an int or Any." %
-                            (word, bit)) 
-        if not isinstance(bit, bool) and word is not Any:
-            raise TypeError("send_W(%s, %s): bit should be a bool." %
-                            (word, bit))
-        if word is not Any and word < 0:
-            raise ValueError("send_W(%s, %s): word cannot be negative." %
-                             (word, bit))
-        #if word is not Any and word >= 2**WORD_SIZE:
-        #    raise ValueError("send_w(%s): word can have only %s bits." %
-        #                     (str(word), WORD_SIZE))
+        checkWordBit(word, bit)
         self.ackEvent.waitForFalse()
         if self.status != "ready":
             raise RuntimeError("send_W(%s, %s): Connector status %s, not ready." %
@@ -126,6 +192,7 @@ class Connector:
             self.status = "W"
         self.word = word
         self.bit = bit      
+        self.sent[2] += 1
         self.reqEvent.setTrue()      
         self.ackEvent.waitForTrue()  
         self.reqEvent.setFalse()
@@ -134,9 +201,7 @@ class Connector:
         """4-phase bundled word protocol;
            bit parameter should be a bool or Any.
            (The b in the name stands for "bit".)"""
-        if not isinstance(bit, bool) and bit is not Any:
-            raise TypeError("send_b(%s): bit should be a bool or Any." %
-                            str(bit))
+        checkBit(bit)
         self.ackEvent.waitForFalse()
         if self.status != "ready":
             raise RuntimeError("send_b(%s): Connector status %s, not ready." %
@@ -144,6 +209,7 @@ class Connector:
         else:
             self.status = "b" 
         self.bit = bit             
+        self.sent[3] += 1
         self.reqEvent.setTrue()      
         self.ackEvent.waitForTrue()  
         self.reqEvent.setFalse()
@@ -153,12 +219,7 @@ class Connector:
            bit parameter should be a bool or Any,
            bit2 parameter should be a bool or Any.
            (The B represents a bit plus an additonal bit.)"""
-        if not isinstance(bit, bool) and bit is not Any:
-            raise TypeError("send_B(%s, %s): bit should be a bool or Any." %
-                            (bit, bit2)) 
-        if not isinstance(bit2, bool) and bit2 is not Any:
-            raise TypeError("send_B(%s, %s): bit2 should be a bool or Any." %
-                            (bit, bit2))
+        checkBits(bit, bit2)
         self.ackEvent.waitForFalse()
         if self.status != "ready":
             raise RuntimeError(
@@ -168,6 +229,7 @@ class Connector:
             self.status = "B" 
         self.bit = bit
         self.bit2 = bit2      
+        self.sent[4] += 1
         self.reqEvent.setTrue()      
         self.ackEvent.waitForTrue()  
         self.reqEvent.setFalse()
@@ -183,6 +245,7 @@ class Connector:
                             self.status)
         operation = self.operation
         channels = self.channels
+        self.counts = countOperation(self.received, operation)
         self.ackEvent.setTrue()      
         self.reqEvent.waitForFalse()
         self.status = "ready"
@@ -197,6 +260,7 @@ class Connector:
             raise TypeError("Connector mismatch: sent %s, receive w." %
                             self.status)
         word = self.word
+        self.counts[1] += 1
         self.ackEvent.setTrue()      
         self.reqEvent.waitForFalse()
         self.status = "ready"
@@ -212,6 +276,7 @@ class Connector:
                             self.status)
         word = self.word
         bit = self.bit
+        self.counts[2] += 1
         self.ackEvent.setTrue()      
         self.reqEvent.waitForFalse()
         self.status = "ready"
@@ -226,6 +291,7 @@ class Connector:
             raise TypeError("Connector mismatch: send %s, receive b." %
                             self.status)
         bit = self.bit
+        self.counts[3] += 1
         self.ackEvent.setTrue()      
         self.reqEvent.waitForFalse()
         self.status = "ready"
@@ -241,6 +307,7 @@ class Connector:
                             self.status)
         bit = self.bit
         bit2 = self.bit2
+        self.counts[4] += 1
         self.ackEvent.setTrue()      
         self.reqEvent.waitForFalse()
         self.status = "ready"
@@ -249,3 +316,661 @@ class Connector:
 
 #==========================================================
 
+class ConditionConnector:
+    """A lighter Connector: the same 4-phase bundled data protocol,
+       the same send/receive methods, checks and errors,
+       but the req and ack wires are two booleans guarded by
+       a single threading.Condition, instead of two EventPlus objects
+       (each of them a Lock and two Events, each Event a Condition and a Lock).
+       A handshake takes 4 acquisitions of one lock instead of about 8
+       lock cycles plus the Events' notifications.
+       Select it per chain: ChainController(..., connector="condition").
+
+       Instrumentation, not a part of the model:
+       self.transitions counts the req/ack signal transitions,
+       self.waits counts the waits, i.e. how many times a thread
+       blocked on the connector; self.sent and self.received count
+       the messages (see KINDS)."""
+
+    __slots__ = ("operation", "channels", "word", "bit", "bit2",
+                 "req", "ack", "status", "condition", "transitions", "waits",
+                 "sent", "received", "counts")
+
+    def __init__(self):
+        self.operation = Any # str (except this initial value.)
+        self.channels = Any # a tuple of non-negative integers, possibly empty
+        self.word = Any # non-negative int or Any
+        self.bit = Any # True/False/Any
+        self.bit2 = Any # True/False/Any
+        self.req = False
+        self.ack = False
+        self.status = "ready"
+        self.condition = threading.Condition(threading.Lock())
+        self.transitions = 0
+        self.waits = 0
+        self.sent = newCounts()
+        self.received = {}
+        self.counts = newCounts()
+
+    def _wait(self):
+        self.waits += 1
+        self.condition.wait()
+
+    # The 4 phases; all of them are called with self.condition acquired.
+
+    def _waitReady(self, call, arguments):
+        """Sender, before phase 1: wait until ack is low.
+           call % (arguments + (status,)) is the error message."""
+        while self.ack:
+            self._wait()
+        if self.status != "ready":
+            raise RuntimeError(
+                (call + ": Connector status %s, not ready.") %
+                (arguments + (self.status,)))
+
+    def _request(self):
+        """Sender: phase 1 (req up), wait for phase 2, phase 3 (req down)."""
+        self.req = True
+        self.condition.notify()
+        while not self.ack:
+            self._wait()
+        self.req = False
+        self.condition.notify()
+        self.transitions += 2
+
+    def _waitRequest(self, kind):
+        """Receiver: wait for phase 1, check the kind of the message."""
+        while not self.req:
+            self._wait()
+        if self.status != kind:
+            raise TypeError("Connector mismatch: sent %s, receive %s." %
+                            (self.status, kind))
+
+    def _acknowledge(self):
+        """Receiver: phase 2 (ack up), wait for phase 3, phase 4 (ack down)."""
+        self.ack = True
+        self.condition.notify()
+        while self.req:
+            self._wait()
+        self.status = "ready"
+        self.ack = False
+        self.condition.notify()
+        self.transitions += 2
+
+    # SEND ------------------------------------------------------
+
+    def send_o(self, operation, *channels):
+        """See Connector.send_o."""
+        checkOperation(operation, channels)
+        with self.condition:
+            self._waitReady("send_o%s", ((operation,)+channels,))
+            self.status = "o"
+            self.operation = operation
+            self.channels = channels
+            self.sent[0] += 1
+            self._request()
+
+    def send_w(self, word):
+        """See Connector.send_w."""
+        checkWord(word)
+        with self.condition:
+            self._waitReady("send_w(%s)", (word,))
+            self.status = "w"
+            self.word = word
+            self.sent[1] += 1
+            self._request()
+
+    def send_W(self, word, bit):
+        """See Connector.send_W."""
+        checkWordBit(word, bit)
+        with self.condition:
+            self._waitReady("send_W(%s, %s)", (word, bit))
+            self.status = "W"
+            self.word = word
+            self.bit = bit
+            self.sent[2] += 1
+            self._request()
+
+    def send_b(self, bit):
+        """See Connector.send_b."""
+        checkBit(bit)
+        with self.condition:
+            self._waitReady("send_b(%s)", (bit,))
+            self.status = "b"
+            self.bit = bit
+            self.sent[3] += 1
+            self._request()
+
+    def send_B(self, bit, bit2):
+        """See Connector.send_B."""
+        checkBits(bit, bit2)
+        with self.condition:
+            self._waitReady("send_B(%s, %s)", (bit, bit2))
+            self.status = "B"
+            self.bit = bit
+            self.bit2 = bit2
+            self.sent[4] += 1
+            self._request()
+
+    # RECEIVE ------------------------------------------------
+
+    def receive_o(self):
+        """See Connector.receive_o."""
+        with self.condition:
+            self._waitRequest("o")
+            operation = self.operation
+            channels = self.channels
+            self.counts = countOperation(self.received, operation)
+            self._acknowledge()
+        return operation, channels
+
+    def receive_w(self):
+        """See Connector.receive_w."""
+        with self.condition:
+            self._waitRequest("w")
+            word = self.word
+            self.counts[1] += 1
+            self._acknowledge()
+        return word
+
+    def receive_W(self):
+        """See Connector.receive_W."""
+        with self.condition:
+            self._waitRequest("W")
+            word = self.word
+            bit = self.bit
+            self.counts[2] += 1
+            self._acknowledge()
+        return word, bit
+
+    def receive_b(self):
+        """See Connector.receive_b."""
+        with self.condition:
+            self._waitRequest("b")
+            bit = self.bit
+            self.counts[3] += 1
+            self._acknowledge()
+        return bit
+
+    def receive_B(self):
+        """See Connector.receive_B."""
+        with self.condition:
+            self._waitRequest("B")
+            bit = self.bit
+            bit2 = self.bit2
+            self.counts[4] += 1
+            self._acknowledge()
+        return bit, bit2
+
+#==========================================================
+
+class TwoPhaseConnector(ConditionConnector):
+    """A ConditionConnector with a 2-phase (transition signalling)
+       bundled data protocol instead of the 4-phase one.
+       A transfer is signalled by a transition of req, in either direction,
+       and acknowledged by a transition of ack; the wires are not returned
+       to zero, so a transfer takes 2 transitions instead of 4:
+           sender:   wait until req == ack, put the data, toggle req,
+                     wait until ack has followed;
+           receiver: wait until req != ack, take the data, toggle ack.
+       Here req and ack count their transitions, the level of a wire
+       is the parity of its count. The sender waits for ack to reach
+       its own transition, so it cannot miss it when the receiver
+       answers at once on the same connector.
+       As with 4 phases, a send returns when its data has been received,
+       and the same checks are done.
+       Select it per chain: ChainController(..., connector="twoPhase")."""
+
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__()
+        self.req = 0
+        self.ack = 0
+
+    def _waitReady(self, call, arguments):
+        while self.req != self.ack:
+            self._wait()
+        if self.status != "ready":
+            raise RuntimeError(
+                (call + ": Connector status %s, not ready.") %
+                (arguments + (self.status,)))
+
+    def _request(self):
+        self.req += 1
+        request = self.req
+        self.condition.notify()
+        while self.ack < request:
+            self._wait()
+        self.transitions += 1
+
+    def _waitRequest(self, kind):
+        while self.req == self.ack:
+            self._wait()
+        if self.status != kind:
+            raise TypeError("Connector mismatch: sent %s, receive %s." %
+                            (self.status, kind))
+
+    def _acknowledge(self):
+        self.status = "ready"
+        self.ack = self.req
+        self.condition.notify()
+        self.transitions += 1
+
+#==========================================================
+
+# Lamport clocks, instrumentation, not a part of the model:
+# the logical time of every thread which sends or receives through
+# ClockedConnectors, in a cell [time] readable by the other threads.
+
+_clocks = {} # thread ident -> [time]
+
+def threadClock(ident=None):
+    """Theta(1). The clock cell of the thread ident, by default
+       of the current thread; a new one is at time 0."""
+    if ident is None:
+        ident = threading.get_ident()
+    cell = _clocks.get(ident)
+    if cell is None:
+        cell = _clocks[ident] = [0]
+    return cell
+
+def resetClocks(idents):
+    """Theta(threads). Sets the clocks of the threads idents to 0, and
+       forgets those of the threads which have ended: their idents
+       may be reused by new threads, which start at time 0."""
+    alive = {thread.ident for thread in threading.enumerate()}
+    for ident in list(_clocks):
+        if ident not in alive:
+            del _clocks[ident]
+    for ident in idents:
+        threadClock(ident)[0] = 0
+
+class ClockedConnector(ConditionConnector):
+    """A ConditionConnector whose messages carry a logical timestamp.
+       A handshake is a step of both sides: the sender puts its time
+       into the message, the receiver takes max(sender, receiver) + 1
+       as the new time of both of them, and the sender takes it
+       with the acknowledgement. The messages of the testing tools
+       (TESTING_TOOLS, e.g. sync) are not steps: they leave the clocks
+       as they are. See ChainController.measure.
+       Select it per chain: ChainController(..., clocks=True)."""
+
+    __slots__ = ("time",)
+
+    def __init__(self):
+        super().__init__()
+        self.time = 0
+
+    def _request(self):
+        if self.operation in TESTING_TOOLS:
+            return super()._request()
+        clock = threadClock()
+        self.time = clock[0]
+        super()._request()
+        clock[0] = self.time # set by the receiver, before ack.
+
+    def _acknowledge(self):
+        if self.operation not in TESTING_TOOLS:
+            clock = threadClock()
+            clock[0] = self.time = max(self.time, clock[0]) + 1
+        super()._acknowledge()
+
+#==========================================================
+
+class ActivityConnector(ConditionConnector):
+    """A ConditionConnector which records every message received as an
+       event (time, side, kind, value) of recorder, an ActivityRecorder
+       (see activityTrace.py), in the ring buffer of the receiving thread.
+       side is 0 if the message came down, sent by the thread which sent
+       the last operation, 1 if it came up.
+       For debugging only, not a part of the model."""
+
+    __slots__ = ("recorder", "upper")
+
+    def __init__(self, recorder):
+        super().__init__()
+        self.recorder = recorder
+        self.upper = None # the thread id of the upper CPE
+
+    def send_o(self, operation, *channels):
+        """See Connector.send_o."""
+        self.upper = threading.get_ident()
+        super().send_o(operation, *channels)
+
+    def _acknowledge(self):
+        kind = self.status
+        value = self.operation if kind == "o" else \
+                self.word if kind in "wW" else self.bit
+        self.recorder.record(int(threading.get_ident() == self.upper),
+                             kind, value)
+        super()._acknowledge()
+
+#==========================================================
+
+class ReleaseConnector:
+    """The 4-phase protocol of ConditionConnector without any checks:
+       no type or value checks of the messages, no check that the kind
+       of a received message is the kind which was sent, no status;
+       only the message counters (see KINDS). A protocol error is
+       not reported: a receive
+       of the wrong kind gets whatever the message fields hold.
+       For protocols which run correctly in the checked mode;
+       select it per chain: ChainController(..., mode="release")."""
+
+    __slots__ = ("operation", "channels", "word", "bit", "bit2",
+                 "req", "ack", "condition", "sent", "received", "counts")
+
+    def __init__(self):
+        self.operation = Any
+        self.channels = Any
+        self.word = Any
+        self.bit = Any
+        self.bit2 = Any
+        self.req = False
+        self.ack = False
+        self.condition = threading.Condition(threading.Lock())
+        self.sent = newCounts()
+        self.received = {}
+        self.counts = newCounts()
+
+    # The 4 phases; all of them are called with self.condition acquired.
+
+    def _waitReady(self):
+        """Sender, before phase 1: wait until ack is low."""
+        while self.ack:
+            self.condition.wait()
+
+    def _request(self):
+        """Sender: phase 1 (req up), wait for phase 2, phase 3 (req down)."""
+        self.req = True
+        self.condition.notify()
+        while not self.ack:
+            self.condition.wait()
+        self.req = False
+        self.condition.notify()
+
+    def _waitRequest(self):
+        """Receiver: wait for phase 1."""
+        while not self.req:
+            self.condition.wait()
+
+    def _acknowledge(self):
+        """Receiver: phase 2 (ack up), wait for phase 3, phase 4 (ack down)."""
+        self.ack = True
+        self.condition.notify()
+        while self.req:
+            self.condition.wait()
+        self.ack = False
+        self.condition.notify()
+
+    # SEND ------------------------------------------------------
+
+    def send_o(self, operation, *channels):
+        """See Connector.send_o."""
+        with self.condition:
+            self._waitReady()
+            self.operation = operation
+            self.channels = channels
+            self.sent[0] += 1
+            self._request()
+
+    def send_w(self, word):
+        """See Connector.send_w."""
+        with self.condition:
+            self._waitReady()
+            self.word = word
+            self.sent[1] += 1
+            self._request()
+
+    def send_W(self, word, bit):
+        """See Connector.send_W."""
+        with self.condition:
+            self._waitReady()
+            self.word = word
+            self.bit = bit
+            self.sent[2] += 1
+            self._request()
+
+    def send_b(self, bit):
+        """See Connector.send_b."""
+        with self.condition:
+            self._waitReady()
+            self.bit = bit
+            self.sent[3] += 1
+            self._request()
+
+    def send_B(self, bit, bit2):
+        """See Connector.send_B."""
+        with self.condition:
+            self._waitReady()
+            self.bit = bit
+            self.bit2 = bit2
+            self.sent[4] += 1
+            self._request()
+
+    # RECEIVE ------------------------------------------------
+
+    def receive_o(self):
+        """See Connector.receive_o."""
+        with self.condition:
+            self._waitRequest()
+            operation = self.operation
+            channels = self.channels
+            self.counts = countOperation(self.received, operation)
+            self._acknowledge()
+        return operation, channels
+
+    def receive_w(self):
+        """See Connector.receive_w."""
+        with self.condition:
+            self._waitRequest()
+            word = self.word
+            self.counts[1] += 1
+            self._acknowledge()
+        return word
+
+    def receive_W(self):
+        """See Connector.receive_W."""
+        with self.condition:
+            self._waitRequest()
+            word = self.word
+            bit = self.bit
+            self.counts[2] += 1
+            self._acknowledge()
+        return word, bit
+
+    def receive_b(self):
+        """See Connector.receive_b."""
+        with self.condition:
+            self._waitRequest()
+            bit = self.bit
+            self.counts[3] += 1
+            self._acknowledge()
+        return bit
+
+    def receive_B(self):
+        """See Connector.receive_B."""
+        with self.condition:
+            self._waitRequest()
+            bit = self.bit
+            bit2 = self.bit2
+            self.counts[4] += 1
+            self._acknowledge()
+        return bit, bit2
+
+#==========================================================
+
+class TracingConnector(ReleaseConnector):
+    """A ReleaseConnector which records every message sent,
+       as an event (connector, direction, kind, detail) of recorder,
+       a TraceRecorder (see protocolTrace.py), for offline verification
+       instead of the checks of Connector. The direction of a message
+       is "down" if it is sent by the thread which sent the last operation.
+       For debugging only, not a part of the model."""
+
+    __slots__ = ("recorder", "id", "upper")
+
+    def __init__(self, recorder):
+        super().__init__()
+        self.recorder = recorder
+        self.id = recorder.newConnector()
+        self.upper = None # the thread id of the upper CPE
+
+    def _record(self, kind, detail=None):
+        direction = "down" if threading.get_ident() == self.upper else "up"
+        self.recorder.record((self.id, direction, kind, detail))
+
+    def send_o(self, operation, *channels):
+        """See Connector.send_o."""
+        self.upper = threading.get_ident()
+        self.recorder.record((self.id, "down", "o", operation))
+        super().send_o(operation, *channels)
+
+    def send_w(self, word):
+        """See Connector.send_w."""
+        self._record("w")
+        super().send_w(word)
+
+    def send_W(self, word, bit):
+        """See Connector.send_W."""
+        self._record("W", bit)
+        super().send_W(word, bit)
+
+    def send_b(self, bit):
+        """See Connector.send_b."""
+        self._record("b")
+        super().send_b(bit)
+
+    def send_B(self, bit, bit2):
+        """See Connector.send_B."""
+        self._record("B")
+        super().send_B(bit, bit2)
+
+#==========================================================
+
+class BufferedConnector:
+    """A connector with a FIFO buffer of depth messages in each direction.
+       A send waits only while the buffer is full, so a CPE can run ahead
+       of a slow CPE below it by up to depth messages. Messages are
+       received in the order they were sent; a receive checks the kind
+       of the message and raises TypeError, as Connector does, leaving
+       the message in the buffer.
+       The two sides are told apart by thread: the lower side is the
+       thread which receives operations (the CPE whose connectorUpper
+       this is); it is recorded by receive_o. Until then, all the messages
+       go down, as the first message is always an operation.
+       Select it per chain:
+           ChainController(..., connector="buffered", depth=k)."""
+
+    __slots__ = ("depth", "down", "up", "lowerThread", "condition", "waits",
+                 "sent", "received", "counts", "upCounts")
+
+    def __init__(self, depth=1):
+        if depth < 1:
+            raise ValueError("BufferedConnector: depth should be >= 1.")
+        self.depth = depth
+        self.down = deque() # messages to the lower side: (kind, values...)
+        self.up = deque()   # messages to the upper side
+        self.lowerThread = None
+        self.condition = threading.Condition(threading.Lock())
+        self.waits = 0 # instrumentation, not a part of the model.
+        self.sent = newCounts() # see KINDS
+        self.received = {}
+        # The counts of the operations the messages belong to, as the two
+        # sides run apart: the last one received below, the last one sent.
+        self.counts = newCounts()
+        self.upCounts = newCounts()
+
+    def _put(self, message):
+        with self.condition:
+            if threading.current_thread() is self.lowerThread:
+                queue = self.up
+            else:
+                queue = self.down
+                if message[0] == "o":
+                    self.upCounts = operationCounts(self.received, message[1])
+            while len(queue) >= self.depth:
+                self.waits += 1
+                self.condition.wait()
+            queue.append(message)
+            self.sent[KINDS.index(message[0])] += 1
+            self.condition.notify()
+
+    def _get(self, kind):
+        with self.condition:
+            if threading.current_thread() is self.lowerThread:
+                queue = self.down
+            else:
+                queue = self.up
+            while not queue:
+                self.waits += 1
+                self.condition.wait()
+            message = queue[0]
+            if message[0] != kind:
+                raise TypeError("Connector mismatch: sent %s, receive %s." %
+                                (message[0], kind))
+            queue.popleft()
+            if kind == "o":
+                self.counts = countOperation(self.received, message[1])
+            elif queue is self.down:
+                self.counts[KINDS.index(kind)] += 1
+            else:
+                self.upCounts[KINDS.index(kind)] += 1
+            self.condition.notify()
+        return message
+
+    # SEND ------------------------------------------------------
+
+    def send_o(self, operation, *channels):
+        """See Connector.send_o."""
+        checkOperation(operation, channels)
+        self._put(("o", operation, channels))
+
+    def send_w(self, word):
+        """See Connector.send_w."""
+        checkWord(word)
+        self._put(("w", word))
+
+    def send_W(self, word, bit):
+        """See Connector.send_W."""
+        checkWordBit(word, bit)
+        self._put(("W", word, bit))
+
+    def send_b(self, bit):
+        """See Connector.send_b."""
+        checkBit(bit)
+        self._put(("b", bit))
+
+    def send_B(self, bit, bit2):
+        """See Connector.send_B."""
+        checkBits(bit, bit2)
+        self._put(("B", bit, bit2))
+
+    # RECEIVE ------------------------------------------------
+
+    def receive_o(self):
+        """See Connector.receive_o."""
+        self.lowerThread = threading.current_thread()
+        message = self._get("o")
+        return message[1], message[2]
+
+    def receive_w(self):
+        """See Connector.receive_w."""
+        return self._get("w")[1]
+
+    def receive_W(self):
+        """See Connector.receive_W."""
+        message = self._get("W")
+        return message[1], message[2]
+
+    def receive_b(self):
+        """See Connector.receive_b."""
+        return self._get("b")[1]
+
+    def receive_B(self):
+        """See Connector.receive_B."""
+        message = self._get("B")
+        return message[1], message[2]
+
+#==========================================================
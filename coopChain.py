@@ -0,0 +1,635 @@
+#!/usr/bin/env python3
+
+"""COOPERATIVE CHAIN: SCHEDULER, CONNECTOR AND CLASS CoopCPE
+
+   A second execution engine for chains. Every CoopCPE object runs its
+   operation loop as a generator, and all the CoopCPE objects of a chain
+   are resumed by a single-threaded CoopScheduler; no CPE owns an OS thread.
+   A CoopCPE is suspended only while it waits on a CoopConnector,
+   and it is resumed only when that connector has something for it.
+
+   The chain controller (the main program) does not run as a generator.
+   When it calls send_*/receive_* on the top CoopConnector, the call drives
+   the scheduler until the handshake is completed, so ChainController
+   works on top of this engine unchanged:
+       chain = ChainController([3,1,2], engine="coop")
+   If no CPE can make progress while the controller is waiting,
+   a RuntimeError (deadlock) is raised instead of hanging."""
+
+# ==============================================================================
+
+from collections import deque
+
+from myThreading import Any
+from connector import checkOperation, checkWord, checkWordBit, \
+                      checkBit, checkBits
+from chain_1_class_PE import *
+
+# ==============================================================================
+
+class MainType(object):
+    """There is only one object of this type: MAIN.
+       It stands for the chain controller when the controller waits
+       on a CoopConnector; all other waiters are CoopCPE generators."""
+
+    def __repr__(self):
+        return "MAIN"
+
+MAIN = MainType()
+
+# ==============================================================================
+
+class CoopScheduler:
+    """Resumes the generators of CoopCPE objects, one at a time,
+       in the order in which they became ready."""
+
+    def __init__(self):
+        self.snapshot = None # the buffer of the snapshot being taken.
+        self.buffer = [] # the words collected by chain2list, register2list.
+        self.registers = RegisterFile(CHANNELS) # the words and bits of the CPEs.
+        self.ready = deque() # generators which can make progress.
+        self.current = MAIN  # the generator being resumed, or MAIN.
+        self.mainWoken = False
+        self.deadlocked = False # no CPE will ever make progress again.
+
+    def spawn(self, task):
+        self.ready.append(task)
+
+    def wake(self, task):
+        if task is MAIN:
+            self.mainWoken = True
+        else:
+            self.ready.append(task)
+
+    def runUntilMainWoken(self):
+        """Resume CPEs until one of them wakes up the chain controller.
+           Raises RuntimeError if no CPE can make progress before that."""
+        ready = self.ready
+        popleft = ready.popleft
+        self.mainWoken = False
+        try:
+            while not self.mainWoken:
+                if not ready:
+                    self.deadlocked = True
+                    raise RuntimeError(
+                        "Deadlock: the chain controller is waiting on a " +
+                        "connector, but no CPE can make progress.")
+                task = popleft()
+                self.current = task
+                try:
+                    next(task)
+                except StopIteration:
+                    pass
+        finally:
+            self.current = MAIN
+
+    def run(self):
+        """Resume CPEs until none of them can make progress,
+           i.e. until all previously requested operations are completed."""
+        ready = self.ready
+        popleft = ready.popleft
+        try:
+            while ready:
+                task = popleft()
+                self.current = task
+                try:
+                    next(task)
+                except StopIteration:
+                    pass
+        finally:
+            self.current = MAIN
+
+    def drive(self, generator):
+        """Run a connector generator on behalf of the chain controller;
+           return its value."""
+        if self.current is not MAIN:
+            raise RuntimeError("A CoopCPE called a blocking connector method; "+
+                               "it should use yield from connector.g...().")
+        while True:
+            try:
+                next(generator)
+            except StopIteration as stop:
+                return stop.value
+            self.runUntilMainWoken()
+
+# ==============================================================================
+
+class CoopConnector:
+    """A two-way communication channel between two CoopCPE objects,
+       or between the chain controller and the top CoopCPE object.
+       It has the same typed send/receive interface as Connector,
+       and the same mismatch checks (see the Connector docstring).
+       The handshake is a rendezvous: a send completes when the receiver
+       has taken the data; a side waiting for the other one is suspended.
+
+       The g-prefixed methods (gsend_w, greceive_w, ...) are generators,
+       used inside CoopCPE operations:
+           word = yield from self.connectorUpper.greceive_w()
+       The methods without the prefix are used by the chain controller."""
+
+    __slots__ = ("scheduler", "operation", "channels", "word", "bit", "bit2",
+                 "status", "taken", "sender", "receiver")
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.operation = Any # str (except this initial value.)
+        self.channels = Any # a tuple of non-negative integers, possibly empty
+        self.word = Any # non-negative int or Any
+        self.bit = Any # True/False/Any
+        self.bit2 = Any # True/False/Any
+        self.status = "ready"
+        self.taken = 0 # how many times the data has been taken by a receiver.
+        self.sender = None # the generator or MAIN waiting for a send to end.
+        self.receiver = None # the generator or MAIN waiting for data.
+
+    def _notReady(self, call):
+        return RuntimeError("%s: Connector status %s, not ready." %
+                            (call, self.status))
+
+    def _post(self, kind):
+        """Generator. Publish data of the given kind and wait until taken."""
+        self.status = kind
+        receiver = self.receiver
+        if receiver is not None:
+            self.receiver = None
+            self.scheduler.wake(receiver)
+        posted = self.taken
+        while self.taken == posted:
+            self.sender = self.scheduler.current
+            yield
+
+    def _wait(self, kind):
+        """Generator. Wait until data of the given kind is published."""
+        while self.status == "ready":
+            self.receiver = self.scheduler.current
+            yield
+        if self.status != kind:
+            raise TypeError("Connector mismatch: sent %s, receive %s." %
+                            (self.status, kind))
+
+    def _take(self):
+        self.status = "ready"
+        self.taken += 1
+        sender = self.sender
+        if sender is not None:
+            self.sender = None
+            self.scheduler.wake(sender)
+
+    # SEND, generators ------------------------------------------
+
+    def gsend_o(self, operation, *channels):
+        checkOperation(operation, channels)
+        if self.status != "ready":
+            raise self._notReady("send_o%s" % str((operation,)+channels))
+        self.operation = operation
+        self.channels = channels
+        yield from self._post("o")
+
+    def gsend_w(self, word):
+        checkWord(word)
+        if self.status != "ready":
+            raise self._notReady("send_w(%s)" % str(word))
+        self.word = word
+        yield from self._post("w")
+
+    def gsend_W(self, word, bit):
+        checkWordBit(word, bit)
+        if self.status != "ready":
+            raise self._notReady("send_W(%s, %s)" % (word, bit))
+        self.word = word
+        self.bit = bit
+        yield from self._post("W")
+
+    def gsend_b(self, bit):
+        checkBit(bit)
+        if self.status != "ready":
+            raise self._notReady("send_b(%s)" % str(bit))
+        self.bit = bit
+        yield from self._post("b")
+
+    def gsend_B(self, bit, bit2):
+        checkBits(bit, bit2)
+        if self.status != "ready":
+            raise self._notReady("send_B(%s, %s)" % (bit, bit2))
+        self.bit = bit
+        self.bit2 = bit2
+        yield from self._post("B")
+
+    # RECEIVE, generators ---------------------------------------
+
+    def greceive_o(self):
+        yield from self._wait("o")
+        self._take()
+        return self.operation, self.channels
+
+    def greceive_w(self):
+        yield from self._wait("w")
+        self._take()
+        return self.word
+
+    def greceive_W(self):
+        yield from self._wait("W")
+        self._take()
+        return self.word, self.bit
+
+    def greceive_b(self):
+        yield from self._wait("b")
+        self._take()
+        return self.bit
+
+    def greceive_B(self):
+        yield from self._wait("B")
+        self._take()
+        return self.bit, self.bit2
+
+    # SEND and RECEIVE, used by the chain controller ------------
+
+    def send_o(self, operation, *channels):
+        self.scheduler.drive(self.gsend_o(operation, *channels))
+
+    def send_w(self, word):
+        self.scheduler.drive(self.gsend_w(word))
+
+    def send_W(self, word, bit):
+        self.scheduler.drive(self.gsend_W(word, bit))
+
+    def send_b(self, bit):
+        self.scheduler.drive(self.gsend_b(bit))
+
+    def send_B(self, bit, bit2):
+        self.scheduler.drive(self.gsend_B(bit, bit2))
+
+    def receive_o(self):
+        return self.scheduler.drive(self.greceive_o())
+
+    def receive_w(self):
+        return self.scheduler.drive(self.greceive_w())
+
+    def receive_W(self):
+        return self.scheduler.drive(self.greceive_W())
+
+    def receive_b(self):
+        return self.scheduler.drive(self.greceive_b())
+
+    def receive_B(self):
+        return self.scheduler.drive(self.greceive_B())
+
+# ==============================================================================
+
+class CoopCPE:
+    """Chain Processing Element of the cooperative engine.
+       It models the same circuit as CPE and implements the same
+       operations, as generators communicating via CoopConnectors.
+       An operation which has no generator version here is taken from CPE;
+       this only works for operations which do not communicate
+       (the exercise stubs of CPE)."""
+
+    __slots__ = ("scheduler", "chainName", "peId", "name",
+                 "connectorUpper", "connectorLower", "operation", "channels",
+                 "word", "bit", "temp_w", "temp_b")
+
+    connectorClass = CoopConnector
+    dispatch = {} # see CPE.dispatch.
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.dispatch = buildDispatch(cls, CPE)
+        assertSignatures(cls)
+
+    def __init__(self, scheduler, chainName=None):
+        """Theta(1). Create an empty CoopCPE with an upper connector.
+           See CPE.__init__."""
+        self.scheduler = scheduler
+        # chainName and chainId, for debugging only, not a part of the model.
+        self.peId = 1
+        if chainName is None:
+            CPE.chainId += 1 # chain names are unique across the engines.
+            self.chainName = "CH" + str(CPE.chainId)
+        else:
+            self.chainName = chainName
+        self.name = self.chainName + "." + str(self.peId)
+        # The following fields model a CPE circuit.
+        self.connectorUpper = self.connectorClass(scheduler)
+        self.connectorLower = None
+        self.operation = Any
+        self.channels = Any
+        self.word, self.bit = scheduler.registers.newRow()
+        self.temp_w = list(ANY_TEMP)
+        self.temp_b = list(ANY_TEMP)
+
+    def start(self):
+        """Make the CPE ready to run; cf. threading.Thread.start."""
+        self.scheduler.spawn(self.run())
+
+    def extend(self):
+        """See CPE.extend."""
+        if self.connectorLower is None:
+            lowerPE = self._newLowerPE()
+            self.connectorLower = lowerPE.connectorUpper
+            lowerPE.start()
+
+    def _newLowerPE(self):
+        lowerPE = type(self)(self.scheduler, self.chainName)
+        lowerPE.peId = self.peId+1
+        lowerPE.name = self.chainName + "." + str(lowerPE.peId)
+        return lowerPE
+
+    def stop(self):
+        """Stop all CPEs in the chain below.
+           Not a part of the model."""
+        if self.connectorLower is not None:
+            yield from self.connectorLower.gsend_o("stop")
+
+    __repr__ = CPE.__repr__
+    _repr = CPE._repr
+    __str__ = CPE.__str__
+
+    def _print(self, text, operation):
+        """For debugging only, not a part of the model. See CPE.printStr."""
+        print(text)
+        if self.connectorLower is not None:
+            yield from self.connectorLower.gsend_o(operation)
+            yield from self.connectorLower.greceive_b() # synchronization
+            yield from self.connectorUpper.gsend_b(Any)
+        elif self.connectorLower is None:
+            yield from self.connectorUpper.gsend_b(Any)
+
+    def printRepr2(self):
+        yield from self._print(self._repr(2), "printRepr2")
+
+    def printRepr4(self):
+        yield from self._print(self._repr(4), "printRepr4")
+
+    def printRepr8(self):
+        yield from self._print(self._repr(8), "printRepr8")
+
+    def printRepr16(self):
+        yield from self._print(self._repr(16), "printRepr16")
+
+    def printRepr10(self):
+        yield from self._print(self._repr(10), "printRepr10")
+
+    def printStr(self):
+        yield from self._print(str(self), "printStr")
+
+    def chain2list(self, channel):
+        """For debugging only, not a part of the model."""
+        if not self.bit[channel]: # if not empty:
+            self.scheduler.buffer.append(self.word[channel])
+            if self.connectorLower is not None:
+                yield from self.connectorLower.gsend_o("chain2list", channel)
+                badEnding = yield from self.connectorLower.greceive_b()
+                yield from self.connectorUpper.gsend_b(badEnding)
+            elif self.connectorLower is None:
+                yield from self.connectorUpper.gsend_b(True) # badEnding=True
+        elif self.bit[channel]: # if empty
+            yield from self.connectorUpper.gsend_b(False) # badEnding=False
+
+    def snapshot(self, *channels):
+        """See CPE.snapshot."""
+        buffer = self.scheduler.snapshot
+        remaining = []
+        for channel in channels:
+            if not self.bit[channel]:
+                buffer[channel].append(self.word[channel])
+                remaining.append(channel)
+        if not remaining:
+            yield from self.connectorUpper.gsend_b(False)
+        elif self.connectorLower is not None:
+            yield from self.connectorLower.gsend_o("snapshot", *remaining)
+            badEnding = yield from self.connectorLower.greceive_b()
+            yield from self.connectorUpper.gsend_b(badEnding)
+        else:
+            for channel in remaining:
+                buffer[channel] = None
+            yield from self.connectorUpper.gsend_b(True)
+
+    def compact(self, *channels):
+        """See CPE.compact."""
+        remaining = [channel for channel in channels if not self.bit[channel]]
+        if remaining and self.connectorLower is not None:
+            yield from self.connectorLower.gsend_o("compact", *remaining)
+            kept = yield from self.connectorLower.greceive_w()
+            yield from self.connectorUpper.gsend_w(kept + 1)
+        else:
+            if self.connectorLower is not None:
+                yield from self.connectorLower.gsend_o("stop")
+                self.connectorLower = None
+            yield from self.connectorUpper.gsend_w(1)
+
+    def sync(self):
+        """See CPE.sync."""
+        if self.connectorLower is not None:
+            yield from self.connectorLower.gsend_o("sync")
+            yield from self.connectorLower.greceive_b()
+        yield from self.connectorUpper.gsend_b(Any)
+
+    def register2list(self, channel):
+        """For debugging only, not a part of the model."""
+        self.scheduler.buffer.append(self.word[channel])
+        if self.bit[channel]: # if continued:
+            if self.connectorLower is not None:
+                yield from self.connectorLower.gsend_o("register2list", channel)
+                badEnding = yield from self.connectorLower.greceive_b()
+                yield from self.connectorUpper.gsend_b(badEnding)
+            elif self.connectorLower is None:
+                yield from self.connectorUpper.gsend_b(True) # badEnding=True
+        elif not self.bit[channel]: # if not continued (last word):
+            yield from self.connectorUpper.gsend_b(False) # badEnding=False
+
+    # ==========================================================================
+
+    def run(self):
+        """The generator resumed by the scheduler; cf. CPE.run."""
+        while True:
+            operation, self.channels = \
+                yield from self.connectorUpper.greceive_o()
+            try:
+                self.operation, method = self.dispatch[operation]
+            except KeyError:
+                raise ValueError("send_o%s: unknown operation." %
+                                 str((operation,)+self.channels)) from None
+            checkChannels(self.operation, self.channels)
+            if self.operation != "printRepr" and self.operation != "printStr":
+                self.temp_w[:] = ANY_TEMP # reset in place
+                self.temp_b[:] = ANY_TEMP
+            if self.operation == "stop":
+                yield from self.stop()
+                break
+            else:
+                activity = method(self, *self.channels)
+                if activity is not None:
+                    yield from activity
+            self.operation = Any
+            self.channels = Any
+
+    # === LIST OPERATIONS ======================================================
+
+    def clear(self, channelA):
+        """See CPE.clear."""
+        self.bit[channelA] = True
+
+    def member(self, channelA):
+        """See CPE.member. O(n)xO(n), propagation |/."""
+        if not self.bit[channelA]: # if CPE's channelA is non-empty
+            self.temp_w[0] = yield from self.connectorUpper.greceive_w()
+            if self.word[channelA] == self.temp_w[0]: # found here
+                yield from self.connectorUpper.gsend_b(True)
+            else: # keep looking below
+                yield from self.connectorLower.gsend_o("member", channelA)
+                yield from self.connectorLower.gsend_w(self.temp_w[0])
+                self.temp_w[0] = yield from self.connectorLower.greceive_b()
+                yield from self.connectorUpper.gsend_b(self.temp_w[0])
+        elif self.bit[channelA]: # if current CPE terminates the list
+            _ = yield from self.connectorUpper.greceive_w()
+            yield from self.connectorUpper.gsend_b(False) # not found anywhere
+
+    def pushPoor(self, channelA):
+        """See CPE.pushPoor. Theta(n)xTheta(n), propagation |/."""
+        if not self.bit[channelA]:
+            yield from self.connectorLower.gsend_o("pushPoor", channelA)
+            yield from self.connectorLower.gsend_w(self.word[channelA])
+            self.word[channelA] = yield from self.connectorUpper.greceive_w()
+        elif self.bit[channelA]:
+            self.word[channelA] = yield from self.connectorUpper.greceive_w()
+            self.bit[channelA] = False
+            self.extend()
+            yield from self.connectorLower.gsend_o("clear", channelA)
+
+    def addLast(self, channelA):
+        """See CPE.addLast. Theta(1)xTheta(n), propagation |."""
+        if not self.bit[channelA]:
+            self.temp_w[0] = yield from self.connectorUpper.greceive_w()
+            yield from self.connectorLower.gsend_o("addLast", channelA)
+            yield from self.connectorLower.gsend_w(self.temp_w[0])
+        elif self.bit[channelA]:
+            self.word[channelA] = yield from self.connectorUpper.greceive_w()
+            self.bit[channelA] = False
+            self.extend()
+            yield from self.connectorLower.gsend_o("clear", channelA)
+
+    # === BULK OPERATIONS ======================================================
+
+    def addAllFirst(self, channelA):
+        """See CPE.addAllFirst. Theta(k)xTheta(k+n), propagation |."""
+        self.temp_w[0], self.temp_b[0] = \
+            yield from self.connectorUpper.greceive_W()
+        if self.temp_b[0]:
+            return
+        self.temp_w[1], self.temp_b[1] = self.word[channelA], self.bit[channelA]
+        self.word[channelA], self.bit[channelA] = self.temp_w[0], False
+        self.extend()
+        if self.temp_b[1]:
+            yield from self.connectorLower.gsend_o("clear", channelA)
+        yield from self.connectorLower.gsend_o("addAllFirst", channelA)
+        while True:
+            self.temp_w[0], self.temp_b[0] = \
+                yield from self.connectorUpper.greceive_W()
+            if self.temp_b[0]:
+                break
+            yield from self.connectorLower.gsend_W(self.temp_w[0], False)
+        if not self.temp_b[1]:
+            yield from self.connectorLower.gsend_W(self.temp_w[1], False)
+        yield from self.connectorLower.gsend_W(Any, True)
+
+    def addAllLast(self, channelA):
+        """See CPE.addAllLast. Theta(k)xTheta(k+n), propagation |."""
+        if self.bit[channelA]:
+            self.temp_w[0], self.temp_b[0] = \
+                yield from self.connectorUpper.greceive_W()
+            if self.temp_b[0]:
+                return
+            self.word[channelA], self.bit[channelA] = self.temp_w[0], False
+            self.extend()
+            yield from self.connectorLower.gsend_o("clear", channelA)
+        yield from self.connectorLower.gsend_o("addAllLast", channelA)
+        while True:
+            self.temp_w[0], self.temp_b[0] = \
+                yield from self.connectorUpper.greceive_W()
+            yield from self.connectorLower.gsend_W(self.temp_w[0],
+                                                   self.temp_b[0])
+            if self.temp_b[0]:
+                break
+
+    def pullMany(self, channelA):
+        """See CPE.pullMany. Theta(m)xTheta(n), propagation |."""
+        self.temp_w[0] = yield from self.connectorUpper.greceive_w()
+        if self.bit[channelA] or self.temp_w[0] == 0:
+            yield from self.connectorUpper.gsend_W(Any, True)
+            return
+        yield from self.connectorUpper.gsend_W(self.word[channelA], False)
+        yield from self.connectorLower.gsend_o("pullMany", channelA)
+        yield from self.connectorLower.gsend_w(self.temp_w[0])
+        self.bit[channelA] = True
+        while True:
+            self.temp_w[1], self.temp_b[1] = \
+                yield from self.connectorLower.greceive_W()
+            if self.temp_b[1]:
+                break
+            self.temp_w[0] -= 1
+            if self.temp_w[0] > 0:
+                yield from self.connectorUpper.gsend_W(self.temp_w[1], False)
+            else:
+                self.word[channelA], self.bit[channelA] = self.temp_w[1], False
+        yield from self.connectorUpper.gsend_W(Any, True)
+
+    def drain(self, channelA):
+        """See CPE.drain. Theta(n)xTheta(n), propagation |."""
+        if self.bit[channelA]:
+            yield from self.connectorUpper.gsend_W(Any, True)
+            return
+        yield from self.connectorUpper.gsend_W(self.word[channelA], False)
+        self.bit[channelA] = True
+        yield from self.connectorLower.gsend_o("drain", channelA)
+        while True:
+            self.temp_w[0], self.temp_b[0] = \
+                yield from self.connectorLower.greceive_W()
+            yield from self.connectorUpper.gsend_W(self.temp_w[0],
+                                                   self.temp_b[0])
+            if self.temp_b[0]:
+                break
+
+    # === ORDER OPERATIONS, sorts ==============================================
+
+    def sSort(self, channelA):
+        """See CPE.sSort."""
+        if not self.bit[channelA]: # if CPE's channel A is non-empty
+            yield from self.connectorLower.gsend_o("minToTop", channelA)
+            # Send channel A word:
+            yield from self.connectorLower.gsend_w(self.word[channelA])
+            # Send minSoFar:
+            yield from self.connectorLower.gsend_w(self.word[channelA])
+            # Receive min and put in chA, discard the bit:
+            self.word[channelA],_ = yield from self.connectorLower.greceive_W()
+            yield from self.connectorLower.gsend_o("sSort", channelA)
+
+    def minToTop(self, channelA):
+        """See CPE.minToTop."""
+        if not self.bit[channelA]: # if CPE's channelA is non-empty
+            self.temp_w[0] = yield from self.connectorUpper.greceive_w()
+            self.temp_w[1] = yield from self.connectorUpper.greceive_w()
+            yield from self.connectorLower.gsend_o("minToTop", channelA)
+            yield from self.connectorLower.gsend_w(self.word[channelA])
+            if self.word[channelA] < self.temp_w[1]:
+                yield from self.connectorLower.gsend_w(self.word[channelA])
+            else:
+                yield from self.connectorLower.gsend_w(self.temp_w[1])
+            self.temp_w[1],self.temp_b[1] = \
+                yield from self.connectorLower.greceive_W()
+            if not self.temp_b[1] \
+                   and self.word[channelA]!=self.temp_w[1]:
+                yield from self.connectorUpper.gsend_W(self.temp_w[1],False)
+            else:
+                self.word[channelA] = self.temp_w[0] # shift down chA
+                yield from self.connectorUpper.gsend_W(self.temp_w[1],True)
+        elif self.bit[channelA]: # if current CPE terminates the list
+            yield from self.connectorUpper.greceive_w() # from chA, discard
+            self.temp_w[1] = yield from self.connectorUpper.greceive_w()
+            yield from self.connectorUpper.gsend_W(self.temp_w[1],False)
+
+# ==============================================================================
+
+CoopCPE.dispatch = buildDispatch(CoopCPE, CPE)
+assertSignatures(CoopCPE)
+
+###############################################################################
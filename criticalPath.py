@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+"""CRITICAL PATHS OF CHAIN OPERATIONS
+
+   A handshake synchronizes two neighbors: it happens after the previous
+   handshake of each of them. The events recorded by ActivityConnectors
+   (see activityTrace.py), one per handshake, form a happens-before graph:
+   the predecessors of a handshake are the previous handshakes of its
+   receiver and of its sender (pe - 1 if it came down, pe + 1 if up).
+
+   The handshake waited for the later of its two predecessors: the
+   neighbor which took part in it was still busy until then, the other
+   one was idle, for at most the difference of the two times: its slack.
+   Following the later predecessor back from the last handshake of an
+   operation gives its critical path, whose steps add up to the span
+   of the operation: its wall time, from the first handshake
+   (the controller sending the operation to the top CPE) to the last one.
+   Each step is charged to the neighbor which was busy, and to the kind
+   of handshake which ended it, in the session of the operation it
+   belongs to (e.g. the w messages of minToTop sent down by sSort).
+
+   The handshakes of one controller operation are those of its session
+   with the top CPE and of the sessions started from them, recursively:
+   a CPE sends an operation down while it executes the operation
+   it received from above.
+
+   For debugging only, not a part of the model."""
+
+# ==============================================================================
+
+def operationEvents(events, operation, occurrence=0):
+    """Returns the events of the controller operation: a list of events
+       (time, pe, side, kind, value), as generated by Activity.events(),
+       those of the occurrence-th call of operation (0 for the first)."""
+    current = {} # pe -> the number of the controller operation it executes.
+    calls = -1
+    root = None
+    selected = []
+    for event in events:
+        time, pe, side, kind, value = event
+        if side == "upper" and kind == "o":
+            if pe == 1: # from the controller: a new call.
+                calls += 1
+                current[0] = calls
+                if value == operation:
+                    occurrence -= 1
+                    if occurrence == -1:
+                        root = calls
+            current[pe] = current.get(pe - 1)
+        if root is not None and current.get(pe) == root:
+            selected.append(event)
+    return selected
+
+def criticalPath(events):
+    """Theta(e). The critical path of a list of events of one operation
+       (see operationEvents), in time order. Returns a dictionary:
+       "span"        - the time from the first event to the last one;
+       "path"        - the events of the critical path, first to last,
+                       each as (event, busy pe, time since the previous);
+       "pes"         - pe -> the time of the path it was busy;
+       "handshakes"  - (operation, kind, "down"/"up") -> the time of the
+                       path which ended by such a handshake;
+       "slack"       - the sum of the slacks of all the handshakes;
+       "parallelism" - the busy time of all the neighbors, as charged
+                       handshake by handshake, divided by the span:
+                       1 for a pipeline which does not overlap."""
+    if not events:
+        return {"span": 0, "path": [], "pes": {}, "handshakes": {},
+                "slack": 0, "parallelism": 0}
+    last = {} # pe -> the index of its latest event.
+    sessions = {} # lower pe of a link -> its operation.
+    previous = [] # per event: (index of the later predecessor, busy pe)
+    keys = []
+    slack = busy = 0
+    for i, (time, pe, side, kind, value) in enumerate(events):
+        sender = pe - 1 if side == "upper" else pe + 1
+        lower = pe if side == "upper" else sender
+        if kind == "o":
+            sessions[lower] = value
+        keys.append((sessions.get(lower), kind,
+                     "down" if side == "upper" else "up"))
+        mine, theirs = last.get(pe), last.get(sender)
+        if theirs is None and mine is None:
+            previous.append((None, sender))
+        elif mine is None or theirs is not None and \
+             events[theirs][0] >= events[mine][0]:
+            previous.append((theirs, sender))
+            if mine is not None:
+                slack += events[theirs][0] - events[mine][0]
+            busy += time - events[theirs][0]
+        else:
+            previous.append((mine, pe))
+            if theirs is not None:
+                slack += events[mine][0] - events[theirs][0]
+            busy += time - events[mine][0]
+        last[pe] = last[sender] = i
+    end = max(range(len(events)), key=lambda i: events[i][0])
+    span = events[end][0] - events[0][0]
+    path = []
+    pes = {}
+    handshakes = {}
+    i = end
+    while i is not None:
+        before, pe = previous[i]
+        step = 0 if before is None else events[i][0] - events[before][0]
+        path.append((events[i], pe, step))
+        pes[pe] = pes.get(pe, 0) + step
+        handshakes[keys[i]] = handshakes.get(keys[i], 0) + step
+        i = before
+    path.reverse()
+    return {"span": span, "path": path, "pes": pes, "handshakes": handshakes,
+            "slack": slack, "parallelism": busy / span if span else 0}
+
+def formatCriticalPath(report, top=5):
+    """The summary of a criticalPath report, as lines of text: the span,
+       and the top pes and handshakes by their share of it."""
+    span = report["span"] or 1
+    lines = ["span %.1f us, %s handshakes on the critical path, "
+             "slack %.1f us, parallelism %.2f" %
+             (report["span"] / 1000, len(report["path"]),
+              report["slack"] / 1000, report["parallelism"])]
+    for title, shares, name in [
+            ("pes", report["pes"],
+             lambda pe: "controller" if pe == 0 else "PE %s" % pe),
+            ("handshakes", report["handshakes"],
+             lambda key: "%s %s %s" % key)]:
+        lines.append(title + ":")
+        for key, time in sorted(shares.items(),
+                                key=lambda item: -item[1])[:top]:
+            lines.append("    %-24s %5.1f%%" % (name(key), 100 * time / span))
+    return "\n".join(lines)
+
+###############################################################################
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+"""DEADLOCK WATCHDOG FOR CHAINS OF CPE THREADS
+
+   When the protocols of two neighbors do not match, for instance both
+   of them wait in receive_* on the connector between them, the chain
+   hangs forever. A DeadlockWatchdog is a daemon thread which every
+   interval seconds samples the stacks of all the threads
+   (sys._current_frames) and finds the threads blocked in a send_* or
+   receive_* method of a connector, and their owners: the CPE, or the
+   chain controller, whose connectorUpper or connectorLower it is.
+
+   The wait-for graph has an edge from a blocked owner to its neighbor
+   on the other side of that connector, unless the neighbor is blocked
+   on the same connector with the complementary call (a send and
+   a receive, which complete each other). A cycle of the graph is
+   a deadlock; it is reported when the same cycle, with the same calls,
+   is found in two consecutive samples: within 2*interval seconds.
+
+   The handshake path of the connectors is not instrumented: the only
+   cost is the sampling, once per interval, in the watchdog thread.
+   Engines "thread" and subclasses of CPE (see ChainController).
+
+   For debugging only, not a part of the model."""
+
+# ==============================================================================
+
+import re
+import sys
+import threading
+
+# ==============================================================================
+
+_CONNECTOR_CALL = re.compile(r"g?(send|receive)_[owWbB]$")
+
+class Blocked:
+    """A thread blocked in a connector call: owner is the CPE or the
+       controller, side is "connectorUpper" or "connectorLower"
+       (which connector of the owner), call is e.g. "receive_w"."""
+
+    __slots__ = ("thread", "owner", "connector", "side", "call", "frame")
+
+    def __init__(self, thread, owner, connector, side, call, frame):
+        self.thread = thread
+        self.owner = owner
+        self.connector = connector
+        self.side = side
+        self.call = call
+        self.frame = frame # the frame of the call, to recognize it again.
+
+    def name(self):
+        return getattr(self.owner, "name", type(self.owner).__name__)
+
+    def isSend(self):
+        return self.call.lstrip("g").startswith("send")
+
+    def operation(self):
+        if self.call.endswith("receive_o"):
+            return "idle" # waiting for the next operation.
+        operation = getattr(self.owner, "operation", None)
+        if isinstance(operation, str):
+            return operation
+        return self.frame.f_back.f_code.co_name # the controller method.
+
+    def __str__(self):
+        return "%s %s: %s.%s" % (self.name(), self.operation(),
+                                 self.side, self.call)
+
+def _blocked(thread, frame):
+    """Returns the Blocked of a thread, or None if the thread is not
+       in a connector call made by a CPE or a controller.
+       Only the locals of the connector calls and of the frames above
+       them are read: reading the locals of any frame of a thread which
+       is ending may crash the interpreter."""
+    if thread is None or not thread.is_alive():
+        return None
+    connector = call = callFrame = None
+    while frame is not None:
+        isCall = _CONNECTOR_CALL.match(frame.f_code.co_name)
+        if connector is None and not isCall:
+            frame = frame.f_back # not in a connector call yet.
+            continue
+        me = frame.f_locals.get("self")
+        if connector is None or me is connector:
+            if isCall and hasattr(me, "receive_o"):
+                connector, call, callFrame = me, frame.f_code.co_name, frame
+        elif me is not None:
+            for side in ["connectorUpper", "connectorLower"]:
+                if getattr(me, side, None) is connector:
+                    return Blocked(thread, me, connector, side, call,
+                                   callFrame)
+        frame = frame.f_back
+    return None
+
+def waitForCycle(blocked):
+    """Returns a cycle of the wait-for graph of a list of Blocked,
+       as a list of Blocked, or None if there is none."""
+    ends = {} # (id(connector), side of the owner) -> Blocked
+    for b in blocked:
+        for side in ["connectorUpper", "connectorLower"]:
+            connector = getattr(b.owner, side, None)
+            if connector is not None:
+                ends[(id(connector), side)] = b
+    waitsFor = {}
+    for b in blocked:
+        other = "connectorLower" if b.side == "connectorUpper" \
+                else "connectorUpper"
+        neighbor = ends.get((id(b.connector), other))
+        if neighbor is None or neighbor is b:
+            continue
+        if neighbor.connector is b.connector and \
+           neighbor.isSend() != b.isSend():
+            continue # they complete each other.
+        waitsFor[b] = neighbor
+    done = set()
+    for start in waitsFor: # out-degree <= 1: follow the edges.
+        path = []
+        b = start
+        while b in waitsFor and b not in done:
+            done.add(b)
+            path.append(b)
+            b = waitsFor[b]
+        if b in path:
+            return path[path.index(b):]
+    return None
+
+def sampleBlocked():
+    """The Blocked of all the threads blocked in a connector call now."""
+    threads = {t.ident: t for t in threading.enumerate()}
+    blocked = []
+    for ident, frame in sys._current_frames().items():
+        b = _blocked(threads.get(ident), frame)
+        if b is not None:
+            blocked.append(b)
+    return blocked
+
+# ==============================================================================
+
+class DeadlockWatchdog:
+    """A daemon thread reporting the deadlocks of connector calls.
+       A deadlock found is appended to self.deadlocks, as a list of
+       strings "<CPE name> <operation>: <side>.<call>", one per thread
+       of the cycle, and passed to onDeadlock, which by default
+       prints it to stderr."""
+
+    def __init__(self, interval=1.0, onDeadlock=None):
+        if interval <= 0:
+            raise ValueError("DeadlockWatchdog: interval should be > 0.")
+        self.interval = interval
+        self.onDeadlock = onDeadlock or self.report
+        self.deadlocks = []
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._watch, daemon=True,
+                                       name="deadlockWatchdog")
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def check(self):
+        """One sample: returns the cycle found now, unconfirmed,
+           as a list of strings, or None."""
+        cycle = waitForCycle(sampleBlocked())
+        return None if cycle is None else [str(b) for b in cycle]
+
+    def _watch(self):
+        previous = None # the calls of the cycle found in the last sample.
+        while not self.stopped.wait(self.interval):
+            self.samples += 1
+            cycle = waitForCycle(sampleBlocked())
+            if cycle is None:
+                previous = None
+                continue
+            calls = frozenset((b.thread, b.frame) for b in cycle)
+            if calls == previous: # still blocked in the same calls.
+                deadlock = [str(b) for b in cycle]
+                if deadlock not in self.deadlocks:
+                    self.deadlocks.append(deadlock)
+                    self.onDeadlock(deadlock)
+            previous = calls
+
+    def report(self, deadlock):
+        sys.stderr.write("Deadlock: " + "  <->  ".join(deadlock) + "\n")
+
+###############################################################################
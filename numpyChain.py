@@ -0,0 +1,687 @@
+#!/usr/bin/env python3
+
+"""NUMPY CHAIN: A VECTORIZED LOCKSTEP ENGINE
+
+   A NumpyChain stores the registers of all the CPEs of a chain
+   in two NumPy arrays of shape (n, CHANNELS):
+       word[i, channel] - the word of CPE i+1 (-1 stands for Any),
+       bit[i, channel]  - its bit: 1 True, 0 False, -1 Any.
+   Every chain operation is executed as a transformation of whole array
+   slices, with the same result as the CPE protocol would produce,
+   and the number of parallel steps the chain would have taken is counted.
+
+   A step is the activation of one CPE level; an answer travelling back up
+   counts a level twice. For a channel content of length n:
+       non-propagating operations (first, clear, ...)          1
+       propagating operations |  (push, copy, setAll, ...)      n+1
+           (+1 when a CPE is added below the content: addLast, push)
+       propagating operations |/ (member, min, last, ...)       2d,
+           where d is the depth at which the answer is found
+       sSort, iSort, bSort                                      (n+1)^2
+   self.lastSteps is the count of the last operation,
+   self.steps is the total since the chain was created.
+
+   ChainController selects this engine with engine="numpy";
+   the chain controller talks to a NumpyConnector, which collects
+   the arguments of an operation according to its signature
+   (see signatures.py), executes it, and queues the answers.
+   NumPy is required only by this engine."""
+
+# ==============================================================================
+
+from collections import deque
+
+try:
+    import numpy
+except ImportError: # the other engines do not need numpy.
+    numpy = None
+
+from connector import checkOperation, checkWord, checkWordBit, \
+                      checkBit, checkBits
+from signatures import SIGNATURES
+from registers import NO_WORD, NO_BIT # -1: Any, as in the CPE registers.
+from chain_1_class_PE import *
+
+# ==============================================================================
+
+def _word(value):
+    """Converts an array word to a CPE word."""
+    return Any if value < 0 else int(value)
+
+def _arrayWord(word):
+    """Converts a CPE word to an array word."""
+    return NO_WORD if word is Any else word
+
+def _column(column):
+    """Converts a column of words to a one-dimensional int64 array."""
+    if hasattr(column, "__len__"):
+        return numpy.asarray(column, dtype=numpy.int64).reshape(-1)
+    return numpy.fromiter(column, dtype=numpy.int64)
+
+# ==============================================================================
+
+class NumpyChain:
+    """The registers of a whole chain, and its operations as array
+       transformations. The methods named as CPE operations take
+       the channels and the received words as parameters, and return
+       the tuple of the values sent up."""
+
+    def __init__(self, *columns):
+        """Usage: as for ChainController; a column can be any iterable
+           of non-negative integers, including a NumPy array
+           (used without a copy if its dtype is int64) or a generator."""
+        if numpy is None:
+            raise ImportError("The numpy engine requires NumPy.")
+        if len(columns) > CHANNELS:
+            raise ValueError(
+                "NumpyChain: a CPE cannot store more than %s words." % CHANNELS)
+        CPE.chainId += 1 # chain names are unique across the engines.
+        self.chainName = "CH" + str(CPE.chainId)
+        arrays = [_column(c) for c in columns]
+        for a in arrays:
+            if a.size and a.min() < 0:
+                raise ValueError("NumpyChain: words cannot be negative.")
+        self.depth = max([a.size for a in arrays], default=0) + 1
+        capacity = max(16, 2*self.depth)
+        self.word = numpy.full((capacity, CHANNELS), NO_WORD, dtype=numpy.int64)
+        self.bit = numpy.full((capacity, CHANNELS), NO_BIT, dtype=numpy.int8)
+        self.length = [0]*CHANNELS # content length of every channel.
+        self.buffer = [] # the words collected by chain2list, register2list.
+        for channel in range(CHANNELS):
+            a = arrays[channel] if channel < len(arrays) else arrays[:0]
+            n = len(a) if channel < len(arrays) else 0
+            if n:
+                self.word[:n, channel] = a
+                self.bit[:n, channel] = 0
+            self.bit[n, channel] = 1
+            self.length[channel] = n
+        self.steps = 0
+        self.lastSteps = 0
+        self.connectorUpper = NumpyConnector(self)
+
+    def start(self):
+        """There is nothing to start: all the CPEs are always ready."""
+        pass
+
+    def _count(self, steps):
+        self.lastSteps = steps
+        self.steps += steps
+
+    def _ensure(self, depth):
+        """Extend the chain to at least depth CPEs."""
+        if depth > len(self.word):
+            capacity = max(depth, 2*len(self.word))
+            word = numpy.full((capacity, CHANNELS), NO_WORD, dtype=numpy.int64)
+            bit = numpy.full((capacity, CHANNELS), NO_BIT, dtype=numpy.int8)
+            word[:len(self.word)] = self.word
+            bit[:len(self.bit)] = self.bit
+            self.word, self.bit = word, bit
+        if depth > self.depth:
+            self.depth = depth
+
+    def _setContent(self, channel, words):
+        """Replace the content of the channel by the array words."""
+        n = len(words)
+        self._ensure(n+1)
+        self.word[:n, channel] = words
+        self.bit[:n, channel] = 0
+        self.bit[n, channel] = 1
+        self.length[channel] = n
+
+    def content(self, channel):
+        """The content of the channel as a NumPy array (a view)."""
+        return self.word[:self.length[channel], channel]
+
+    # --- testing tools, not a part of the model -----------------------------
+
+    def stop(self):
+        self._count(self.depth)
+        return ()
+
+    def chain2list(self, channel):
+        self.buffer.extend(self.content(channel).tolist())
+        self._count(self.length[channel]+1)
+        return (False,) # badEnding=False
+
+    def register2list(self, channel):
+        for i in range(self.depth):
+            self.buffer.append(_word(self.word[i, channel]))
+            if self.bit[i, channel] == NO_BIT:
+                raise TypeError("The object Any is neither True nor False.")
+            if not self.bit[i, channel]: # if not continued (last word):
+                self._count(i+1)
+                return (False,) # badEnding=False
+        self._count(self.depth)
+        return (True,) # badEnding=True
+
+    def _print(self, base):
+        for i in range(self.depth):
+            result = "{:9}".format(self.chainName + "." + str(i+1))
+            for channel in range(CHANNELS):
+                word = _word(self.word[i, channel])
+                bit = self.bit[i, channel]
+                if isinstance(word, int):
+                    dat = number2string(word, base)
+                else:
+                    dat = str(word)
+                result += " {:>8} {:5}".format(
+                    dat, str(Any if bit == NO_BIT else bool(bit)))
+            for temp in range(TEMP_SPACE):
+                result += " {:>8} {:5}".format("Any", "Any")
+            print(result)
+        self._count(2*self.depth)
+        return (Any,)
+
+    def printRepr2(self):
+        return self._print(2)
+
+    def printRepr4(self):
+        return self._print(4)
+
+    def printRepr8(self):
+        return self._print(8)
+
+    def printRepr10(self):
+        return self._print(10)
+
+    def printRepr16(self):
+        return self._print(16)
+
+    def printStr(self):
+        for i in range(self.depth):
+            result = "{:9}".format(self.chainName + "." + str(i+1))
+            for channel in range(CHANNELS):
+                bit = self.bit[i, channel]
+                if bit == 0:
+                    result += " {:>8}".format(str(self.word[i, channel]))
+                elif bit == 1:
+                    result += " {:>8}".format("-")
+                else:
+                    result += " {:>8}".format("?")
+            for temp in range(TEMP_SPACE):
+                result += " {:>8}".format("?")
+            print(result)
+        self._count(2*self.depth)
+        return (Any,)
+
+    # === LIST OPERATIONS, top CPE operations =================================
+
+    def isEmpty(self, channelA):
+        self._count(1)
+        return (self.length[channelA] == 0,)
+
+    def clear(self, channelA):
+        self.bit[0, channelA] = 1
+        self.length[channelA] = 0
+        self._count(1)
+        return ()
+
+    def clear2(self, channelA, channelB):
+        self.clear(channelA)
+        self.clear(channelB)
+        self._count(1)
+        return ()
+
+    def first(self, channelA):
+        self._count(1)
+        if self.length[channelA] == 0:
+            return ((Any, True),)
+        return ((int(self.word[0, channelA]), False),)
+
+    # === LIST OPERATIONS, whole chain operations =============================
+
+    def copy(self, channelA, resultChannel):
+        n = self.length[channelA]
+        self.word[:n+1, resultChannel] = self.word[:n+1, channelA]
+        self.bit[:n+1, resultChannel] = self.bit[:n+1, channelA]
+        self.length[resultChannel] = n
+        self._count(max(n, self.length[resultChannel])+1)
+        return ()
+
+    def move(self, channelA, resultChannel):
+        self.copy(channelA, resultChannel)
+        self.bit[0, channelA] = 1
+        self.length[channelA] = 0
+        self._count(self.length[resultChannel]+1)
+        return ()
+
+    def swap(self, channelA, channelB):
+        n = max(self.length[channelA], self.length[channelB]) + 1
+        columns = [channelA, channelB]
+        self.word[:n, columns] = self.word[:n, columns[::-1]]
+        self.bit[:n, columns] = self.bit[:n, columns[::-1]]
+        self.length[channelA], self.length[channelB] = \
+            self.length[channelB], self.length[channelA]
+        self._count(n)
+        return ()
+
+    def setAll(self, channelA, word):
+        n = self.length[channelA]
+        self.word[:n, channelA] = word
+        self._count(n+1)
+        return ()
+
+    def member(self, channelA, word):
+        hits = numpy.flatnonzero(self.content(channelA) == word)
+        if len(hits):
+            self._count(2*(int(hits[0])+1))
+            return (True,)
+        self._count(2*(self.length[channelA]+1))
+        return (False,)
+
+    # --- LIST OPERATIONS, top operations -------------------------------------
+
+    def push(self, channelA, word):
+        n = self.length[channelA]
+        self._ensure(n+2)
+        self.word[1:n+1, channelA] = self.word[0:n, channelA]
+        self.word[0, channelA] = word
+        self.bit[:n+1, channelA] = 0
+        self.bit[n+1, channelA] = 1
+        self.length[channelA] = n+1
+        self._count(n+2)
+        return ()
+
+    pushPoor = push
+
+    def pull(self, channelA):
+        n = self.length[channelA]
+        if n == 0:
+            self._count(1)
+            return ((Any, True),)
+        word = int(self.word[0, channelA])
+        self.word[0:n-1, channelA] = self.word[1:n, channelA]
+        self.bit[n-1, channelA] = 1
+        self.length[channelA] = n-1
+        self._count(n+1)
+        return ((word, False),)
+
+    def replaceGetFirst(self, channelA, word):
+        self._count(1)
+        if self.length[channelA] == 0:
+            return ((Any, True),)
+        old = int(self.word[0, channelA])
+        self.word[0, channelA] = word
+        return ((old, False),)
+
+    # --- LIST OPERATIONS, bottom operations ----------------------------------
+
+    def last(self, channelA):
+        n = self.length[channelA]
+        self._count(2*(n+1))
+        if n == 0:
+            return ((Any, True),)
+        return ((int(self.word[n-1, channelA]), False),)
+
+    def addLast(self, channelA, word):
+        n = self.length[channelA]
+        self._ensure(n+2)
+        self.word[n, channelA] = word
+        self.bit[n, channelA] = 0
+        self.bit[n+1, channelA] = 1
+        self.length[channelA] = n+1
+        self._count(n+2)
+        return ()
+
+    def removeLast(self, channelA):
+        n = self.length[channelA]
+        self._count(n+1)
+        if n == 0:
+            return (True,)
+        self.bit[n-1, channelA] = 1
+        self.length[channelA] = n-1
+        return (False,)
+
+    def removeGetLast(self, channelA):
+        n = self.length[channelA]
+        self._count(2*(n+1))
+        if n == 0:
+            return ((Any, True),)
+        self.bit[n-1, channelA] = 1
+        self.length[channelA] = n-1
+        return ((int(self.word[n-1, channelA]), False),)
+
+    def replaceLast(self, channelA, word):
+        n = self.length[channelA]
+        self._count(n+1)
+        if n == 0:
+            return (True,)
+        self.word[n-1, channelA] = word
+        return (False,)
+
+    def replaceGetLast(self, channelA, word):
+        n = self.length[channelA]
+        self._count(2*(n+1))
+        if n == 0:
+            return ((Any, True),)
+        old = int(self.word[n-1, channelA])
+        self.word[n-1, channelA] = word
+        return ((old, False),)
+
+    # --- LIST OPERATIONS, rotations and reverse ------------------------------
+
+    def rotateDown(self, channelA):
+        n = self.length[channelA]
+        if n == 0:
+            self._count(1)
+            return ((Any, True),)
+        content = self.content(channelA)
+        word = int(content[0])
+        content[:] = numpy.roll(content, -1)
+        self._count(n+1)
+        return ((word, False),)
+
+    def rotateUp(self, channelA):
+        n = self.length[channelA]
+        self._count(2*(n+1))
+        if n == 0:
+            return ((Any, True),)
+        content = self.content(channelA)
+        word = int(content[-1])
+        content[:] = numpy.roll(content, 1)
+        return ((word, False),)
+
+    def reverse(self, channelA, resultChannel):
+        n = self.length[channelA]
+        words = self.content(channelA)[::-1].copy()
+        if resultChannel != channelA:
+            self.bit[0, channelA] = 1
+            self.length[channelA] = 0
+        self._setContent(resultChannel, words)
+        self._count(2*(n+1))
+        return ()
+
+    reverseSimple = reverse
+
+    # === ORDER OPERATIONS ====================================================
+
+    def min(self, channelA):
+        n = self.length[channelA]
+        self._count(2*(n+1))
+        if n == 0:
+            return ((Any, True),)
+        return ((int(self.content(channelA).min()), False),)
+
+    memberND = member
+
+    def insertND(self, channelA, word):
+        content = self.content(channelA)
+        i = int(numpy.searchsorted(content, word, side="right"))
+        self._setContent(channelA, numpy.insert(content, i, word))
+        self._count(self.length[channelA]+1)
+        return ()
+
+    def insertUniqueI(self, channelA, word):
+        content = self.content(channelA)
+        i = int(numpy.searchsorted(content, word, side="left"))
+        if i == len(content) or content[i] != word:
+            self._setContent(channelA, numpy.insert(content, i, word))
+        self._count(i+2)
+        return ()
+
+    def insertAllND(self, channelA, channelB):
+        m = self.length[channelA]
+        words = numpy.concatenate((self.content(channelB),
+                                   self.content(channelA)))
+        words.sort(kind="stable")
+        self.bit[0, channelA] = 1
+        self.length[channelA] = 0
+        self._setContent(channelB, words)
+        self._count(m+len(words)+1)
+        return ()
+
+    def sSort(self, channelA):
+        n = self.length[channelA]
+        self.content(channelA).sort(kind="stable")
+        self._count((n+1)**2)
+        return ()
+
+    iSort = sSort
+    bSort = sSort
+
+    def mergeNDsimple(self, channelA, channelB, resultChannel):
+        words = numpy.concatenate((self.content(channelA),
+                                   self.content(channelB)))
+        words.sort(kind="stable")
+        self.bit[0, [channelA, channelB]] = 1
+        self.length[channelA] = self.length[channelB] = 0
+        self._setContent(resultChannel, words)
+        self._count(len(words)+1)
+        return ()
+
+    def mergeND(self, channelA, channelB):
+        words = numpy.concatenate((self.content(channelA),
+                                   self.content(channelB)))
+        words.sort(kind="stable")
+        self.bit[0, channelA] = 1
+        self.length[channelA] = 0
+        self._setContent(channelB, words)
+        self._count(len(words)+1)
+        return ()
+
+    # === INDEXING OPERATIONS =================================================
+
+    def length_(self, channelA):
+        n = self.length[channelA]
+        self._count(2*(n+1))
+        return (n,)
+
+    def getItem(self, channelA, index):
+        n = self.length[channelA]
+        if index < n:
+            self._count(2*(index+1))
+            return ((int(self.word[index, channelA]), False),)
+        self._count(2*(n+1))
+        return ((Any, True),)
+
+    def setItem0(self, channelA, index, item):
+        if index < self.length[channelA]:
+            self.word[index, channelA] = item
+        self._count(min(index, self.length[channelA])+1)
+        return ()
+
+    def setItem(self, channelA, index, item):
+        n = self.length[channelA]
+        if index < n:
+            self.word[index, channelA] = item
+            self._count(2*(index+1))
+            return (False,)
+        self._count(2*(n+1))
+        return (True,)
+
+    def getSetItem(self, channelA, index, item):
+        n = self.length[channelA]
+        if index < n:
+            old = int(self.word[index, channelA])
+            self.word[index, channelA] = item
+            self._count(2*(index+1))
+            return ((old, False),)
+        self._count(2*(n+1))
+        return ((Any, True),)
+
+    def memberIndex(self, channelA, item):
+        hits = numpy.flatnonzero(self.content(channelA) == item)
+        if len(hits):
+            self._count(2*(int(hits[0])+1))
+            return ((int(hits[0]), False),)
+        self._count(2*(self.length[channelA]+1))
+        return ((Any, True),)
+
+    def insertAtIndex0(self, channelA, index, item):
+        n = self.length[channelA]
+        if index < n:
+            self._setContent(channelA,
+                             numpy.insert(self.content(channelA), index, item))
+        self._count(n+2)
+        return ()
+
+    def insertAtIndex(self, channelA, index, item):
+        n = self.length[channelA]
+        if index < n:
+            self.insertAtIndex0(channelA, index, item)
+            self._count(2*(index+1))
+            return (False,)
+        self._count(2*(n+1))
+        return (True,)
+
+    def deleteAtIndex(self, channelA, index):
+        n = self.length[channelA]
+        if index < n:
+            self._setContent(channelA,
+                             numpy.delete(self.content(channelA), index))
+        self._count(n+1)
+        return ()
+
+    def deleteGetAtIndex(self, channelA, index):
+        n = self.length[channelA]
+        if index < n:
+            item = int(self.word[index, channelA])
+            self.deleteAtIndex(channelA, index)
+            self._count(2*(index+1))
+            return ((item, False),)
+        self._count(2*(n+1))
+        return ((Any, True),)
+
+    # === BULK OPERATIONS =====================================================
+    # A stream received from the controller is a list of words;
+    # a stream sent up is returned as a list of words.
+
+    def addAllFirst(self, channelA, words):
+        words = numpy.asarray(words, dtype=numpy.int64)
+        self._setContent(channelA,
+                         numpy.concatenate((words, self.content(channelA))))
+        self._count(self.length[channelA]+1)
+        return ()
+
+    def addAllLast(self, channelA, words):
+        words = numpy.asarray(words, dtype=numpy.int64)
+        self._setContent(channelA,
+                         numpy.concatenate((self.content(channelA), words)))
+        self._count(self.length[channelA]+1)
+        return ()
+
+    def pullMany(self, channelA, m):
+        n = self.length[channelA]
+        words = self.content(channelA)[:m].tolist()
+        self._setContent(channelA, self.content(channelA)[m:].copy())
+        self._count(n+1)
+        return (words,)
+
+    def drain(self, channelA):
+        return self.pullMany(channelA, self.length[channelA])
+
+# ==============================================================================
+
+class NumpyConnector:
+    """The connector between the chain controller and a NumpyChain.
+       It has the send/receive interface and the type checks of Connector.
+       The words sent after an operation are collected according to the
+       operation's signature; then the operation is executed at once,
+       and its answers wait to be received, in order.
+       A stream (W* in a signature) is collected into a list of words,
+       and a list of words answered by the chain is sent up as a stream."""
+
+    def __init__(self, chain):
+        self.chain = chain
+        self.operation = Any
+        self.channels = Any
+        self.expected = "" # kinds still to be sent for the operation.
+        self.arguments = []
+        self.stream = [] # the words of the stream being sent.
+        self.answers = deque() # (kind, value) pairs to be received.
+
+    def send_o(self, operation, *channels):
+        checkOperation(operation, channels)
+        if self.expected or self.answers:
+            raise RuntimeError("send_o%s: Connector status %s, not ready." %
+                               (str((operation,)+channels),
+                                (self.expected or self.answers[0][0])[0]))
+        if isinstance(operation, int) and 0 <= operation < len(OPERATIONS):
+            operation = OPERATIONS[operation]
+        checkChannels(operation, channels)
+        if operation not in SIGNATURES or operation == "minToTop":
+            raise NotImplementedError(
+                "The numpy engine does not implement operation %s." % operation)
+        self.operation = operation
+        self.channels = channels
+        self.expected = SIGNATURES[operation][0]
+        self.arguments = []
+        self.stream = []
+        if not self.expected:
+            self._execute()
+
+    def _send(self, kind, value):
+        if self.expected[:2] == "W*" and kind == "W":
+            if value[1] is not True:
+                self.stream.append(value[0])
+                return
+            self.expected = self.expected[2:] # the end of the stream.
+            self.arguments.append(self.stream)
+            if not self.expected:
+                self._execute()
+            return
+        if not self.expected or self.expected[0] != kind:
+            raise TypeError("Connector mismatch: sent %s, receive %s." %
+                            (kind, self.expected[:1] or "o"))
+        self.expected = self.expected[1:]
+        self.arguments.append(value)
+        if not self.expected:
+            self._execute()
+
+    def _execute(self):
+        if self.operation == "length":
+            method = self.chain.length_
+        else:
+            method = getattr(self.chain, self.operation)
+        answers = method(*self.channels, *self.arguments)
+        kinds = SIGNATURES[self.operation][1].replace("W*", "*")
+        for kind, answer in zip(kinds, answers):
+            if kind == "*":
+                self.answers.extend(("W", (word, False)) for word in answer)
+                self.answers.append(("W", (Any, True)))
+            else:
+                self.answers.append((kind, answer))
+
+    def send_w(self, word):
+        checkWord(word)
+        self._send("w", _arrayWord(word))
+
+    def send_W(self, word, bit):
+        checkWordBit(word, bit)
+        self._send("W", (_arrayWord(word), bit))
+
+    def send_b(self, bit):
+        checkBit(bit)
+        self._send("b", bit)
+
+    def send_B(self, bit, bit2):
+        checkBits(bit, bit2)
+        self._send("B", (bit, bit2))
+
+    def _receive(self, kind):
+        if not self.answers:
+            raise RuntimeError(
+                "Deadlock: receive_%s, but operation %s sends nothing up." %
+                (kind, self.operation))
+        sent, value = self.answers.popleft()
+        if sent != kind:
+            raise TypeError("Connector mismatch: sent %s, receive %s." %
+                            (sent, kind))
+        return value
+
+    def receive_o(self):
+        raise TypeError("Connector mismatch: a NumpyChain sends no operations.")
+
+    def receive_w(self):
+        return self._receive("w")
+
+    def receive_W(self):
+        return self._receive("W")
+
+    def receive_b(self):
+        return self._receive("b")
+
+    def receive_B(self):
+        return self._receive("B")
+
+###############################################################################
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+"""PIPELINED CHAIN CONTROLLER: OPERATIONS RETURNING FUTURES
+
+   A PipelinedChainController has all the methods of ChainController,
+   and submit, which queues an operation and returns at once
+   a concurrent.futures.Future of its result:
+       chain = PipelinedChainController([3,1,2])
+       found = chain.submit("member", 0, 2)
+       chain.submit("addLast", 0, 7)
+       last = chain.submit("last", 0)
+       print(found.result(), last.result()) # True 7
+       chain.stop()
+   A single dispatcher thread issues the submitted operations to the chain,
+   in submission order, so the results are those of the same operations
+   called one by one (the chain is linearizable in submission order),
+   and exceptions (EmptyError, IndexError, ...) are set on the futures.
+   The caller can submit further operations, or do other work,
+   while earlier operations are still propagating in the chain.
+
+   The top CPE accepts a new operation only after it has passed up
+   the answer of the previous one, so the dispatcher issues an operation
+   as soon as the chain can take it; operations without an answer
+   (addLast, sSort, ...) stream down the chain one after another.
+
+   The blocking methods of ChainController must not be called directly
+   while submitted operations are pending; call flush() first."""
+
+# ==============================================================================
+
+import queue
+from concurrent.futures import Future
+
+from chain_2_controller import *
+
+# ==============================================================================
+
+class PipelinedChainController(ChainController):
+
+    def __init__(self, *columns, **options):
+        """As ChainController(*columns, **options);
+           also starts the dispatcher thread."""
+        super().__init__(*columns, **options)
+        self.requests = queue.SimpleQueue() # (method, arguments, future)
+        self.dispatcher = threading.Thread(
+            target=self._dispatch, name=self.chain.chainName + ".dispatcher",
+            daemon=True)
+        self.dispatcher.start()
+
+    def _dispatch(self):
+        """The dispatcher thread: runs the submitted operations in order."""
+        while True:
+            method, arguments, future = self.requests.get()
+            if method is None:
+                future.set_result(None)
+                break
+            if not future.set_running_or_notify_cancel():
+                continue # cancelled before it was issued.
+            try:
+                result = method(self, *arguments)
+            except Exception as exception:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+
+    def submit(self, operation, *arguments):
+        """Queue the ChainController method named operation
+           with the given arguments; returns a Future of its result.
+           Raises AttributeError at once if there is no such method."""
+        if operation == "stop":
+            raise ValueError("submit: call stop() to stop the chain.")
+        method = getattr(ChainController, operation)
+        future = Future()
+        self.requests.put((method, arguments, future))
+        return future
+
+    def flush(self):
+        """Wait until all the submitted operations are completed."""
+        future = Future()
+        self.requests.put((PipelinedChainController._flushed, (), future))
+        future.result()
+
+    def _flushed(self):
+        pass
+
+    def stop(self):
+        """Complete the submitted operations, stop the dispatcher,
+           then the chain; see ChainController.stop."""
+        future = Future()
+        self.requests.put((None, (), future))
+        future.result()
+        self.dispatcher.join()
+        super().stop()
+
+###############################################################################
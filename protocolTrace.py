@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+"""PROTOCOL TRACES: RECORDING AND OFFLINE VERIFICATION
+
+   Instead of checking every message at run time, as Connector does,
+   a chain can run with TracingConnectors (see connector.py), which
+   do no checks but record every message sent into a TraceRecorder:
+   a ring buffer of the last capacity events
+       (connector, direction, kind, detail)
+   connector - the number of the connector in the recorder,
+   direction - "down" (sent by the upper CPE) or "up",
+   kind      - "o", "w", "W", "b" or "B", as the send_* method,
+   detail    - the operation for "o", the bit for "W", otherwise None.
+
+   verifyTrace checks the recorded events offline, against the send/receive
+   signatures of the operations (see signatures.py): on every connector,
+   the messages which follow an operation, in each direction,
+   must be those of its signature.
+
+   For debugging only, not a part of the model."""
+
+# ==============================================================================
+
+from collections import deque
+import itertools
+
+from signatures import SIGNATURES
+
+# ==============================================================================
+
+class TraceRecorder:
+    """The events of the TracingConnectors of one chain, in a ring buffer:
+       only the last capacity events are kept."""
+
+    def __init__(self, capacity=65536):
+        if capacity <= 0:
+            raise ValueError("TraceRecorder: capacity should be > 0.")
+        self.events = deque(maxlen=capacity)
+        self.record = self.events.append # Theta(1), atomic in CPython.
+        self.ids = itertools.count()
+
+    def newConnector(self):
+        """Theta(1). Returns the number of a new connector."""
+        return next(self.ids)
+
+    def clear(self):
+        self.events.clear()
+
+    def verify(self, signatures=SIGNATURES):
+        """See verifyTrace."""
+        return verifyTrace(list(self.events), signatures)
+
+# ==============================================================================
+
+def _expected(signature):
+    """The kinds of a signature string as a list, "W*" as one item."""
+    kinds = []
+    for kind in signature:
+        if kind == "*":
+            kinds[-1] = "W*"
+        else:
+            kinds.append(kind)
+    return kinds
+
+def _match(expected, messages, complete):
+    """Returns None if the list of messages (kind, detail) follows
+       the expected kinds, otherwise the reason why not.
+       If not complete, the messages may be only a prefix."""
+    i = 0
+    for kind in expected:
+        if kind == "W*": # W messages up to the one with bit True
+            while True:
+                if i == len(messages):
+                    return None if not complete else "the stream is not ended"
+                if messages[i][0] != "W":
+                    return "%s in the stream" % messages[i][0]
+                i += 1
+                if messages[i-1][1] is True:
+                    break
+        else:
+            if i == len(messages):
+                return None if not complete else "%s is missing" % kind
+            if messages[i][0] != kind:
+                return "%s instead of %s" % (messages[i][0], kind)
+            i += 1
+    if i < len(messages):
+        return "%s is not expected" % messages[i][0]
+    return None
+
+def verifyTrace(events, signatures=SIGNATURES):
+    """Theta(length of events). Checks a list of recorded events
+       (see TraceRecorder) against the signatures of the operations;
+       returns the list of the violations found, as strings,
+       an empty list if the trace is correct.
+       The events recorded on a connector before its first operation
+       are skipped (a ring buffer drops the oldest events), and
+       the last operation on a connector may be incomplete."""
+    connectors = {} # connector -> list of [operation, down, up]
+    errors = []
+    for connector, direction, kind, detail in events:
+        operations = connectors.setdefault(connector, [])
+        if kind == "o":
+            if direction != "down":
+                errors.append("connector %s: operation %s sent up." %
+                              (connector, detail))
+            operations.append([detail, [], []])
+        elif operations:
+            operations[-1][2 if direction == "up" else 1].append((kind, detail))
+    for connector, operations in sorted(connectors.items()):
+        for i, (operation, down, up) in enumerate(operations):
+            if operation not in signatures:
+                errors.append("connector %s: unknown operation %s." %
+                              (connector, operation))
+                continue
+            complete = i < len(operations) - 1
+            for direction, messages, signature in [
+                    ("down", down, signatures[operation][0]),
+                    ("up", up, signatures[operation][1])]:
+                reason = _match(_expected(signature), messages, complete)
+                if reason is not None:
+                    errors.append("connector %s: %s %s: %s, expected %r." %
+                                  (connector, operation, direction,
+                                   reason, signature))
+    return errors
+
+###############################################################################
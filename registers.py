@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+"""COMPACT CPE REGISTERS: A REGISTER FILE PER CHAIN
+
+   The word and bit registers of all the CPEs of a chain are stored in
+   one RegisterFile, a row of width registers per CPE, in the order
+   in which the CPEs were created (top first):
+       words - one contiguous array of signed 64-bit integers,
+               NO_WORD stands for Any, BIG_WORD for a word >= 2**63,
+               kept in big, a dictionary index -> word,
+       bits  - one contiguous array of signed bytes:
+               1 True, 0 False, NO_BIT Any.
+   A CPE sees only its own row, through a WordRow and a BitRow:
+   views which add the offset of the row to a channel index
+   and reject an index outside the row, so a CPE still cannot access
+   the registers of its neighbors. They are indexed like lists:
+       pe.word[channel] = 7;  pe.bit[channel] = False
+       pe.word[channel] -> 7; pe.bit[channel] -> False
+   and a register holding NO_WORD or NO_BIT reads as Any,
+   so an uninitialized register still cannot be compared or tested.
+
+   The testing tools of the chain controller (chain2list, snapshot,
+   checkpoint) read the register file directly, once the chain has
+   completed the operations requested before.
+
+   As in CPE, words are non-negative integers of any size: the words
+   which do not fit in the array, rare, cost a dictionary entry each.
+   A negative word raises ValueError."""
+
+# ==============================================================================
+
+from array import array
+
+from myThreading import Any
+
+# ==============================================================================
+
+NO_WORD = -1 # stands for Any in a word array;
+NO_BIT = -1  # stands for Any in a bit array.
+BIG_WORD = -2 # the word is in the big dictionary of the register file.
+
+WORD_LIMIT = 2**63 # the words of the array are below it.
+
+_BITS = (Any, False, True) # indexed by an array bit + 1.
+
+# ==============================================================================
+
+class WordRow:
+    """Theta(1). The word registers of one CPE: a view of a row of words."""
+
+    __slots__ = ("words", "big", "offset", "width")
+
+    def __init__(self, words, big, offset, width):
+        self.words = words
+        self.big = big
+        self.offset = offset
+        self.width = width
+
+    def __len__(self):
+        return self.width
+
+    def __getitem__(self, channel):
+        if not 0 <= channel < self.width:
+            raise IndexError("register %s should be in range(%s)." %
+                             (channel, self.width))
+        word = self.words[self.offset + channel]
+        if word >= 0:
+            return word
+        return Any if word == NO_WORD else self.big[self.offset + channel]
+
+    def __setitem__(self, channel, word):
+        if not 0 <= channel < self.width:
+            raise IndexError("register %s should be in range(%s)." %
+                             (channel, self.width))
+        index = self.offset + channel
+        if word is Any:
+            word = NO_WORD
+        elif word < 0:
+            raise ValueError("word %s should be >= 0." % word)
+        elif word >= WORD_LIMIT:
+            self.big[index] = word
+            word = BIG_WORD
+        self.words[index] = word
+
+class BitRow:
+    """Theta(1). The bit registers of one CPE: a view of a row of bits."""
+
+    __slots__ = ("bits", "offset", "width")
+
+    def __init__(self, bits, offset, width):
+        self.bits = bits
+        self.offset = offset
+        self.width = width
+
+    def __len__(self):
+        return self.width
+
+    def __getitem__(self, channel):
+        if not 0 <= channel < self.width:
+            raise IndexError("register %s should be in range(%s)." %
+                             (channel, self.width))
+        return _BITS[self.bits[self.offset + channel] + 1]
+
+    def __setitem__(self, channel, bit):
+        if not 0 <= channel < self.width:
+            raise IndexError("register %s should be in range(%s)." %
+                             (channel, self.width))
+        self.bits[self.offset + channel] = \
+            NO_BIT if bit is Any else 1 if bit else 0
+
+# ==============================================================================
+
+class RegisterFile:
+    """Theta(1). The registers of the CPEs of one chain, width per CPE."""
+
+    __slots__ = ("width", "rows", "words", "big", "bits", "blankWords",
+                 "blankBits")
+
+    def __init__(self, width):
+        self.width = width
+        self.rows = 0
+        self.words = array("q")
+        self.big = {} # index -> word, for the words >= WORD_LIMIT.
+        self.bits = array("b")
+        self.blankWords = array("q", [NO_WORD]*width) # a row of Any.
+        self.blankBits = array("b", [NO_BIT]*width)
+
+    def newRow(self):
+        """Amortized Theta(1). Append a row of Any registers;
+           returns its views (WordRow, BitRow)."""
+        offset = self.rows * self.width
+        self.words.extend(self.blankWords)
+        self.bits.extend(self.blankBits)
+        self.rows += 1
+        return (WordRow(self.words, self.big, offset, self.width),
+                BitRow(self.bits, offset, self.width))
+
+    def truncate(self, rows):
+        """Theta(n). Remove the rows after the first rows:
+           the registers of the CPEs removed from the chain."""
+        del self.words[rows * self.width:]
+        del self.bits[rows * self.width:]
+        for index in [i for i in self.big if i >= rows * self.width]:
+            del self.big[index]
+        self.rows = min(self.rows, rows)
+
+    def column(self, channel):
+        """Theta(n). The content of channel, read down the rows as
+           chain2list would collect it: a list of words, or None
+           if the channel is not terminated by the last row."""
+        words, bits = self.words, self.bits
+        result = []
+        for i in range(channel, self.rows * self.width, self.width):
+            bit = bits[i]
+            if bit == NO_BIT:
+                raise TypeError("The object Any is neither True nor False.")
+            if bit: # if empty
+                return result
+            word = words[i]
+            if word < 0:
+                word = Any if word == NO_WORD else self.big[i]
+            result.append(word)
+        return None
+
+    def checkpoint(self):
+        """Theta(n). A copy of the registers: (rows, words, big, bits)."""
+        return (self.rows, array("q", self.words), dict(self.big),
+                array("b", self.bits))
+
+    def restore(self, checkpoint):
+        """Theta(n). Set the registers to a checkpoint of this file;
+           the rows appended since then are set to Any."""
+        rows, words, big, bits = checkpoint
+        if rows > self.rows:
+            raise ValueError("restore: the checkpoint has %s rows, "
+                             "the register file only %s." % (rows, self.rows))
+        self.words[:len(words)] = words
+        self.bits[:len(bits)] = bits
+        self.big.clear() # a big word of a row appended since is Any.
+        self.big.update(big)
+        for row in range(rows, self.rows):
+            offset = row * self.width
+            self.words[offset:offset+self.width] = self.blankWords
+            self.bits[offset:offset+self.width] = self.blankBits
+
+###############################################################################
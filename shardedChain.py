@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+
+"""SHARDED CHAIN: A CHAIN SPLIT INTO SEGMENTS RUNNING IN SEPARATE PROCESSES
+
+   A chain of CPE threads cannot use more than one core, because of the GIL.
+   A ShardedChain splits a chain into K contiguous segments, and runs every
+   segment in its own worker process. Inside a process, CPEs communicate
+   via ordinary Connectors; at the segment boundaries, and between the
+   chain controller and the top segment, PipeConnectors take over.
+   Propagating operations (push, addLast, sSort, ...) pipeline
+   through all the segments at once.
+       chain = ChainController([3,1,2], engine="process", processes=4)
+
+   The segment boundaries are fixed when the chain is created;
+   the chain grows (by extension) only at the bottom of the last segment.
+   Use capacity to preallocate CPEs in all the segments, for instance
+   for a chain which is initially empty and grows by push."""
+
+# ==============================================================================
+
+import multiprocessing
+import sys
+
+from connector import Connector, checkOperation, checkWord, checkWordBit, \
+                      checkBit, checkBits
+from chain_1_class_PE import *
+
+# ==============================================================================
+
+class PipeConnector:
+    """One end of a two-way communication channel between two processes.
+       It has the send/receive interface of Connector, and the same
+       type checks; the other end is another PipeConnector.
+       A send does not wait for the receiver: messages are buffered
+       by the pipe, in order, so a segment boundary does not stall
+       the segment above it. A receive checks that the received message
+       is of the expected kind, and raises TypeError otherwise."""
+
+    def __init__(self, connection):
+        self.connection = connection # a multiprocessing Connection object.
+
+    # SEND ------------------------------------------------------
+
+    def send_o(self, operation, *channels):
+        checkOperation(operation, channels)
+        self.connection.send(("o", operation, channels))
+
+    def send_w(self, word):
+        checkWord(word)
+        self.connection.send(("w", word))
+
+    def send_W(self, word, bit):
+        checkWordBit(word, bit)
+        self.connection.send(("W", word, bit))
+
+    def send_b(self, bit):
+        checkBit(bit)
+        self.connection.send(("b", bit))
+
+    def send_B(self, bit, bit2):
+        checkBits(bit, bit2)
+        self.connection.send(("B", bit, bit2))
+
+    # RECEIVE ---------------------------------------------------
+
+    def _receive(self, kind):
+        message = self.connection.recv()
+        if message[0] != kind:
+            raise TypeError("Connector mismatch: sent %s, receive %s." %
+                            (message[0], kind))
+        return message
+
+    def receive_o(self):
+        message = self._receive("o")
+        return message[1], message[2]
+
+    def receive_w(self):
+        return self._receive("w")[1]
+
+    def receive_W(self):
+        message = self._receive("W")
+        return message[1], message[2]
+
+    def receive_b(self):
+        return self._receive("b")[1]
+
+    def receive_B(self):
+        message = self._receive("B")
+        return message[1], message[2]
+
+# ==============================================================================
+
+def _runSegment(rows, chainName, firstPeId, upper, lower, control,
+                connectorClass, release):
+    """The main function of a worker process.
+       Builds and starts the CPEs of one segment, then serves
+       the requests of the chain controller on the control connection:
+           "collect" - send back (and clear) the words collected by
+                       chain2list and register2list,
+           "snapshot" - send back (and renew) the snapshot buffer,
+           "join"    - wait until all the CPEs stopped, then exit."""
+    sys.stdout.reconfigure(line_buffering=True) # keep report lines in order.
+    pes = []
+    pe = CPE(chainName, connectorClass)
+    pe.peId = firstPeId
+    pe.name = chainName + "." + str(pe.peId)
+    pe.connectorUpper = PipeConnector(upper)
+    chainState = pe.chainState # shared by the CPEs of this segment.
+    chainState.release = release
+    chainState.snapshot = [[] for channel in range(CHANNELS)]
+    for d in range(len(rows)):
+        for w in range(CHANNELS):
+            pe.word[w], pe.bit[w] = rows[d][w]
+        pes.append(pe)
+        if d < len(rows) - 1:
+            lowerPE = pe._newLowerPE()
+            pe.connectorLower = lowerPE.connectorUpper
+            pe = lowerPE
+    if lower is not None:
+        pe.connectorLower = PipeConnector(lower)
+    for pe in pes:
+        pe.start()
+    while True:
+        request = control.recv()
+        if request == "collect":
+            control.send(chainState.buffer)
+            chainState.buffer = []
+        elif request == "snapshot":
+            control.send(chainState.snapshot)
+            chainState.snapshot = [[] for channel in range(CHANNELS)]
+        elif request == "join":
+            for pe in pes:
+                pe.join()
+            control.send(True)
+            break
+
+# ==============================================================================
+
+class ShardedChain:
+    """The chain controller's handle of a chain split into segments.
+       Only connectorUpper, the PipeConnector to the top segment,
+       is used for the chain operations."""
+
+    def __init__(self, rows, processes=None, capacity=0,
+                 connectorClass=Connector, release=False):
+        """rows - the content of the chain, see ChainController._rows;
+           processes - the number of segments/worker processes,
+                       by default the number of cores;
+           capacity - the minimal number of CPEs, split among the segments;
+           connectorClass - the connectors inside the segments;
+           release - True if the CPEs run in the release mode."""
+        CPE.chainId += 1 # chain names are unique across the engines.
+        self.chainName = "CH" + str(CPE.chainId)
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        if processes < 1:
+            raise ValueError("ShardedChain: processes should be >= 1.")
+        rows = list(rows)
+        padding = max(capacity, processes) - len(rows)
+        if padding > 0:
+            rows.extend([[(Any, Any)]*CHANNELS for i in range(padding)])
+        context = multiprocessing.get_context("spawn")
+        upperEnd, upper = context.Pipe()
+        self.connectorUpper = PipeConnector(upperEnd)
+        self.processes = []
+        self.controls = []
+        self.buffer = [] # the words collected by collect.
+        size, extra = divmod(len(rows), processes)
+        first = 0
+        for k in range(processes):
+            last = first + size + (1 if k < extra else 0)
+            if k < processes - 1:
+                lower, nextUpper = context.Pipe()
+            else:
+                lower = nextUpper = None
+            control, workerControl = context.Pipe()
+            process = context.Process(
+                target=_runSegment, name=self.chainName + ".segment" + str(k),
+                args=(rows[first:last], self.chainName, first+1,
+                      upper, lower, workerControl, connectorClass,
+                      release),
+                daemon=True)
+            process.start()
+            self.processes.append(process)
+            self.controls.append(control)
+            upper = nextUpper
+            first = last
+
+    def start(self):
+        """The worker processes start their segments."""
+        pass
+
+    def collect(self, buffer):
+        """Append to buffer the words collected by chain2list/register2list
+           in all the segments, top segment first."""
+        for control in self.controls:
+            control.send("collect")
+        for control in self.controls:
+            buffer.extend(control.recv())
+
+    def collectSnapshot(self, buffer):
+        """Append to the lists of buffer the words collected by snapshot
+           in all the segments, top segment first. A channel which is
+           not terminated in a segment gets None."""
+        for control in self.controls:
+            control.send("snapshot")
+        for control in self.controls:
+            for channel, words in enumerate(control.recv()):
+                if words is None:
+                    buffer[channel] = None
+                elif buffer[channel] is not None:
+                    buffer[channel].extend(words)
+
+    def join(self):
+        """Wait until all the segments stopped."""
+        for control in self.controls:
+            control.send("join")
+        for control in self.controls:
+            control.recv()
+        for process in self.processes:
+            process.join()
+
+###############################################################################
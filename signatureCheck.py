@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+
+"""STATIC CHECK OF THE SEND/RECEIVE SIGNATURES
+
+   The messages exchanged by an operation are declared once, in SIGNATURES
+   (see signatures.py). checkSignatures analyzes the source code of a class
+   implementing operations, without running it, and reports the methods
+   whose calls of the connector methods do not follow the signatures:
+     - an operation method of a CPE class (CPE, CoopCPE, a subclass)
+       must receive from connectorUpper the kinds of the first part
+       of its signature and send up the kinds of the second part;
+     - after connectorLower.send_o("op", ...), in a CPE or in
+       ChainController, the messages sent to and received from
+       connectorLower, up to the next send_o, must be those of op.
+   A stream W* is taken as one or more W messages: the bit ending
+   a stream is not known statically.
+
+   Every path through a method is followed, with every loop unrolled
+   up to LOOP_UNROLL times; a path ending by raise is not checked.
+   A method whose body is only pass (an exercise) is not checked.
+   The CPE classes are checked when they are defined, as their
+   dispatch tables are built; ChainController when it is imported.
+
+   Not a part of the model."""
+
+# ==============================================================================
+
+import ast
+import inspect
+import re
+import textwrap
+
+from signatures import SIGNATURES
+
+# ==============================================================================
+
+LOOP_UNROLL = 2
+MAX_PATHS = 4096 # per method; the analysis stops following more paths.
+
+_CONNECTORS = {"connectorUpper": "upper", "connectorLower": "lower"}
+_CALL = re.compile(r"g?(send|receive)_([owWbB])$") # gsend_w in coopChain.
+
+# ==============================================================================
+
+def signatureRegex(signature):
+    """The regular expression of the kinds of a signature string,
+       e.g. "wW*" -> "wW+"."""
+    return re.compile(signature.replace("W*", "W+"))
+
+def _event(call):
+    """Returns (connector, action, kind, operation) if call is
+       self.connectorUpper/connectorLower.send_*/receive_*, otherwise None.
+       The operation is the first argument of send_o, if it is a string."""
+    function = call.func
+    if not (isinstance(function, ast.Attribute) and
+            isinstance(function.value, ast.Attribute) and
+            function.value.attr in _CONNECTORS and
+            isinstance(function.value.value, ast.Name) and
+            function.value.value.id == "self"):
+        return None
+    match = _CALL.match(function.attr)
+    if match is None:
+        return None
+    operation = None
+    if match.group(2) == "o" and call.args and \
+       isinstance(call.args[0], ast.Constant):
+        operation = call.args[0].value
+    return (_CONNECTORS[function.value.attr], match.group(1),
+            match.group(2), operation)
+
+_NEGATIONS = {ast.Is: ast.IsNot, ast.IsNot: ast.Is, ast.Eq: ast.NotEq,
+              ast.NotEq: ast.Eq, ast.In: ast.NotIn, ast.NotIn: ast.In}
+
+def _negates(test, other):
+    """True if test is the negation of other, as in the idiom
+       if not self.bit[A]: ... elif self.bit[A]: ...
+       so that no path goes through neither branch."""
+    def same(a, b):
+        return ast.dump(a) == ast.dump(b)
+    if isinstance(test, ast.UnaryOp) and isinstance(test.op, ast.Not):
+        return same(test.operand, other)
+    if isinstance(other, ast.UnaryOp) and isinstance(other.op, ast.Not):
+        return same(other.operand, test)
+    if isinstance(test, ast.Compare) and isinstance(other, ast.Compare) and \
+       len(test.ops) == len(other.ops) == 1:
+        negation = _NEGATIONS.get(type(test.ops[0]))
+        return negation is not None and isinstance(other.ops[0], negation) \
+            and same(test.left, other.left) \
+            and same(test.comparators[0], other.comparators[0])
+    return False
+
+class _Paths:
+    """The paths through a function body of cls: tuples of events, grouped
+       by how they leave a block: "next", "return", "break", "continue".
+       A call of a method of cls which is not an operation is followed."""
+
+    def __init__(self, cls=None, signatures=SIGNATURES, calling=()):
+        self.cls = cls
+        self.signatures = signatures
+        self.calling = calling # the methods being followed, no recursion.
+
+    def _extend(self, paths, events):
+        if not events:
+            return paths
+        return {path + events for path in paths}
+
+    def _cap(self, paths):
+        if len(paths) > MAX_PATHS:
+            return set(sorted(paths, key=repr)[:MAX_PATHS])
+        return paths
+
+    def _helper(self, call):
+        """The paths of self.helper(...), a method of cls, or None."""
+        function = call.func
+        if self.cls is None or not (isinstance(function, ast.Attribute) and
+                                    isinstance(function.value, ast.Name) and
+                                    function.value.id == "self"):
+            return None
+        name = function.attr
+        if name in self.signatures or name in self.calling:
+            return None
+        method = inspect.getattr_static(self.cls, name, None)
+        if not inspect.isfunction(method):
+            return None
+        return _methodPaths(method, self.cls, self.signatures,
+                            self.calling + (name,))
+
+    def expression(self, node, paths):
+        """The paths extended by the events of an expression,
+           in evaluation order."""
+        def visit(node, paths):
+            if isinstance(node, ast.Lambda):
+                return paths # not evaluated here.
+            for child in ast.iter_child_nodes(node):
+                paths = visit(child, paths)
+            if isinstance(node, ast.Call):
+                event = _event(node)
+                if event is not None:
+                    return self._extend(paths, (event,))
+                helper = self._helper(node)
+                if helper:
+                    return self._cap({path + more for path in paths
+                                      for more in helper})
+            return paths
+        if node is None:
+            return paths
+        return visit(node, paths)
+
+    def block(self, statements, paths):
+        """Returns a dictionary exit -> set of paths."""
+        exits = {"next": paths, "return": set(), "break": set(),
+                 "continue": set()}
+        for statement in statements:
+            if not exits["next"]:
+                break
+            result = self.statement(statement, exits["next"])
+            exits["next"] = self._cap(result.pop("next"))
+            for name, more in result.items():
+                exits[name] |= more
+        return exits
+
+    def statement(self, node, paths):
+        empty = {"return": set(), "break": set(), "continue": set()}
+        if isinstance(node, ast.Return):
+            return dict(empty, next=set(),
+                        **{"return": self.expression(node.value, paths)})
+        elif isinstance(node, ast.Raise):
+            return dict(empty, next=set()) # an error path, not checked.
+        elif isinstance(node, ast.Break):
+            return dict(empty, next=set(), **{"break": paths})
+        elif isinstance(node, ast.Continue):
+            return dict(empty, next=set(), **{"continue": paths})
+        elif isinstance(node, ast.If):
+            paths = self.expression(node.test, paths)
+            result = self.block(node.body, paths)
+            orelse = node.orelse
+            if len(orelse) == 1 and isinstance(orelse[0], ast.If) and \
+               not orelse[0].orelse and _negates(node.test, orelse[0].test):
+                orelse = orelse[0].body # the elif is the else.
+            other = self.block(orelse, paths)
+            return {name: result[name] | other[name] for name in result}
+        elif isinstance(node, (ast.While, ast.For)):
+            return self.loop(node, paths)
+        elif isinstance(node, ast.With):
+            for item in node.items:
+                paths = self.expression(item.context_expr, paths)
+            return self.block(node.body, paths)
+        elif isinstance(node, ast.Try):
+            result = self.block(node.body + node.orelse, paths)
+            tail = self.block(node.finalbody, result["next"])
+            tail["return"] |= result["return"]
+            return tail
+        elif isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            return dict(empty, next=paths) # not executed here.
+        return dict(empty, next=self.expression(node, paths))
+
+    def loop(self, node, paths):
+        """Every loop is executed 0..LOOP_UNROLL times, while True
+           1..LOOP_UNROLL times and left only by break or return."""
+        if isinstance(node, ast.For):
+            paths = self.expression(node.iter, paths)
+            test = None
+        else:
+            test = node.test
+        forever = isinstance(node, ast.While) and \
+            isinstance(node.test, ast.Constant) and node.test.value is True
+        exits = {"next": set(), "return": set(), "break": set(),
+                 "continue": set()}
+        current = self.expression(test, paths)
+        for i in range(LOOP_UNROLL):
+            if not forever:
+                exits["next"] |= current
+            result = self.block(node.body, current)
+            exits["return"] |= result["return"]
+            exits["next"] |= result["break"]
+            current = self.expression(test, result["next"] | result["continue"])
+            if not current:
+                break
+        if not forever:
+            exits["next"] |= current
+        return exits
+
+# ==============================================================================
+
+def _body(function):
+    """The statements of a function, without its docstring,
+       or None if it has no source."""
+    try:
+        source = textwrap.dedent(inspect.getsource(function))
+    except (OSError, TypeError):
+        return None
+    body = ast.parse(source).body[0].body
+    if body and isinstance(body[0], ast.Expr) and \
+       isinstance(body[0].value, ast.Constant): # docstring
+        body = body[1:]
+    return body
+
+def isExercise(function):
+    """True if the body of function is only pass: an exercise."""
+    body = _body(function)
+    return body is not None and \
+        all(isinstance(statement, ast.Pass) for statement in body)
+
+def _methodPaths(function, cls=None, signatures=SIGNATURES, calling=()):
+    """Returns the set of paths of a function of cls, or None if it cannot
+       be analyzed (no source) or is only pass (an exercise)."""
+    body = _body(function)
+    if body is None or isExercise(function):
+        return None
+    exits = _Paths(cls, signatures, calling).block(body, {()})
+    return exits["next"] | exits["return"]
+
+def _check(kinds, signature, what, errors):
+    if not signatureRegex(signature).fullmatch("".join(kinds)):
+        errors.add("%s %s, expected %r." % (what, "".join(kinds) or "nothing",
+                                            signature))
+
+def checkMethod(function, operation=None, cls=None, signatures=SIGNATURES):
+    """Returns the sorted list of the signature violations of a method
+       of cls: as the implementation of operation (a CPE method),
+       if operation is given, and as the caller of the operations
+       it sends down."""
+    paths = _methodPaths(function, cls, signatures)
+    if paths is None:
+        return []
+    name = function.__qualname__
+    errors = set()
+    for path in paths:
+        if operation is not None:
+            received = [kind for connector, action, kind, _ in path
+                        if connector == "upper" and action == "receive"]
+            sent = [kind for connector, action, kind, _ in path
+                    if connector == "upper" and action == "send"]
+            _check(received, signatures[operation][0],
+                   "%s receives from above" % name, errors)
+            _check(sent, signatures[operation][1],
+                   "%s sends up" % name, errors)
+        sessions = [] # (operation, sent, received) on connectorLower.
+        for connector, action, kind, sentOperation in path:
+            if connector != "lower":
+                continue
+            if kind == "o":
+                sessions.append((sentOperation, [], []))
+            elif sessions:
+                sessions[-1][1 if action == "send" else 2].append(kind)
+            else:
+                errors.add("%s %s_%s below before any send_o." %
+                           (name, action, kind))
+        for sentOperation, sent, received in sessions:
+            if sentOperation is None:
+                continue # not a literal operation name.
+            if sentOperation not in signatures:
+                errors.add("%s sends down an unknown operation %s." %
+                           (name, sentOperation))
+                continue
+            _check(sent, signatures[sentOperation][0],
+                   "%s sends %s down" % (name, sentOperation), errors)
+            _check(received, signatures[sentOperation][1],
+                   "%s receives for %s" % (name, sentOperation), errors)
+    return sorted(errors)
+
+def checkSignatures(cls, operations=True, signatures=SIGNATURES):
+    """Returns the sorted list of the signature violations of the public
+       methods defined by cls (not inherited). If operations, the methods
+       named as an operation are checked as its implementation
+       (a CPE class)."""
+    errors = []
+    for name, member in vars(cls).items():
+        if not inspect.isfunction(member) or name.startswith("_"):
+            continue # a private method is followed where it is called.
+        operation = name if operations and name in signatures else None
+        errors += checkMethod(member, operation, cls, signatures)
+    return errors
+
+def assertSignatures(cls, operations=True, signatures=SIGNATURES):
+    """Raises TypeError listing the violations found by checkSignatures."""
+    errors = checkSignatures(cls, operations, signatures)
+    if errors:
+        raise TypeError("%s: the send/receive signatures are not followed:\n"
+                        % cls.__name__ + "\n".join(errors))
+
+###############################################################################
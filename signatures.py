@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+"""SEND/RECEIVE SIGNATURES OF THE CHAIN OPERATIONS
+
+   For every operation which can be sent by send_o, the signature gives
+   the kinds of the messages which follow the operation on the same
+   connector, as seen by the CPE receiving the operation:
+       (received from above, sent up)
+   For instance the signature of member is ("w", "b"):
+       the caller sends_o("member", A), then send_w(word), then receive_b().
+   The kinds are those of the connector methods: o, w, W, b, B.
+   W* stands for a stream: W messages, the last one with bit True.
+   An operation whose protocol is left as an exercise has the signature
+   documented by the Domino comments of ChainController."""
+
+# ==============================================================================
+
+SIGNATURES = {
+    # testing tools, not a part of the model
+    "stop":            ("",   ""),
+    "chain2list":      ("",   "b"),
+    "register2list":   ("",   "b"),
+    "snapshot":        ("",   "b"),
+    "sync":            ("",   "b"),
+    "compact":         ("",   "w"),
+    "printRepr2":      ("",   "b"),
+    "printRepr4":      ("",   "b"),
+    "printRepr8":      ("",   "b"),
+    "printRepr10":     ("",   "b"),
+    "printRepr16":     ("",   "b"),
+    "printStr":        ("",   "b"),
+    # list operations, top CPE operations
+    "isEmpty":         ("",   "b"),
+    "clear":           ("",   ""),
+    "clear2":          ("",   ""),
+    "first":           ("",   "W"),
+    # list operations, whole chain operations
+    "copy":            ("",   ""),
+    "move":            ("",   ""),
+    "swap":            ("",   ""),
+    "setAll":          ("w",  ""),
+    "member":          ("w",  "b"),
+    # list operations, top operations
+    "push":            ("w",  ""),
+    "pushPoor":        ("w",  ""),
+    "pull":            ("",   "W"),
+    "replaceGetFirst": ("w",  "W"),
+    # list operations, bottom operations
+    "last":            ("",   "W"),
+    "addLast":         ("w",  ""),
+    "removeLast":      ("",   "b"),
+    "removeGetLast":   ("",   "W"),
+    "replaceLast":     ("w",  "b"),
+    "replaceGetLast":  ("w",  "W"),
+    # list operations, rotations and reverse
+    "rotateDown":      ("",   "W"),
+    "rotateUp":        ("",   "W"),
+    "reverseSimple":   ("",   ""),
+    "reverse":         ("",   ""),
+    # order operations
+    "min":             ("",   "W"),
+    "memberND":        ("w",  "b"),
+    "insertND":        ("w",  ""),
+    "insertUniqueI":   ("w",  ""),
+    "insertAllND":     ("",   ""),
+    "iSort":           ("",   ""),
+    "sSort":           ("",   ""),
+    "minToTop":        ("ww", "W"),
+    "bSort":           ("",   ""),
+    "mergeNDsimple":   ("",   ""),
+    "mergeND":         ("",   ""),
+    # indexing operations
+    "length":          ("",   "w"),
+    "getItem":         ("w",  "W"),
+    "setItem0":        ("ww", ""),
+    "setItem":         ("ww", "b"),
+    "getSetItem":      ("ww", "W"),
+    "memberIndex":     ("w",  "W"),
+    "insertAtIndex0":  ("ww", ""),
+    "insertAtIndex":   ("ww", "b"),
+    "deleteAtIndex":   ("w",  ""),
+    "deleteGetAtIndex":("w",  "W"),
+    # bulk operations
+    "addAllFirst":     ("W*", ""),
+    "addAllLast":      ("W*", ""),
+    "pullMany":        ("w",  "W*"),
+    "drain":           ("",   "W*"),
+}
+
+# The testing tools, not a part of the model: their messages are not counted
+# as steps of the model (see ClockedConnector).
+TESTING_TOOLS = frozenset(["stop", "chain2list", "register2list", "snapshot",
+                           "sync", "compact", "printRepr2", "printRepr4",
+                           "printRepr8", "printRepr10", "printRepr16",
+                           "printStr"])
+
+###############################################################################